@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+
+import eHive
+
+from bio.ensembl.ontology.loader.db import dal
+from . import param_defaults
+
+logger = logging.getLogger(__name__)
+
+
+class OLSBuildIndexes(eHive.BaseRunnable):
+    """ Build secondary indexes deferred for bulk loading (see OLSHiveLoader defer_indexes), once all loads are done """
+
+    def run(self):
+        self.input_job.transient_error = False
+        dal.db_init(self.param_required('db_url'), **param_defaults())
+        timings = dal.build_indexes(workers=self.param('index_workers') or 4)
+        for table, duration in timings.items():
+            logger.info('Table %s indexed in %.2fs', table, duration)
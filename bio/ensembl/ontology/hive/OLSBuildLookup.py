@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+
+import eHive
+
+from bio.ensembl.ontology.loader.db import dal
+from bio.ensembl.ontology.loader.lookup import TermLookup, lookup_latencies
+from . import param_defaults
+
+logger = logging.getLogger(__name__)
+
+
+class OLSBuildLookup(eHive.BaseRunnable):
+    """ Build terms lookup index (accessions, alt ids, labels and synonyms) once all loads are done """
+
+    def run(self):
+        self.input_job.transient_error = False
+        dal.db_init(self.param_required('db_url'), **param_defaults())
+        with dal.session_scope() as session:
+            lookup = TermLookup.build(session)
+        lookup_file = self.param('lookup_file') or os.path.join(self.param_required('output_dir'), 'term_lookup.pickle')
+        lookup.save(lookup_file)
+        # sample of accessions and labels, one term out of step
+        step = max(1, len(lookup) // 1000)
+        queries = lookup.accessions[::step] + [name for name in lookup.names[::step] if name]
+        logger.info('Lookup latencies (ms): %s', lookup_latencies(lookup, queries))
+        self.dataflow({'lookup_file': lookup_file})
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+
+import eHive
+from eHive import JobFailedException
+
+from bio.ensembl.ontology.loader.checks import check_consistency, write_report
+from bio.ensembl.ontology.loader.db import dal
+from . import param_defaults
+
+logger = logging.getLogger(__name__)
+
+
+class OLSCheckConsistency(eHive.BaseRunnable):
+    """ Post load consistency checks, findings written to a JSON report in output_dir """
+
+    def run(self):
+        self.input_job.transient_error = False
+        dal.db_init(self.param_required('db_url'), **param_defaults())
+        sample_size = self.param('sample_size') or 20
+        with dal.session_scope() as session:
+            results = check_consistency(session, sample_size=sample_size)
+        report_file = self.param('report_file') or os.path.join(self.param_required('output_dir'),
+                                                                'consistency_report.json')
+        issues = write_report(results, report_file)
+        if issues and self.param('fail_on_error'):
+            raise JobFailedException('Consistency checks failed: %s issues, see %s' % (issues, report_file))
+        self.dataflow({'report_file': report_file, 'issues': issues})
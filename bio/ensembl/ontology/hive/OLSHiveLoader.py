@@ -26,6 +26,8 @@ class OLSHiveLoader(eHive.BaseRunnable):
     def run(self):
         options = param_defaults()
         options['ens_version'] = self.param_required('ens_version')
+        # bulk load: secondary indexes are built at the end by OLSBuildIndexes
+        options['defer_indexes'] = bool(self.param('defer_indexes'))
         # add loader option such as page_size, base_site for testing
         db_url_parts = parse.urlparse(self.param_required('db_url'))
         assert db_url_parts.scheme in ('mysql', 'mysql+pymysql')
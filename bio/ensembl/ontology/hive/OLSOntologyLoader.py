@@ -44,6 +44,8 @@ class OLSOntologyLoader(eHive.BaseRunnable):
         if not self.param_required('ontology_name').upper() in ols_loader.allowed_ontologies:
             raise JobFailedException("Ontology %s not implemented" % self.param_required('ontology_name'))
 
+        # one OLS call per ontology for the whole load, slices read metadata from snapshot
+        ols_loader.snapshot_ontologies()
         with dal.session_scope() as session:
             m_ontology = ols_loader.load_ontology(self.param_required('ontology_name'), session=session)
             session.add(m_ontology)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+
+import eHive
+
+from bio.ensembl.ontology.loader.slices import SliceMetrics, plan_slices
+
+logger = logging.getLogger(__name__)
+
+
+class OLSSlicePlanner(eHive.BaseRunnable):
+    """ Split ontology terms into slices of equivalent expected load time, according to previous runs metrics """
+
+    def run(self):
+        self.input_job.transient_error = False
+        ontology_name = self.param_required('ontology_name')
+        nb_terms = int(self.param_required('nb_terms'))
+        metrics_dir = self.param('metrics_dir') or self.param_required('output_dir')
+        history = SliceMetrics(metrics_dir).history(ontology_name)
+        slices = plan_slices(nb_terms, slice_size=int(self.param('slice_size') or 500), history=history)
+        logger.info('Planned %s slices for %s (%s terms, %s metrics records)', len(slices), ontology_name,
+                    nb_terms, len(history))
+        for start, end in slices:
+            self.dataflow({
+                'ontology_name': ontology_name,
+                '_start_term_index': start,
+                '_end_term_index': end
+            }, 2)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+from os.path import join
+
+import eHive
+
+from bio.ensembl.ontology.loader.db import dal
+from bio.ensembl.ontology.loader.merge import staging_files, merge_database
+from . import param_defaults
+
+logger = logging.getLogger(__name__)
+
+
+class OLSStagingMerge(eHive.BaseRunnable):
+    """ Merge an ontology slices staging databases (see OLSTermsLoader staging) into target database.
+
+    Merges run one at a time in a single job, target tables are only written by this job. Merged staging files are
+    removed unless `keep_staging` is set, so a failed job resumes with the remaining ones: the staging file it
+    stopped on is merged again, rows already in target being skipped.
+    """
+
+    def run(self):
+        self.input_job.transient_error = False
+        dal.db_init(self.param_required('db_url'), **param_defaults())
+        dal.create_schema()
+        staging_dir = join(self.param_required('output_dir'), 'staging')
+        for file_name in staging_files(staging_dir, self.param_required('ontology_name')):
+            stats = merge_database('sqlite:///' + file_name, dal.engine,
+                                   chunk_size=self.param('merge_chunk_size') or 500)
+            logger.info('Merged staging %s: %s', file_name, stats)
+            if not self.param('keep_staging'):
+                os.remove(file_name)
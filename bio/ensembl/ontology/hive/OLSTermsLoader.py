@@ -13,17 +13,30 @@
 """
 # @author Marc Chakiachvili
 import logging
+import os
+import time
+from os.path import join
 
 import eHive
 from eHive import JobFailedException
 
 from ebi.ols.api import exceptions
 from . import param_defaults, log_levels
+from ..loader.merge import staging_db_url
 from ..loader.ols import OlsLoader
+from ..loader.slices import SliceMetrics
 
 
 class OLSTermsLoader(eHive.BaseRunnable):
-    """ OLS MySQL loader runnable class for eHive integration """
+    """ OLS MySQL loader runnable class for eHive integration
+
+    When `time_budget` (seconds) is set and exhausted before the end of the slice, terms loaded so far are committed
+    and a new job for the remaining [current, _end_term_index] range is flown on branch 2.
+
+    When `staging` is set, terms are loaded into a private SQLite database under `output_dir`/staging instead of
+    `db_url`, so that concurrent slices never wait on each other's table locks. Staging databases are merged into
+    `db_url` by OLSStagingMerge once all slices are loaded.
+    """
 
     def run(self):
         options = param_defaults()
@@ -32,11 +45,21 @@ class OLSTermsLoader(eHive.BaseRunnable):
         options['page_size'] = self.param('page_size')
         options['output_dir'] = self.param('output_dir')
         options['page_size'] = 200
+        options['id_block_size'] = self.param('id_block_size')
+        options['fast_fetch'] = bool(self.param('fast_fetch'))
         log_level = log_levels.get(self.param('verbosity'), logging.ERROR)
         log_level = logging.DEBUG
         options['verbosity'] = log_level
         logging.basicConfig(level=log_level, datefmt='%m-%d %H:%M:%S')
-        ols_loader = OlsLoader(self.param_required('db_url'), **options)
+        db_url = self.param_required('db_url')
+        if self.param('staging'):
+            staging_dir = join(self.param_required('output_dir'), 'staging')
+            os.makedirs(staging_dir, exist_ok=True)
+            db_url = staging_db_url(staging_dir,
+                                    self.param_required('ontology_name'),
+                                    self.param_required('_start_term_index'),
+                                    self.param_required('_end_term_index'))
+        ols_loader = OlsLoader(db_url, **options)
         logger = ols_loader.get_ontology_logger(self.param_required('ontology_name'))
         self.input_job.transient_error = False
         logger.info('HiveTermsLoader: Loading %s ontology terms [%s..%s]',
@@ -44,13 +67,36 @@ class OLSTermsLoader(eHive.BaseRunnable):
                     self.param_required('_start_term_index'),
                     self.param_required('_end_term_index'))
         try:
-            ols_loader.load_ontology_terms(self.param_required('ontology_name'),
-                                           start=self.param_required('_start_term_index'),
-                                           end=self.param_required('_end_term_index'))
+            start_time = time.time()
+            nb_terms, nb_ignored = ols_loader.load_ontology_terms(self.param_required('ontology_name'),
+                                                                  start=self.param_required('_start_term_index'),
+                                                                  end=self.param_required('_end_term_index'),
+                                                                  time_budget=self.param('time_budget'))
+            loaded_end = self.param_required('_end_term_index')
+            if ols_loader.next_term_index is not None:
+                loaded_end = ols_loader.next_term_index - 1
+                logger.info('Time budget exhausted, handing over %s ontology terms [%s..%s]',
+                            self.param_required('ontology_name'),
+                            ols_loader.next_term_index,
+                            self.param_required('_end_term_index'))
+                self.dataflow({
+                    'ontology_name': self.param_required('ontology_name'),
+                    '_start_term_index': ols_loader.next_term_index,
+                    '_end_term_index': self.param_required('_end_term_index')
+                }, 2)
+            if ols_loader.loaded_range is not None:
+                # slice metrics are used to plan next runs slices, a resumed slice only measures the terms it browsed
+                metrics_dir = self.param('metrics_dir') or self.param_required('output_dir')
+                first_index, last_index = ols_loader.loaded_range
+                SliceMetrics(metrics_dir).record(self.param_required('ontology_name'),
+                                                 first_index,
+                                                 last_index,
+                                                 last_index - first_index + 1,
+                                                 time.time() - start_time)
             logger.info('Loaded %s ontology terms [%s..%s]',
                         self.param_required('ontology_name'),
                         self.param_required('_start_term_index'),
-                        self.param_required('_end_term_index'))
+                        loaded_end)
         except exceptions.OlsException as e:
             message = "%s[%s:%s] %s" % (self.param_required('ontology_name'),
                                         self.param_required('_start_term_index'),
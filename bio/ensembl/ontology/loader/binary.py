@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Binary ontology snapshot format, all integers little endian:
+
+- header: magic (8 bytes), format version (uint32), number of sections (uint32)
+- sections table: name (24 bytes), item format (4 bytes, struct code), offset (uint64), number of items (uint64)
+- sections data, each one aligned on 8 bytes
+
+Terms are sorted by accession, a term is addressed by its index in this order. Strings are stored as one utf-8
+blob plus an offsets array, relations and closure as CSR arrays (offsets per term, then targets).
+"""
+import datetime
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from sqlalchemy import func
+
+from .graph import _csr
+from .models import Ontology, Term, Relation, RelationType, Closure
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['FORMAT_VERSION', 'write_snapshot', 'SnapshotReader']
+
+MAGIC = b'OLSSNAP\x00'
+FORMAT_VERSION = 1
+_header = struct.Struct('<8sII')
+_section = struct.Struct('<24s4sQQ')
+
+# term flags
+IS_ROOT = 1
+IS_OBSOLETE = 2
+
+
+def _strings(values):
+    offsets = array('I', [0])
+    data = bytearray()
+    for value in values:
+        data.extend((value or '').encode('utf-8'))
+        offsets.append(len(data))
+    return offsets, array('B', data)
+
+
+def _fetch_terms(session, term_ids, chunk_size=500):
+    term_ids = list(term_ids)
+    for i in range(0, len(term_ids), chunk_size):
+        yield from session.query(Term.term_id, Term.accession, Term.name, Term.is_root, Term.is_obsolete,
+                                 Term.ontology_id).filter(Term.term_id.in_(term_ids[i:i + chunk_size]))
+
+
+def write_snapshot(session, ontology_name, file_name):
+    """
+    Export an ontology (all namespaces) into a binary snapshot file. Terms of other ontologies related to it are
+    exported too, so that relations never point outside the snapshot.
+    :param session: db session
+    :param ontology_name: ontology short name
+    :param file_name: snapshot file
+    :return: snapshot metadata dict
+    """
+    ontologies = {ontology.id: ontology for ontology in
+                  session.query(Ontology).filter(Ontology.name == ontology_name.upper())}
+    terms = {row.term_id: row for row in session.query(
+        Term.term_id, Term.accession, Term.name, Term.is_root, Term.is_obsolete, Term.ontology_id).filter(
+        Term.ontology_id.in_(list(ontologies)))}
+    relation_types = []
+    type_ids = {}
+    relations = []
+    for child_id, parent_id, type_name in session.query(Relation.child_term_id, Relation.parent_term_id,
+                                                        RelationType.name).join(
+            RelationType, Relation.relation_type_id == RelationType.relation_type_id).filter(
+            Relation.ontology_id.in_(list(ontologies))):
+        if type_name not in type_ids:
+            type_ids[type_name] = len(relation_types)
+            relation_types.append(type_name)
+        relations.append((child_id, parent_id, type_ids[type_name]))
+    # one closure row per subparent, only the shortest path is kept
+    closures = session.query(Closure.child_term_id, Closure.parent_term_id, func.min(Closure.distance)).filter(
+        Closure.ontology_id.in_(list(ontologies))).group_by(Closure.child_term_id, Closure.parent_term_id).all()
+    related = {term_id for child_id, parent_id, _ in relations + closures for term_id in (child_id, parent_id)}
+    terms.update({row.term_id: row for row in _fetch_terms(session, related - set(terms))})
+    # external terms namespace is unknown here
+    namespaces = [ontologies[ontology_id].namespace for ontology_id in sorted(ontologies)] + ['']
+    namespace_ids = {ontology_id: i for i, ontology_id in enumerate(sorted(ontologies))}
+
+    rows = sorted(terms.values(), key=lambda row: row.accession)
+    index = {row.term_id: i for i, row in enumerate(rows)}
+    accession_offsets, accession_data = _strings(row.accession for row in rows)
+    name_offsets, name_data = _strings(row.name for row in rows)
+    flags = array('B', [(IS_ROOT if row.is_root else 0) | (IS_OBSOLETE if row.is_obsolete else 0) for row in rows])
+    term_namespace = array('H', [namespace_ids.get(row.ontology_id, len(namespaces) - 1) for row in rows])
+    edges = [(index[child_id], index[parent_id], type_id) for child_id, parent_id, type_id in relations]
+    parent_offsets, parent_targets, parent_types = _csr(len(rows), edges)
+    child_offsets, child_targets, child_types = _csr(len(rows), [(parent, child, type_id)
+                                                                 for child, parent, type_id in edges])
+    closure_offsets, closure_targets, closure_distances = _csr(len(rows), [
+        (index[child_id], index[parent_id], distance) for child_id, parent_id, distance in closures])
+    metadata = {
+        'ontology': ontology_name.upper(),
+        'namespaces': namespaces,
+        'relation_types': relation_types,
+        'terms': len(rows),
+        'relations': len(edges),
+        'closures': len(closures),
+        'created': datetime.datetime.now().isoformat()
+    }
+    sections = [
+        ('metadata', array('B', json.dumps(metadata).encode('utf-8'))),
+        ('accession_offsets', accession_offsets),
+        ('accession_data', accession_data),
+        ('name_offsets', name_offsets),
+        ('name_data', name_data),
+        ('term_flags', flags),
+        ('term_namespace', term_namespace),
+        ('parent_offsets', array('I', parent_offsets)),
+        ('parent_targets', array('I', parent_targets)),
+        ('parent_types', array('H', parent_types)),
+        ('child_offsets', array('I', child_offsets)),
+        ('child_targets', array('I', child_targets)),
+        ('child_types', array('H', child_types)),
+        ('closure_offsets', array('I', closure_offsets)),
+        ('closure_targets', array('I', closure_targets)),
+        ('closure_distances', array('H', closure_distances))
+    ]
+    offset = _header.size + _section.size * len(sections)
+    table = []
+    for name, values in sections:
+        offset += -offset % 8
+        table.append((name, values, offset))
+        offset += len(values) * values.itemsize
+    with open(file_name + '.tmp', 'wb') as f:
+        f.write(_header.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        for name, values, offset in table:
+            f.write(_section.pack(name.encode('ascii'), values.typecode.encode('ascii'), offset, len(values)))
+        for name, values, offset in table:
+            f.write(b'\x00' * (offset - f.tell()))
+            if sys.byteorder != 'little':
+                values = array(values.typecode, values)
+                values.byteswap()
+            values.tofile(f)
+    os.replace(file_name + '.tmp', file_name)
+    logger.info('Exported %s snapshot %s: %s terms, %s relations, %s closures', ontology_name, file_name,
+                len(rows), len(edges), len(closures))
+    return metadata
+
+
+class SnapshotReader:
+    """ Memory mapped ontology snapshot.
+
+    Arrays are memoryviews on the mapped file, nothing is copied on open: opening a snapshot costs the same whatever
+    its size, and processes reading the same snapshot share the same pages.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        with open(file_name, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._sections = {}
+        try:
+            magic, version, nb_sections = _header.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ValueError('%s is not an ontology snapshot' % file_name)
+            if version != FORMAT_VERSION:
+                raise ValueError('Unsupported snapshot version %s in %s' % (version, file_name))
+            for i in range(nb_sections):
+                name, typecode, offset, length = _section.unpack_from(self._mmap, _header.size + i * _section.size)
+                typecode = typecode.rstrip(b'\x00').decode('ascii')
+                itemsize = array(typecode).itemsize
+                self._sections[name.rstrip(b'\x00').decode('ascii')] = self._view[
+                    offset:offset + length * itemsize].cast(typecode)
+        except Exception:
+            self.close()
+            raise
+        self.metadata = json.loads(bytes(self._sections['metadata']).decode('utf-8'))
+        self.relation_types = self.metadata['relation_types']
+        self.namespaces = self.metadata['namespaces']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Release all views, the file is unmapped """
+        for view in self._sections.values():
+            view.release()
+        self._sections = {}
+        self._view.release()
+        self._mmap.close()
+
+    def __len__(self):
+        return len(self._sections['term_flags'])
+
+    def _string(self, name, i):
+        offsets = self._sections[name + '_offsets']
+        return bytes(self._sections[name + '_data'][offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+    def accession(self, i):
+        return self._string('accession', i)
+
+    def name(self, i):
+        return self._string('name', i)
+
+    def index(self, accession):
+        """ Term index, by binary search on accessions, None if not found """
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.accession(middle) < accession:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self) and self.accession(low) == accession else None
+
+    def term(self, accession):
+        """ :return: dict term details, None if not found """
+        i = self.index(accession)
+        if i is None:
+            return None
+        flags = self._sections['term_flags'][i]
+        return {
+            'accession': accession,
+            'name': self.name(i),
+            'namespace': self.namespaces[self._sections['term_namespace'][i]],
+            'is_root': bool(flags & IS_ROOT),
+            'is_obsolete': bool(flags & IS_OBSOLETE)
+        }
+
+    def _targets(self, prefix, accession, values='types'):
+        i = self.index(accession)
+        if i is None:
+            raise KeyError(accession)
+        offsets = self._sections[prefix + '_offsets']
+        targets = self._sections[prefix + '_targets']
+        extra = self._sections[prefix + '_' + values]
+        for position in range(offsets[i], offsets[i + 1]):
+            yield self.accession(targets[position]), extra[position]
+
+    def parents(self, accession, relation_types=None):
+        """ :return: list of (parent accession, relation type name) """
+        return [(target, self.relation_types[type_id]) for target, type_id in self._targets('parent', accession)
+                if not relation_types or self.relation_types[type_id] in relation_types]
+
+    def children(self, accession, relation_types=None):
+        """ :return: list of (child accession, relation type name) """
+        return [(target, self.relation_types[type_id]) for target, type_id in self._targets('child', accession)
+                if not relation_types or self.relation_types[type_id] in relation_types]
+
+    def ancestors(self, accession):
+        """ :return: list of (ancestor accession, distance) from closure """
+        return list(self._targets('closure', accession, values='distances'))
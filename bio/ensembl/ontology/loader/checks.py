@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Post load consistency checks. Each check is one set based query over the whole database (anti joins and grouped
+counts), is_a cycles are searched on each ontology graph.
+"""
+import collections
+import datetime
+import json
+import logging
+import time
+
+from sqlalchemy import select, func, and_, distinct
+
+from .graph import OntologyGraph
+from .models import Ontology, Term, Synonym, AltId, Relation, RelationType, Closure
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['CheckResult', 'consistency_checks', 'check_consistency', 'write_report']
+
+CheckResult = collections.namedtuple('CheckResult', ['check', 'description', 'count', 'samples', 'seconds'])
+
+_ontology = Ontology.__table__
+_term = Term.__table__
+_relation = Relation.__table__
+_relation_type = RelationType.__table__
+
+# (table, foreign key column, referenced table), term ontology is checked on its own
+_references = [
+    (Synonym.__table__, 'term_id', _term),
+    (AltId.__table__, 'term_id', _term),
+    (_relation, 'child_term_id', _term),
+    (_relation, 'parent_term_id', _term),
+    (_relation, 'relation_type_id', _relation_type),
+    (_relation, 'ontology_id', _ontology),
+    (Closure.__table__, 'child_term_id', _term),
+    (Closure.__table__, 'parent_term_id', _term),
+    (Closure.__table__, 'subparent_term_id', _term),
+    (Closure.__table__, 'ontology_id', _ontology),
+]
+
+
+def _rows(session, query, sample_size):
+    """ :return: tuple number of rows of query, first sample_size rows as dicts """
+    count = session.execute(select([func.count()]).select_from(query.alias())).scalar()
+    samples = [dict(row) for row in session.execute(query.limit(sample_size))] if count else []
+    return count, samples
+
+
+def _dangling(table, column_name, target):
+    """ Rows of table whose column_name does not reference any target row """
+    column = table.c[column_name]
+    target_key = list(target.primary_key.columns)[0]
+    source_key = list(table.primary_key.columns)[0]
+    return select([source_key.label('id'), column.label('reference')]).select_from(
+        table.outerjoin(target, column == target_key)).where(and_(column.isnot(None), target_key.is_(None)))
+
+
+def cross_namespace_relations(session, sample_size):
+    """ Relations between terms of different namespaces (ontology rows), counted per namespaces and relation type """
+    child, parent = _term.alias('child'), _term.alias('parent')
+    child_ontology, parent_ontology = _ontology.alias('child_ontology'), _ontology.alias('parent_ontology')
+    query = select([child_ontology.c.name.label('ontology'), child_ontology.c.namespace.label('child_namespace'),
+                    parent_ontology.c.name.label('parent_ontology'),
+                    parent_ontology.c.namespace.label('parent_namespace'),
+                    _relation_type.c.name.label('relation_type'), func.count().label('relations'),
+                    func.min(child.c.accession).label('child_sample')]).select_from(
+        _relation.join(child, _relation.c.child_term_id == child.c.term_id).join(
+            parent, _relation.c.parent_term_id == parent.c.term_id).join(
+            child_ontology, child.c.ontology_id == child_ontology.c.ontology_id).join(
+            parent_ontology, parent.c.ontology_id == parent_ontology.c.ontology_id).join(
+            _relation_type, _relation.c.relation_type_id == _relation_type.c.relation_type_id)).where(
+        child.c.ontology_id != parent.c.ontology_id).group_by(
+        child_ontology.c.name, child_ontology.c.namespace, parent_ontology.c.name, parent_ontology.c.namespace,
+        _relation_type.c.name)
+    groups = [dict(row) for row in session.execute(query)]
+    return sum(group['relations'] for group in groups), groups[:sample_size]
+
+
+def dangling_references(session, sample_size):
+    """ Synonyms, alt ids, relations and closure rows referencing missing rows """
+    count = 0
+    samples = []
+    for table, column_name, target in _references:
+        table_count, table_samples = _rows(session, _dangling(table, column_name, target), sample_size)
+        if table_count:
+            count += table_count
+            samples.append({'table': table.name, 'column': column_name, 'rows': table_count,
+                            'samples': table_samples})
+    return count, samples
+
+
+def terms_without_ontology(session, sample_size):
+    """ Terms whose ontology row is missing """
+    query = _dangling(_term, 'ontology_id', _ontology).column(_term.c.accession)
+    return _rows(session, query, sample_size)
+
+
+def duplicate_synonyms(session, sample_size):
+    """ Same synonym name recorded more than once for a term """
+    synonym = Synonym.__table__
+    query = select([_term.c.accession, synonym.c.name, func.count().label('rows')]).select_from(
+        synonym.join(_term, synonym.c.term_id == _term.c.term_id)).group_by(
+        _term.c.accession, synonym.c.name).having(func.count() > 1)
+    return _rows(session, query, sample_size)
+
+
+def duplicate_relations(session, sample_size):
+    """ Same relation recorded more than once, whatever its intersection_of flag """
+    columns = [_relation.c.child_term_id, _relation.c.parent_term_id, _relation.c.relation_type_id,
+               _relation.c.ontology_id]
+    query = select(columns + [func.count().label('rows')]).group_by(*columns).having(func.count() > 1)
+    return _rows(session, query, sample_size)
+
+
+def is_a_cycles(session, sample_size):
+    """ Cycles of is_a relations, per ontology """
+    cycles = []
+    for ontology_name, in session.execute(select([distinct(_ontology.c.name)]).order_by(_ontology.c.name)):
+        graph = OntologyGraph.from_db(session, ontology_name, relation_types=['is_a'])
+        cycles.extend({'ontology': ontology_name, 'terms': cycle} for cycle in graph.cycles(['is_a']))
+    return len(cycles), cycles[:sample_size]
+
+
+consistency_checks = collections.OrderedDict([
+    ('cross_namespace_relations', cross_namespace_relations),
+    ('dangling_references', dangling_references),
+    ('terms_without_ontology', terms_without_ontology),
+    ('duplicate_synonyms', duplicate_synonyms),
+    ('duplicate_relations', duplicate_relations),
+    ('is_a_cycles', is_a_cycles),
+])
+
+
+def check_consistency(session, checks=None, sample_size=20):
+    """
+    Run consistency checks on a loaded database
+    :param session: db session
+    :param checks: check names, defaults to all consistency_checks
+    :param sample_size: max number of offending rows (or groups) reported per check
+    :return: list of CheckResult, count is 0 for passed checks
+    """
+    results = []
+    for name in checks or consistency_checks:
+        check = consistency_checks[name]
+        start = time.perf_counter()
+        count, samples = check(session, sample_size)
+        results.append(CheckResult(name, check.__doc__.strip(), count, samples, time.perf_counter() - start))
+        if count:
+            logger.warning('Check %s failed: %s issues', name, count)
+        else:
+            logger.info('Check %s passed', name)
+    return results
+
+
+def write_report(results, file_name):
+    """
+    Write checks results as JSON
+    :param results: list of CheckResult
+    :param file_name: report file
+    :return: total number of issues
+    """
+    issues = sum(result.count for result in results)
+    with open(file_name, 'w') as report:
+        json.dump({'date': datetime.datetime.now().isoformat(), 'issues': issues,
+                   'checks': [result._asdict() for result in results]}, report, indent=2, default=str)
+    logger.info('Consistency report written to %s: %s issues', file_name, issues)
+    return issues
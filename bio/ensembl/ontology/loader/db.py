@@ -14,11 +14,15 @@
 """
 import contextlib
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import sqlalchemy
 from sqlalchemy.orm import sessionmaker
 
-from .models import Base
+from .fts import drop_fts
+from .ids import IdAllocator
+from .models import Base, LoaderBase
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +36,7 @@ class DataAccessLayer:
     metadata = Base.metadata
     options = {}
     session = None
+    id_allocator = None
 
     def db_init(self, conn_string, **options):
         extra_params = {}
@@ -47,22 +52,83 @@ class DataAccessLayer:
                                                **extra_params)
         self.options = options or {}
         self.connection = self.engine.connect()
+        # primary keys assigned client side by blocks, see IdAllocator
+        block_size = self.options.get('id_block_size')
+        self.id_allocator = IdAllocator(self.engine, block_size) if block_size else None
 
-    def create_schema(self):
+    def create_schema(self, defer_indexes=False):
+        """
+        Create schema tables if not exist.
+        :param defer_indexes: bulk load mode, secondary indexes are not maintained until build_indexes is called
+        """
         if not self.engine:
             raise RuntimeError('Please call db_init first')
         self.metadata.create_all(self.engine)
+        LoaderBase.metadata.create_all(self.engine)
+        if defer_indexes:
+            self.disable_indexes()
+
+    @staticmethod
+    def deferred_indexes(table):
+        """ Secondary indexes, unique ones are kept while loading as they guarantee data consistency """
+        return [index for index in table.indexes if not index.unique]
+
+    def _existing_indexes(self, table):
+        return {index['name'] for index in sqlalchemy.inspect(self.engine).get_indexes(table.name)}
+
+    def disable_indexes(self):
+        """ Stop maintaining secondary indexes: disable keys on MyISAM tables, drop indexes otherwise """
+        for table in self.metadata.sorted_tables:
+            if self.engine.dialect.name == 'mysql':
+                self.engine.execute('ALTER TABLE {} DISABLE KEYS'.format(
+                    self.engine.dialect.identifier_preparer.format_table(table)))
+            else:
+                existing = self._existing_indexes(table)
+                for index in self.deferred_indexes(table):
+                    if index.name in existing:
+                        index.drop(self.engine)
+            logger.info('Deferred %s secondary indexes', table.name)
+
+    def _build_table_indexes(self, table):
+        start = time.time()
+        if self.engine.dialect.name == 'mysql':
+            # MyISAM rebuilds all disabled indexes by sort at once
+            self.engine.execute('ALTER TABLE {} ENABLE KEYS'.format(
+                self.engine.dialect.identifier_preparer.format_table(table)))
+        else:
+            existing = self._existing_indexes(table)
+            for index in self.deferred_indexes(table):
+                if index.name not in existing:
+                    index.create(self.engine)
+        logger.info('Built %s secondary indexes in %.2fs', table.name, time.time() - start)
+        return table.name, time.time() - start
+
+    def build_indexes(self, workers=4):
+        """
+        Build secondary indexes deferred by create_schema, one table per worker (MySQL only).
+        :param workers: number of tables indexed in parallel
+        :return: dict table name => indexing time in seconds
+        """
+        if not self.engine:
+            raise RuntimeError('Please call db_init first')
+        workers = workers if self.engine.dialect.name == 'mysql' else 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(executor.map(self._build_table_indexes, self.metadata.sorted_tables))
 
     def wipe_schema(self, conn_string):
         engine = sqlalchemy.create_engine(conn_string, echo=False)
         if not engine:
             raise RuntimeError("Can't wipe schema prior to init db")
+        drop_fts(engine)
         Base.metadata.drop_all(engine)
+        LoaderBase.metadata.drop_all(engine)
 
     def get_session(self):
         Session = sessionmaker()
         session = Session(bind=self.engine, autoflush=self.options.get('autoflush', False),
                          autocommit=self.options.get('autocommit', False))
+        if self.id_allocator:
+            self.id_allocator.install(session)
         logger.debug('Create a new session ...%s ', session)
         return session
 
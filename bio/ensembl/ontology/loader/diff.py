@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Release diff between two ontology databases. Terms (with their synonyms and alt ids) and relations of both databases
+are streamed sorted by accession through server side cursors, and compared by a merge join: memory is bounded by the
+fetch chunk size, whatever the databases size.
+"""
+import collections
+import enum
+import itertools
+import json
+import logging
+
+from sqlalchemy import select, cast, LargeBinary
+
+from .models import Ontology, Term, Synonym, AltId, Relation, RelationType
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['Change', 'merge_join', 'term_rows', 'edge_rows', 'diff_databases', 'write_feed', 'term_fields']
+
+Change = collections.namedtuple('Change', ['change', 'kind', 'ontology', 'key', 'old', 'new'])
+
+# compared term values, synonyms and alt ids included
+term_fields = ('ontology', 'namespace', 'name', 'definition', 'subsets', 'is_root', 'is_obsolete', 'iri',
+               'synonyms', 'alt_ids')
+
+_term = Term.__table__
+_ontology = Ontology.__table__
+
+
+def _sorted(engine, column):
+    """ Sort column by bytes on MySQL, so that server order matches python strings order whatever the collation """
+    return cast(column, LargeBinary) if engine.dialect.name == 'mysql' else column
+
+
+def _value(value):
+    return value.name if isinstance(value, enum.Enum) else value
+
+
+def _stream(engine, query, chunk_size):
+    """ Rows of query read through a dedicated connection, chunk_size at once """
+    connection = engine.connect().execution_options(stream_results=True)
+    try:
+        result = connection.execute(query)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(_value(value) for value in row)
+        result.close()
+    finally:
+        connection.close()
+
+
+def _filtered(query, ontologies):
+    if ontologies:
+        return query.where(_ontology.c.name.in_([name.upper() for name in ontologies]))
+    return query
+
+
+def _grouped(rows):
+    """ Consecutive rows grouped by their first value: (first value, list of remaining values) """
+    for key, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield key, [row[1:] for row in group]
+
+
+def _attach(terms, groups, field):
+    """ Attach sorted grouped rows to terms dicts sharing their accession """
+    current = next(groups, None)
+    for accession, term in terms:
+        while current is not None and current[0] < accession:
+            current = next(groups, None)
+        if current is not None and current[0] == accession:
+            # synonyms hold nullable values, sorted on their JSON form
+            term[field] = sorted((list(values) if len(values) > 1 else values[0] for values in current[1]),
+                                 key=json.dumps)
+            current = next(groups, None)
+        else:
+            term[field] = []
+        yield accession, term
+
+
+def term_rows(engine, ontologies=None, chunk_size=10000):
+    """
+    Stream terms sorted by accession
+    :param engine: db engine
+    :param ontologies: restrict to these ontology names
+    :param chunk_size: rows fetched at once
+    :return: generator of (accession, dict of term_fields values)
+    """
+    tables = _term.join(_ontology, _term.c.ontology_id == _ontology.c.ontology_id)
+    terms = _filtered(select([_term.c.accession, _ontology.c.name, _ontology.c.namespace, _term.c.name,
+                              _term.c.definition, _term.c.subsets, _term.c.is_root, _term.c.is_obsolete,
+                              _term.c.iri]).select_from(tables), ontologies)
+    synonym = Synonym.__table__
+    synonyms = _filtered(select([_term.c.accession, synonym.c.name, synonym.c.type, synonym.c.dbxref]).select_from(
+        synonym.join(tables, synonym.c.term_id == _term.c.term_id)), ontologies)
+    alt_id = AltId.__table__
+    alt_ids = _filtered(select([_term.c.accession, alt_id.c.accession]).select_from(
+        alt_id.join(tables, alt_id.c.term_id == _term.c.term_id)), ontologies)
+    order = _sorted(engine, _term.c.accession)
+    rows = ((row[0], dict(zip(term_fields, row[1:]))) for row in
+            _stream(engine, terms.order_by(order), chunk_size))
+    rows = _attach(rows, _grouped(_stream(engine, synonyms.order_by(order), chunk_size)), 'synonyms')
+    return _attach(rows, _grouped(_stream(engine, alt_ids.order_by(order), chunk_size)), 'alt_ids')
+
+
+def edge_rows(engine, ontologies=None, chunk_size=10000):
+    """
+    Stream relations sorted by (child accession, parent accession, relation type, relation ontology)
+    :return: generator of (key tuple, dict of relation values)
+    """
+    child, parent = _term.alias('child'), _term.alias('parent')
+    relation = Relation.__table__
+    relation_type = RelationType.__table__
+    query = _filtered(select([child.c.accession, parent.c.accession, relation_type.c.name, _ontology.c.name,
+                              relation.c.intersection_of]).select_from(
+        relation.join(child, relation.c.child_term_id == child.c.term_id).join(
+            parent, relation.c.parent_term_id == parent.c.term_id).join(
+            relation_type, relation.c.relation_type_id == relation_type.c.relation_type_id).join(
+            _ontology, relation.c.ontology_id == _ontology.c.ontology_id)), ontologies)
+    query = query.order_by(*(_sorted(engine, column) for column in (child.c.accession, parent.c.accession,
+                                                                    relation_type.c.name, _ontology.c.name)))
+    for key, values in itertools.groupby(_stream(engine, query, chunk_size), key=lambda row: row[:4]):
+        yield key, {'intersection_of': sorted({row[4] for row in values})}
+
+
+def merge_join(old, new):
+    """
+    Full outer merge join of two streams sorted on their keys
+    :param old: iterable of (key, value), keys sorted and unique
+    :param new: iterable of (key, value), keys sorted and unique
+    :return: generator of (key, old value or None, new value or None)
+    """
+    old, new = iter(old), iter(new)
+    old_item, new_item = next(old, None), next(new, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            yield old_item[0], old_item[1], None
+            old_item = next(old, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            yield new_item[0], None, new_item[1]
+            new_item = next(new, None)
+        else:
+            yield old_item[0], old_item[1], new_item[1]
+            old_item, new_item = next(old, None), next(new, None)
+
+
+def _changes(kind, joined, ontology):
+    for key, old, new in joined:
+        if old is None:
+            yield Change('added', kind, ontology(new, key), key, None, new)
+        elif new is None:
+            yield Change('removed', kind, ontology(old, key), key, old, None)
+        elif old != new:
+            changed = [name for name in new if old.get(name) != new[name]]
+            yield Change('changed', kind, ontology(new, key), key, {name: old.get(name) for name in changed},
+                         {name: new[name] for name in changed})
+
+
+def diff_databases(old_engine, new_engine, ontologies=None, chunk_size=10000):
+    """
+    Differences between two releases databases, terms first then edges
+    :param old_engine: previous release db engine
+    :param new_engine: new release db engine
+    :param ontologies: restrict to these ontology names
+    :param chunk_size: rows fetched at once per stream
+    :return: generator of Change, changed values only hold changed fields
+    """
+    yield from _changes('term', merge_join(term_rows(old_engine, ontologies, chunk_size),
+                                           term_rows(new_engine, ontologies, chunk_size)),
+                        lambda term, key: term['ontology'])
+    yield from _changes('edge', merge_join(edge_rows(old_engine, ontologies, chunk_size),
+                                           edge_rows(new_engine, ontologies, chunk_size)),
+                        lambda edge, key: key[3])
+
+
+def _feed_line(change):
+    line = {'change': change.change, 'kind': change.kind, 'ontology': change.ontology}
+    if change.kind == 'term':
+        line['accession'] = change.key
+    else:
+        line.update(zip(('child', 'parent', 'relation'), change.key))
+    if change.old is not None:
+        line['old'] = change.old
+    if change.new is not None:
+        line['new'] = change.new
+    return line
+
+
+def write_feed(changes, file_name):
+    """
+    Write changes as a JSON lines change feed
+    :param changes: iterable of Change
+    :param file_name: feed file
+    :return: summary dict ontology => kind => change => count
+    """
+    summary = collections.defaultdict(lambda: collections.defaultdict(collections.Counter))
+    with open(file_name, 'w') as feed:
+        for change in changes:
+            feed.write(json.dumps(_feed_line(change), sort_keys=True))
+            feed.write('\n')
+            summary[change.ontology][change.kind][change.change] += 1
+    logger.info('Change feed written to %s', file_name)
+    return {ontology: {kind: dict(counts) for kind, counts in kinds.items()} for ontology, kinds in summary.items()}
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Columnar export of ontology tables, one Parquet (or Arrow IPC) file per table and ontology, laid out as
+`<output_dir>/<table>/ontology=<NAME>/<table>.<format>` so that partitioned dataset readers pick the ontology up as a
+column. Tables without ontology (subset, relation_type) are exported in a single file.
+"""
+import datetime
+import enum
+import logging
+import os
+import time
+
+from sqlalchemy import select
+
+from .models import Ontology, Term, Subset, RelationType, Relation, Closure, AltId, Synonym
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['exported_tables', 'export_formats', 'table_partitions', 'export_tables']
+
+exported_tables = ['ontology', 'subset', 'relation_type', 'term', 'synonym', 'alt_id', 'relation', 'closure']
+export_formats = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+_tables = {model.__tablename__: model.__table__ for model in
+           (Ontology, Subset, RelationType, Term, Synonym, AltId, Relation, Closure)}
+
+
+def _partition_query(table_name, ontology_ids):
+    """ Select a table rows belonging to ontology ids, all rows when ontology_ids is None """
+    table = _tables[table_name]
+    query = select([table])
+    if ontology_ids is None:
+        return query
+    if 'ontology_id' in table.c:
+        return query.where(table.c.ontology_id.in_(ontology_ids))
+    term = Term.__table__
+    return query.select_from(table.join(term, table.c.term_id == term.c.term_id)).where(
+        term.c.ontology_id.in_(ontology_ids))
+
+
+def table_partitions(connection, table_name, ontologies=None, chunk_size=10000):
+    """
+    Stream a table by ontology partitions, rows read through a server side cursor
+    :param connection: db connection
+    :param table_name: exported table name
+    :param ontologies: ontology names to export, all ontologies if None
+    :param chunk_size: number of rows fetched at once
+    :return: generator of (ontology name, columns, chunks generator) tuples, ontology name is None for tables
+    without ontology. Each partition chunks must be consumed before next partition is read
+    """
+    connection = connection.execution_options(stream_results=True)
+    if table_name in ('subset', 'relation_type'):
+        partitions = [(None, None)]
+    else:
+        names = {}
+        query = select([Ontology.__table__.c.ontology_id, Ontology.__table__.c.name])
+        if ontologies:
+            query = query.where(Ontology.__table__.c.name.in_([name.upper() for name in ontologies]))
+        for ontology_id, name in connection.execute(query):
+            names.setdefault(name, []).append(ontology_id)
+        partitions = sorted(names.items())
+    for name, ontology_ids in partitions:
+        result = connection.execute(_partition_query(table_name, ontology_ids))
+
+        def chunks(result=result):
+            try:
+                while True:
+                    rows = result.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                result.close()
+
+        yield name, list(result.keys()), chunks()
+
+
+def _arrow_type(column):
+    # with_variant types only know their python type through their default implementation
+    column_type = getattr(column.type, 'impl', column.type)
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return pyarrow.string()
+    if issubclass(python_type, bool):
+        return pyarrow.bool_()
+    if issubclass(python_type, int):
+        return pyarrow.int64()
+    if issubclass(python_type, float):
+        return pyarrow.float64()
+    if issubclass(python_type, datetime.datetime):
+        return pyarrow.timestamp('s')
+    if issubclass(python_type, datetime.date):
+        return pyarrow.date32()
+    return pyarrow.string()
+
+
+def _arrow_schema(table_name):
+    return pyarrow.schema([(column.name, _arrow_type(column)) for column in _tables[table_name].columns])
+
+
+def _value(value):
+    return value.name if isinstance(value, enum.Enum) else value
+
+
+def _batch(schema, rows):
+    arrays = [pyarrow.array([_value(value) for value in column], type=field.type)
+              for field, column in zip(schema, zip(*rows))]
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _export_partition(file_name, schema, chunks, export_format):
+    """ Write chunks as they come, only one chunk is held in memory """
+    nb_rows = 0
+    tmp_file = file_name + '.tmp'
+    if export_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(tmp_file, schema, compression='snappy')
+
+        def write(batch):
+            writer.write_table(pyarrow.Table.from_batches([batch]))
+    else:
+        writer = pyarrow.ipc.new_file(tmp_file, schema)
+        write = writer.write_batch
+    try:
+        for rows in chunks:
+            write(_batch(schema, rows))
+            nb_rows += len(rows)
+    finally:
+        writer.close()
+    os.replace(tmp_file, file_name)
+    return nb_rows
+
+
+def export_tables(engine, output_dir, tables=None, ontologies=None, export_format='parquet', chunk_size=10000):
+    """
+    Export ontology tables into columnar files
+    :param engine: source db engine
+    :param output_dir: export root directory
+    :param tables: table names to export, defaults to all exported_tables
+    :param ontologies: ontology names to export, defaults to all
+    :param export_format: one of export_formats keys
+    :param chunk_size: rows fetched and written at once
+    :return: dict per table of rows, files, bytes and seconds
+    """
+    if pyarrow is None:
+        raise RuntimeError('Columnar export requires pyarrow, please install it (pip install pyarrow)')
+    if export_format not in export_formats:
+        raise ValueError('Unknown export format %s, expected one of %s' % (export_format, list(export_formats)))
+    stats = {}
+    connection = engine.connect()
+    try:
+        for table_name in tables or exported_tables:
+            start = time.perf_counter()
+            schema = _arrow_schema(table_name)
+            table_stats = stats[table_name] = {'rows': 0, 'files': 0, 'bytes': 0}
+            for name, columns, chunks in table_partitions(connection, table_name, ontologies, chunk_size):
+                directory = os.path.join(output_dir, table_name)
+                if name is not None:
+                    directory = os.path.join(directory, 'ontology=%s' % name)
+                os.makedirs(directory, exist_ok=True)
+                file_name = os.path.join(directory, '%s.%s' % (table_name, export_formats[export_format]))
+                table_stats['rows'] += _export_partition(file_name, schema, chunks, export_format)
+                table_stats['files'] += 1
+                table_stats['bytes'] += os.path.getsize(file_name)
+            table_stats['seconds'] = time.perf_counter() - start
+            logger.info('Exported %s: %s rows in %s files, %.2fs', table_name, table_stats['rows'],
+                        table_stats['files'], table_stats['seconds'])
+    finally:
+        connection.close()
+    return stats
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Fast OLS fetch path: terms pages and relations read as raw HAL JSON over one keep-alive HTTP session, decoded into
+TermRecord without going through coreapi documents and ols-client helpers.
+"""
+import json
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .records import TermRecord
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['OlsFetcher', 'TermPages', 'default_api_url']
+
+default_api_url = 'https://www.ebi.ac.uk/ols/api'
+
+
+class OlsFetcher:
+    """ OLS terms and relations fetcher.
+
+    Terms and relations pages requests go through `call` when set (e.g. the loader RateLimiter.call), so that each
+    page is rate limited and retried like ols-client requests.
+    """
+
+    def __init__(self, base_url=None, page_size=500, call=None, timeout=60, pool_size=4):
+        self.base_url = (base_url or default_api_url).rstrip('/')
+        self.page_size = page_size
+        self.call = call
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/json'})
+        self.requests = 0
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, url, params=None):
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        self.requests += 1
+        return loads(response.content)
+
+    def get(self, url, params=None):
+        """ :return: decoded JSON document """
+        if self.call:
+            return self.call(self._request, url, params)
+        return self._request(url, params)
+
+    def _records(self, document):
+        return [TermRecord.from_json(data, self) for data in document.get('_embedded', {}).get('terms', [])]
+
+    def terms_page(self, ontology_name, page):
+        """
+        :return: tuple list of TermRecord, total number of terms in ontology
+        """
+        document = self.get('{}/ontologies/{}/terms'.format(self.base_url, ontology_name.lower()),
+                            {'page': page, 'size': self.page_size})
+        return self._records(document), document.get('page', {}).get('totalElements', 0)
+
+    def terms(self, ontology_name, start=0, end=None):
+        """
+        Ontology terms, pages are only fetched while iterating
+        :param ontology_name: ontology short name
+        :param start: first term index
+        :param end: last term index (inclusive), last ontology term if None
+        :return: TermPages
+        """
+        return TermPages(self, ontology_name, start, end)
+
+    def related(self, url):
+        """ :return: list of TermRecord of a relation link, all pages """
+        records = []
+        params = {'size': self.page_size}
+        while url:
+            document = self.get(url, params)
+            records.extend(self._records(document))
+            url = document.get('_links', {}).get('next', {}).get('href')
+            # next link holds its own paging parameters
+            params = None
+        return records
+
+
+class TermPages:
+    """ Lazy sequence of an ontology terms range, sliced like ols-client terms lists """
+
+    def __init__(self, fetcher, ontology_name, start=0, end=None):
+        self.fetcher = fetcher
+        self.ontology_name = ontology_name
+        self.start = start
+        self.end = end
+        self._total = None
+        self._first_page = None
+
+    @property
+    def total(self):
+        """ Number of terms in ontology, first page is kept for iteration """
+        if self._total is None:
+            page = self.start // self.fetcher.page_size
+            records, self._total = self.fetcher.terms_page(self.ontology_name, page)
+            self._first_page = (page, records)
+        return self._total
+
+    def _stop(self):
+        return self.total if self.end is None else min(self.end + 1, self.total)
+
+    def __len__(self):
+        return max(0, self._stop() - self.start)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step not in (None, 1):
+            raise TypeError('TermPages only support contiguous slices')
+        start, stop, _ = item.indices(len(self))
+        return TermPages(self.fetcher, self.ontology_name, self.start + start, self.start + stop - 1)
+
+    def __iter__(self):
+        page_size = self.fetcher.page_size
+        stop = self._stop()
+        index = self.start
+        while index < stop:
+            page = index // page_size
+            if self._first_page and self._first_page[0] == page:
+                records = self._first_page[1]
+            else:
+                records, total = self.fetcher.terms_page(self.ontology_name, page)
+            if not records:
+                break
+            for record in records[index - page * page_size:stop - page * page_size]:
+                yield record
+            index = (page + 1) * page_size
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+SQLite FTS5 full text search over term names, definitions and synonyms. Index tables are external content tables
+(only the index is stored, text is read from term and synonym), kept in sync by triggers on term and synonym.
+"""
+import collections
+import logging
+import re
+import time
+
+from sqlalchemy import text, bindparam
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['build_fts', 'drop_fts', 'fts_query', 'search', 'like_search', 'search_benchmark', 'SearchResult']
+
+SearchResult = collections.namedtuple('SearchResult', ['accession', 'name', 'ontology', 'rank'])
+
+# table: (key column, indexed columns)
+_fts_tables = collections.OrderedDict([
+    ('term', ('term_id', ('name', 'definition'))),
+    ('synonym', ('synonym_id', ('name',)))
+])
+# bm25 weights: term names matter more than definitions, synonyms rank after names
+NAME_WEIGHT = 10.0
+DEFINITION_WEIGHT = 1.0
+SYNONYM_WEIGHT = 0.8
+
+
+def _statements(table):
+    key, columns = _fts_tables[table]
+    fts = table + '_fts'
+    values = ', '.join(columns)
+    new = ', '.join('new.' + column for column in columns)
+    old = ', '.join('old.' + column for column in columns)
+    delete = "INSERT INTO {fts}({fts}, rowid, {values}) VALUES('delete', old.{key}, {old});".format(
+        fts=fts, values=values, key=key, old=old)
+    insert = "INSERT INTO {fts}(rowid, {values}) VALUES(new.{key}, {new});".format(
+        fts=fts, values=values, key=key, new=new)
+    return [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({values}, content='{table}', content_rowid='{key}')".format(
+            fts=fts, values=values, table=table, key=key),
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END".format(
+            fts=fts, table=table, insert=insert),
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END".format(
+            fts=fts, table=table, delete=delete),
+        "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {values} ON {table} BEGIN {delete} {insert} END".format(
+            fts=fts, values=values, table=table, delete=delete, insert=insert)
+    ]
+
+
+def build_fts(engine, rebuild=False):
+    """
+    Create full text index tables and their sync triggers, index is filled from current content when created (or
+    when term / synonym tables have been recreated meanwhile)
+    :param engine: SQLite db engine
+    :param rebuild: force index rebuild
+    :return: False if engine is not SQLite, True otherwise
+    """
+    if engine.dialect.name != 'sqlite':
+        logger.warning('Full text index is only available for SQLite, skipped for %s', engine.dialect.name)
+        return False
+    with engine.begin() as connection:
+        for table in _fts_tables:
+            fts = table + '_fts'
+            # triggers are dropped with their table, index content is stale if table has been recreated
+            existing = connection.execute(text("SELECT name FROM sqlite_master WHERE name = :name"),
+                                          name=fts + '_ai').scalar()
+            start = time.perf_counter()
+            for statement in _statements(table):
+                connection.execute(text(statement))
+            if rebuild or existing is None:
+                connection.execute(text("INSERT INTO {fts}({fts}) VALUES('rebuild')".format(fts=fts)))
+                logger.info('Full text index %s built in %.2fs', fts, time.perf_counter() - start)
+    return True
+
+
+def drop_fts(engine):
+    """ Drop full text index tables and triggers """
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as connection:
+        for table in _fts_tables:
+            for suffix in ('_ai', '_ad', '_au'):
+                connection.execute(text('DROP TRIGGER IF EXISTS {}_fts{}'.format(table, suffix)))
+            connection.execute(text('DROP TABLE IF EXISTS {}_fts'.format(table)))
+
+
+def fts_query(query, prefix=True):
+    """
+    FTS5 query from free text: every word is required, as a quoted string so that FTS syntax is never interpreted
+    :param query: user text
+    :param prefix: last word is a prefix (search as you type)
+    :return: FTS5 MATCH expression, None if query has no word
+    """
+    words = re.findall(r'\w+', query or '')
+    if not words:
+        return None
+    expression = ' '.join('"%s"' % word for word in words)
+    return expression + '*' if prefix else expression
+
+
+_search = """
+WITH hits(term_id, rank) AS (
+    SELECT rowid, bm25(term_fts, {name_weight}, {definition_weight}) FROM term_fts WHERE term_fts MATCH :query
+    UNION ALL
+    SELECT synonym.term_id, bm25(synonym_fts) * {synonym_weight}
+    FROM synonym_fts JOIN synonym ON synonym.synonym_id = synonym_fts.rowid WHERE synonym_fts MATCH :query
+)
+SELECT term.accession, term.name, ontology.name, min(hits.rank) AS rank
+FROM hits JOIN term ON term.term_id = hits.term_id JOIN ontology ON ontology.ontology_id = term.ontology_id
+{where}
+GROUP BY term.term_id
+ORDER BY rank
+LIMIT :limit
+"""
+
+
+def search(session, query, limit=20, ontologies=None, prefix=True):
+    """
+    Ranked full text search, build_fts must have been run on the database
+    :param session: db session or connection
+    :param query: free text
+    :param limit: max number of results
+    :param ontologies: restrict to these ontology names
+    :param prefix: last word is a prefix
+    :return: list of SearchResult, best match first (bm25 rank, lower is better)
+    """
+    match = fts_query(query, prefix)
+    if match is None:
+        return []
+    where = 'WHERE ontology.name IN :ontologies' if ontologies else ''
+    statement = text(_search.format(name_weight=NAME_WEIGHT, definition_weight=DEFINITION_WEIGHT,
+                                    synonym_weight=SYNONYM_WEIGHT, where=where))
+    params = {'query': match, 'limit': limit}
+    if ontologies:
+        statement = statement.bindparams(bindparam('ontologies', expanding=True))
+        params['ontologies'] = [name.upper() for name in ontologies]
+    return [SearchResult(*row) for row in session.execute(statement, params)]
+
+
+def like_search(session, query, limit=20, ontologies=None):
+    """ Unranked LIKE scan equivalent of search, benchmarks baseline """
+    where = 'AND ontology.name IN :ontologies' if ontologies else ''
+    statement = text("""
+        SELECT DISTINCT term.accession, term.name, ontology.name, NULL
+        FROM term JOIN ontology ON ontology.ontology_id = term.ontology_id
+        LEFT JOIN synonym ON synonym.term_id = term.term_id
+        WHERE (term.name LIKE :pattern OR term.definition LIKE :pattern OR synonym.name LIKE :pattern) {where}
+        LIMIT :limit""".format(where=where))
+    params = {'pattern': '%' + query + '%', 'limit': limit}
+    if ontologies:
+        statement = statement.bindparams(bindparam('ontologies', expanding=True))
+        params['ontologies'] = [name.upper() for name in ontologies]
+    return [SearchResult(*row) for row in session.execute(statement, params)]
+
+
+def search_benchmark(session, queries, limit=20):
+    """
+    Time full text search against LIKE scans on the same queries
+    :return: dict per method of queries, hits, p50, p99 and total latencies in milliseconds
+    """
+    results = {}
+    for name, method in (('fts', search), ('like', like_search)):
+        timings = []
+        hits = 0
+        for query in queries:
+            start = time.perf_counter()
+            hits += len(method(session, query, limit))
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        results[name] = {
+            'queries': len(timings),
+            'hits': hits,
+            'p50': timings[len(timings) // 2] if timings else 0,
+            'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))] if timings else 0,
+            'total': sum(timings)
+        }
+    return results
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import collections
+import logging
+from array import array
+
+from sqlalchemy.orm import aliased
+
+from .models import Ontology, Term, Relation, RelationType
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['OntologyGraph']
+
+
+def _csr(nb_nodes, edges):
+    """
+    Compressed sparse rows of edges
+    :param nb_nodes: number of nodes
+    :param edges: list of (source, target, type) tuples
+    :return: tuple offsets, targets, types arrays, node i targets are targets[offsets[i]:offsets[i + 1]]
+    """
+    offsets = array('l', [0] * (nb_nodes + 1))
+    for source, target, edge_type in edges:
+        offsets[source + 1] += 1
+    for i in range(nb_nodes):
+        offsets[i + 1] += offsets[i]
+    position = array('l', offsets[:-1])
+    targets = array('l', [0] * len(edges))
+    types = array('H', [0] * len(edges))
+    for source, target, edge_type in edges:
+        targets[position[source]] = target
+        types[position[source]] = edge_type
+        position[source] += 1
+    return offsets, targets, types
+
+
+class OntologyGraph:
+    """ Read only ontology graph, relations kept in CSR arrays in both directions.
+
+    Terms are addressed by accession, mapped to dense integer ids. Every query accepts an optional list of relation
+    type names to follow, all relation types are followed otherwise.
+    """
+
+    def __init__(self, accessions, relations):
+        """
+        :param accessions: terms accessions
+        :param relations: list of (child accession, parent accession, relation type name) tuples
+        """
+        self.accessions = list(accessions)
+        self.ids = {accession: i for i, accession in enumerate(self.accessions)}
+        self.relation_types = []
+        type_ids = {}
+        edges = []
+        for child, parent, type_name in relations:
+            for accession in (child, parent):
+                if accession not in self.ids:
+                    self.ids[accession] = len(self.accessions)
+                    self.accessions.append(accession)
+            if type_name not in type_ids:
+                type_ids[type_name] = len(self.relation_types)
+                self.relation_types.append(type_name)
+            edges.append((self.ids[child], self.ids[parent], type_ids[type_name]))
+        self._type_ids = type_ids
+        self.nb_relations = len(edges)
+        self._up = _csr(len(self.accessions), edges)
+        self._down = _csr(len(self.accessions), [(parent, child, edge_type) for child, parent, edge_type in edges])
+
+    @classmethod
+    def from_db(cls, session, ontology_name, namespace=None, relation_types=None):
+        """
+        Load an ontology relations graph
+        :param session: db session
+        :param ontology_name: ontology short name
+        :param namespace: only load relations from this namespace
+        :param relation_types: only load these relation types names
+        :return: OntologyGraph
+        """
+        ontologies = session.query(Ontology.id).filter(Ontology.name == ontology_name.upper())
+        if namespace is not None:
+            ontologies = ontologies.filter(Ontology.namespace == namespace)
+        ontology_ids = [ontology_id for ontology_id, in ontologies]
+        accessions = [accession for accession, in session.query(Term.accession).filter(
+            Term.ontology_id.in_(ontology_ids)).order_by(Term.term_id)]
+        child, parent = aliased(Term), aliased(Term)
+        relations = session.query(child.accession, parent.accession, RelationType.name).select_from(Relation).join(
+            child, Relation.child_term_id == child.term_id).join(
+            parent, Relation.parent_term_id == parent.term_id).join(
+            RelationType, Relation.relation_type_id == RelationType.relation_type_id).filter(
+            Relation.ontology_id.in_(ontology_ids))
+        if relation_types:
+            relations = relations.filter(RelationType.name.in_(relation_types))
+        graph = cls(accessions, relations.yield_per(10000))
+        logger.info('Loaded %s graph: %s terms, %s relations', ontology_name, len(graph), graph.nb_relations)
+        return graph
+
+    def __len__(self):
+        return len(self.accessions)
+
+    def __contains__(self, accession):
+        return accession in self.ids
+
+    def _types_filter(self, relation_types):
+        if not relation_types:
+            return None
+        return {self._type_ids[name] for name in relation_types if name in self._type_ids}
+
+    @staticmethod
+    def _neighbours(csr, node, types):
+        offsets, targets, edge_types = csr
+        for position in range(offsets[node], offsets[node + 1]):
+            if types is None or edge_types[position] in types:
+                yield targets[position]
+
+    def _walk(self, csr, accession, relation_types):
+        """ Breadth first walk, yield (node, distance) for each reachable node, start node excluded """
+        types = self._types_filter(relation_types)
+        start = self.ids[accession]
+        seen = bytearray(len(self.accessions))
+        seen[start] = 1
+        queue = collections.deque([(start, 0)])
+        while queue:
+            node, distance = queue.popleft()
+            for target in self._neighbours(csr, node, types):
+                if not seen[target]:
+                    seen[target] = 1
+                    queue.append((target, distance + 1))
+                    yield target, distance + 1
+
+    def parents(self, accession, relation_types=None):
+        types = self._types_filter(relation_types)
+        return [self.accessions[node] for node in self._neighbours(self._up, self.ids[accession], types)]
+
+    def children(self, accession, relation_types=None):
+        types = self._types_filter(relation_types)
+        return [self.accessions[node] for node in self._neighbours(self._down, self.ids[accession], types)]
+
+    def ancestors(self, accession, relation_types=None):
+        """ All terms reachable following relations from child to parent, term itself excluded """
+        return {self.accessions[node] for node, distance in self._walk(self._up, accession, relation_types)}
+
+    def descendants(self, accession, relation_types=None):
+        """ All terms reachable following relations from parent to child, term itself excluded """
+        return {self.accessions[node] for node, distance in self._walk(self._down, accession, relation_types)}
+
+    def distance(self, accession, other, relation_types=None):
+        """
+        Number of relations on the shortest path between a term and one of its ancestors or descendants
+        :return: distance, None if terms are not related
+        """
+        if accession == other:
+            return 0
+        target = self.ids[other]
+        for csr in (self._up, self._down):
+            for node, distance in self._walk(csr, accession, relation_types):
+                if node == target:
+                    return distance
+        return None
+
+    def lca(self, accession, other, relation_types=None):
+        """
+        Lowest common ancestors: common ancestors (terms themselves included) none of the descendants of which is a
+        common ancestor too.
+        :return: sorted list of accessions
+        """
+        common = (self.ancestors(accession, relation_types) | {accession}) & \
+                 (self.ancestors(other, relation_types) | {other})
+        return sorted(node for node in common
+                      if not any(child in common for child in self.children(node, relation_types)))
+
+    def cycles(self, relation_types=None):
+        """
+        Relations cycles, i.e. strongly connected components of the graph (iterative Tarjan)
+        :return: sorted list of cycles, each a sorted list of accessions. A term related to itself is a one term cycle
+        """
+        types = self._types_filter(relation_types)
+        nb_nodes = len(self.accessions)
+        index = array('l', [-1] * nb_nodes)
+        low = array('l', [0] * nb_nodes)
+        on_stack = bytearray(nb_nodes)
+        stack = []
+        cycles = []
+        counter = 0
+        for root in range(nb_nodes):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, self._neighbours(self._up, root, types))]
+            while work:
+                node, neighbours = work[-1]
+                for target in neighbours:
+                    if index[target] == -1:
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, self._neighbours(self._up, target, types)))
+                        break
+                    if on_stack[target]:
+                        low[node] = min(low[node], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = 0
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1 or node in self._neighbours(self._up, node, types):
+                            cycles.append(sorted(self.accessions[member] for member in component))
+        return sorted(cycles)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import threading
+
+from sqlalchemy import event, select, func, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_mapper
+
+from .models import IdBlock, Term, Synonym, AltId, Relation
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['IdAllocator']
+
+# tables with one row per term or more, other tables are small enough to keep auto increment
+ALLOCATED_MODELS = (Term, Synonym, AltId, Relation)
+
+
+class IdAllocator:
+    """ Client side primary keys allocation.
+
+    Each process reserves contiguous blocks of ids from the `ols_id_block` counter table and assigns them to new
+    objects before flush. With primary keys known upfront, the ORM no longer reads back auto increment ids row by row
+    and inserts whole pages of terms, synonyms and relations in batched statements.
+    Ids are never handed out below existing rows, though all writers of an allocated table must use an allocator
+    while a load is running, an auto increment insert could otherwise take an id from a reserved block: Core inserts
+    (relations and staged synonyms / alt ids, PHI-base identifiers, staging and shard merges) reserve their ids with
+    `assign`.
+    """
+
+    def __init__(self, engine, block_size=1000):
+        self.engine = engine
+        self.block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, connection, table, count):
+        block = IdBlock.__table__
+        pk = list(table.primary_key.columns)[0]
+        floor = (connection.execute(select([func.max(pk)])).scalar() or 0) + 1
+        next_id = case([(block.c.next_id > floor, block.c.next_id)], else_=floor)
+        where = block.c.table_name == table.name
+        if connection.dialect.name == 'mysql':
+            # LAST_INSERT_ID(expr) returns the updated value on this connection, no lock needed for the read back
+            result = connection.execute(block.update().where(where).values(
+                next_id=func.last_insert_id(next_id + count)))
+            if result.rowcount:
+                return connection.execute(select([func.last_insert_id()])).scalar() - count
+        else:
+            result = connection.execute(block.update().where(where).values(next_id=next_id + count))
+            if result.rowcount:
+                return connection.execute(select([block.c.next_id]).where(where)).scalar() - count
+        try:
+            connection.execute(block.insert().values(table_name=table.name, next_id=floor + count))
+            return floor
+        except IntegrityError:
+            logger.debug('Id counter for %s created concurrently', table.name)
+            return self._reserve(connection, table, count)
+
+    def reserve(self, table, count, session=None, connection=None):
+        """
+        Reserve a range of consecutive ids
+        :param table: table to reserve ids for
+        :param count: number of ids
+        :param session: current session, when set and database is SQLite, counter is updated in session transaction
+        :param connection: current connection, same as session for Core statements
+        :return: first id of range [first, first + count - 1]
+        """
+        if self.engine.dialect.name == 'sqlite' and (session is not None or connection is not None):
+            # SQLite allows a single writer, a separate connection would wait for the current transaction to end
+            return self._reserve(connection if connection is not None else session.connection(), table, count)
+        with self.engine.begin() as connection:
+            return self._reserve(connection, table, count)
+
+    def assign(self, table, rows, session=None, connection=None):
+        """
+        Set primary keys of rows inserted by Core statements, from one reserved range
+        :param table: table rows are inserted in
+        :param rows: list of column values dicts, updated in place
+        :param session: current session, see reserve
+        :param connection: current connection, see reserve
+        :return: rows
+        """
+        if rows:
+            pk = list(table.primary_key.columns)[0].name
+            first = self.reserve(table, len(rows), session, connection)
+            for offset, row in enumerate(rows):
+                row[pk] = first + offset
+        return rows
+
+    def next_id(self, table, session=None):
+        """ Next id from current process block for table, a new block is reserved when exhausted """
+        with self._lock:
+            block = self._blocks.get(table.name)
+            if block is None or block[0] > block[1]:
+                first = self.reserve(table, self.block_size, session)
+                block = self._blocks[table.name] = [first, first + self.block_size - 1]
+                logger.debug('Reserved %s ids [%s..%s]', table.name, block[0], block[1])
+            block[0] += 1
+            return block[0] - 1
+
+    def _assign_ids(self, session, flush_context, instances):
+        for obj in session.new:
+            if isinstance(obj, ALLOCATED_MODELS):
+                mapper = object_mapper(obj)
+                key = mapper.get_property_by_column(mapper.primary_key[0]).key
+                if getattr(obj, key) is None:
+                    setattr(obj, key, self.next_id(mapper.local_table, session))
+
+    def install(self, session):
+        """ Assign allocated ids to new objects on each session flush """
+        event.listen(session, 'before_flush', self._assign_ids)
+        session.info['id_allocator'] = self
+        return session
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import collections
+import logging
+import pickle
+import re
+import time
+import unicodedata
+
+from .models import Ontology, Term, AltId, Synonym
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['TermLookup', 'LookupMatch', 'normalise', 'lookup_latencies']
+
+LOOKUP_VERSION = 1
+
+LookupMatch = collections.namedtuple('LookupMatch', ['accession', 'name', 'match', 'scope', 'is_obsolete'])
+
+# match kinds, best first
+ACCESSION, ALT_ID, LABEL, SYNONYM = 'accession', 'alt_id', 'label', 'synonym'
+# label and synonyms scopes, best first, untyped synonyms last
+SCOPES = ['LABEL', 'EXACT', 'NARROW', 'BROAD', 'RELATED', None]
+
+_separators = re.compile(r'[\W_]+')
+
+
+def normalise(label):
+    """ Case, accents, punctuation and spacing insensitive form of a label """
+    label = unicodedata.normalize('NFKD', label or '')
+    label = ''.join(char for char in label if not unicodedata.combining(char))
+    return _separators.sub(' ', label.casefold()).strip()
+
+
+class TermLookup:
+    """ In memory index resolving identifiers and free text to terms.
+
+    Terms are stored once in parallel lists and referenced by position from three dicts: accessions, alt ids (old
+    accessions redirected to their current term) and normalised labels and synonyms with their scope. A lookup is a
+    few dict accesses whatever the index size.
+    """
+
+    def __init__(self):
+        self.accessions = []
+        self.names = []
+        self.obsolete = bytearray()
+        self.by_accession = {}
+        self.by_alt_id = {}
+        self.by_label = {}
+
+    def __len__(self):
+        return len(self.accessions)
+
+    def add_term(self, accession, name, is_obsolete=False):
+        position = self.by_accession.get(accession.upper())
+        if position is None:
+            position = self.by_accession[accession.upper()] = len(self.accessions)
+            self.accessions.append(accession)
+            self.names.append(name)
+            self.obsolete.append(1 if is_obsolete else 0)
+            self.add_label(position, name, 'LABEL')
+        return position
+
+    def add_alt_id(self, position, alt_id):
+        positions = self.by_alt_id.setdefault(alt_id.upper(), [])
+        if position not in positions:
+            positions.append(position)
+
+    def add_label(self, position, label, scope):
+        key = normalise(label)
+        if key:
+            entries = self.by_label.setdefault(key, [])
+            entry = (position, SCOPES.index(scope))
+            if entry not in entries:
+                entries.append(entry)
+
+    @classmethod
+    def build(cls, session, ontologies=None, chunk_size=10000):
+        """
+        Build index from loaded terms, alt ids and synonyms
+        :param session: db session
+        :param ontologies: ontology names to index, all if None
+        :param chunk_size: rows fetched at once
+        :return: TermLookup
+        """
+        start = time.perf_counter()
+        lookup = cls()
+        term_ids = {}
+        ontology_ids = None
+        if ontologies:
+            ontology_ids = [ontology_id for ontology_id, in session.query(Ontology.id).filter(
+                Ontology.name.in_([name.upper() for name in ontologies]))]
+        terms = session.query(Term.term_id, Term.accession, Term.name, Term.is_obsolete)
+        alt_ids = session.query(AltId.term_id, AltId.accession)
+        synonyms = session.query(Synonym.term_id, Synonym.name, Synonym.type)
+        if ontology_ids is not None:
+            terms = terms.filter(Term.ontology_id.in_(ontology_ids))
+            alt_ids = alt_ids.join(Term, AltId.term_id == Term.term_id).filter(Term.ontology_id.in_(ontology_ids))
+            synonyms = synonyms.join(Term, Synonym.term_id == Term.term_id).filter(
+                Term.ontology_id.in_(ontology_ids))
+        for term_id, accession, name, is_obsolete in terms.yield_per(chunk_size):
+            term_ids[term_id] = lookup.add_term(accession, name, is_obsolete)
+        for term_id, accession in alt_ids.yield_per(chunk_size):
+            lookup.add_alt_id(term_ids[term_id], accession)
+        for term_id, name, synonym_type in synonyms.yield_per(chunk_size):
+            lookup.add_label(term_ids[term_id], name, synonym_type.name if synonym_type else None)
+        logger.info('Lookup index built in %.2fs: %s terms, %s alt ids, %s labels', time.perf_counter() - start,
+                    len(lookup), len(lookup.by_alt_id), len(lookup.by_label))
+        return lookup
+
+    def _match(self, position, match, scope):
+        return LookupMatch(self.accessions[position], self.names[position], match, scope,
+                           bool(self.obsolete[position]))
+
+    def lookup(self, query):
+        """
+        Resolve an accession, an alt id, a label or a synonym
+        :param query: identifier or free text
+        :return: list of LookupMatch, best first: accession, alt id, label then synonyms by scope, current terms
+        before obsolete ones. Each term is listed once, with its best match
+        """
+        identifier = query.strip().upper()
+        matches = []
+        seen = set()
+        position = self.by_accession.get(identifier)
+        if position is None and ':' not in identifier:
+            # IRI style short form, e.g. GO_0005575
+            position = self.by_accession.get(identifier.replace('_', ':', 1))
+        if position is not None:
+            seen.add(position)
+            matches.append(self._match(position, ACCESSION, None))
+        for position in self.by_alt_id.get(identifier, []):
+            if position not in seen:
+                seen.add(position)
+                matches.append(self._match(position, ALT_ID, None))
+        labels = []
+        for position, scope in sorted(self.by_label.get(normalise(query), []), key=lambda entry: entry[1]):
+            if position not in seen:
+                seen.add(position)
+                scope = SCOPES[scope]
+                labels.append(self._match(position, LABEL if scope == 'LABEL' else SYNONYM, scope))
+        # sort is stable: scope order is kept among current and obsolete terms
+        matches.extend(sorted(labels, key=lambda match: match.is_obsolete))
+        return matches
+
+    def lookup_many(self, queries):
+        """ :return: dict query: list of LookupMatch """
+        return {query: self.lookup(query) for query in queries}
+
+    def save(self, file_name):
+        with open(file_name, 'wb') as f:
+            pickle.dump((LOOKUP_VERSION, self.__dict__), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name, 'rb') as f:
+            version, state = pickle.load(f)
+        if version != LOOKUP_VERSION:
+            raise ValueError('Unsupported lookup index version %s in %s' % (version, file_name))
+        lookup = cls()
+        lookup.__dict__.update(state)
+        return lookup
+
+
+def lookup_latencies(lookup, queries):
+    """
+    Time each lookup
+    :return: dict of p50, p99 and max latencies in milliseconds
+    """
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        lookup.lookup(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    if not timings:
+        return {}
+    timings.sort()
+    return {
+        'queries': len(timings),
+        'p50': timings[len(timings) // 2],
+        'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        'max': timings[-1]
+    }
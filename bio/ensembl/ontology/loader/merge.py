@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import glob
+import logging
+from os.path import join
+
+import sqlalchemy
+from sqlalchemy import select, and_
+
+from bio.ensembl.ontology.loader.ids import IdAllocator
+from bio.ensembl.ontology.loader.models import Meta, Ontology, Subset, RelationType, Term, Synonym, AltId, Relation
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['staging_db_url', 'staging_files', 'merge_database']
+
+
+def staging_file_name(ontology_name, start=0, end=0):
+    return '.'.join([ontology_name.lower(), 'staging', str(start), str(end), 'sqlite'])
+
+
+def staging_db_url(staging_dir, ontology_name, start=0, end=0):
+    return 'sqlite:///' + join(staging_dir, staging_file_name(ontology_name, start, end))
+
+
+def staging_files(staging_dir, ontology_name):
+    """ All staging databases files for an ontology """
+    return sorted(glob.glob(join(staging_dir, staging_file_name(ontology_name, '*', '*'))))
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _values(table, row, exclude, **remap):
+    values = {column.name: row[column.name] for column in table.columns if column.name not in exclude}
+    values.update(remap)
+    return values
+
+
+def _merge_by_key(source, target, table, keys):
+    """
+    Merge small reference tables, rows are matched on keys.
+    :return: dict source primary key => target primary key
+    """
+    pk = list(table.primary_key.columns)[0]
+    mapping = {}
+    for row in source.execute(select([table])):
+        values = _values(table, row, [pk.name])
+        match = and_(*[table.c[key] == values[key] for key in keys])
+        target_id = target.execute(select([pk]).where(match)).scalar()
+        if target_id is None:
+            target_id = target.execute(table.insert().values(**values)).inserted_primary_key[0]
+        mapping[row[pk.name]] = target_id
+    return mapping
+
+
+def _merge_terms(source, target, allocator, ontology_map, chunk_size):
+    """
+    Merge terms by accession, terms already in target are kept as they are.
+    :return: tuple dict source term_id => target term_id, set of source term_id inserted in target
+    """
+    term = Term.__table__
+    term_map = {}
+    inserted = set()
+    rows = source.execution_options(stream_results=True).execute(select([term]).order_by(term.c.term_id))
+    for chunk in _chunks(rows, chunk_size):
+        accessions = [row['accession'] for row in chunk]
+        existing = dict(target.execute(select([term.c.accession, term.c.term_id]).where(
+            term.c.accession.in_(accessions))).fetchall())
+        new_rows = [row for row in chunk if row['accession'] not in existing]
+        if new_rows:
+            values = allocator.assign(term, [_values(term, row, ['term_id'],
+                                                     ontology_id=ontology_map[row['ontology_id']])
+                                             for row in new_rows], connection=target)
+            target.execute(term.insert(), values)
+            existing.update((value['accession'], value['term_id']) for value in values)
+            inserted.update(row['term_id'] for row in new_rows)
+        term_map.update({row['term_id']: existing[row['accession']] for row in chunk})
+    return term_map, inserted
+
+
+def _merge_term_children(source, target, allocator, table, term_map, keys, chunk_size):
+    """
+    Copy synonyms / alt ids of merged terms, skipping the ones already in target: MyISAM target tables are not
+    transactional, terms inserted by a failed merge get their synonyms / alt ids when the merge is run again.
+    :param keys: columns matching a row in target, term_id first
+    :return: number of rows inserted
+    """
+    pk = list(table.primary_key.columns)[0]
+    rows = source.execution_options(stream_results=True).execute(select([table]).order_by(pk))
+    count = 0
+    for chunk in _chunks((row for row in rows if row['term_id'] in term_map), chunk_size):
+        values = [_values(table, row, [pk.name], term_id=term_map[row['term_id']]) for row in chunk]
+        existing = {tuple(row) for row in target.execute(
+            select([table.c[key] for key in keys]).where(
+                table.c.term_id.in_({value['term_id'] for value in values})))}
+        new_values = []
+        for value in values:
+            key = tuple(value[key] for key in keys)
+            if key not in existing:
+                existing.add(key)
+                new_values.append(value)
+        if new_values:
+            target.execute(table.insert(), allocator.assign(table, new_values, connection=target))
+            count += len(new_values)
+    return count
+
+
+def _merge_relations(source, target, allocator, term_map, ontology_map, type_map, chunk_size):
+    """ Copy relations with remapped ids, skipping the ones already in target """
+    relation = Relation.__table__
+    rows = source.execution_options(stream_results=True).execute(
+        select([relation]).order_by(relation.c.relation_id))
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        values = []
+        for row in chunk:
+            if row['child_term_id'] not in term_map or row['parent_term_id'] not in term_map:
+                logger.warning('Skipped relation %s with unknown term', row['relation_id'])
+                continue
+            values.append(_values(relation, row, ['relation_id'],
+                                  child_term_id=term_map[row['child_term_id']],
+                                  parent_term_id=term_map[row['parent_term_id']],
+                                  relation_type_id=type_map[row['relation_type_id']],
+                                  ontology_id=ontology_map[row['ontology_id']]))
+        key_columns = ['child_term_id', 'parent_term_id', 'relation_type_id', 'intersection_of', 'ontology_id']
+        existing = {tuple(row) for row in target.execute(
+            select([relation.c[key] for key in key_columns]).where(
+                relation.c.child_term_id.in_({value['child_term_id'] for value in values})))}
+        new_values = []
+        for value in values:
+            key = tuple(value[key] for key in key_columns)
+            if key not in existing:
+                existing.add(key)
+                new_values.append(value)
+        if new_values:
+            target.execute(relation.insert(), allocator.assign(relation, new_values, connection=target))
+            count += len(new_values)
+    return count
+
+
+def merge_database(source_url, target_engine, chunk_size=500):
+    """
+    Merge an ontology database (i.e a staging or shard database) into target database.
+    Terms are deduplicated by accession, all ids are remapped to target ones, new terms, synonyms, alt ids and
+    relations ids are reserved from target id allocator counter. Rows already in target are skipped, so merging
+    again a database partly merged by a failed run completes it.
+    :param source_url: source database url
+    :param target_engine: target database engine
+    :param chunk_size: number of rows read / written at once
+    :return: dict number of rows inserted per table
+    """
+    source_engine = sqlalchemy.create_engine(source_url)
+    allocator = IdAllocator(target_engine)
+    stats = {}
+    with source_engine.connect() as source, target_engine.connect() as target:
+        with target.begin():
+            meta = Meta.__table__
+            existing_metas = {row['meta_key'] for row in target.execute(select([meta.c.meta_key]))}
+            metas = [_values(meta, row, ['meta_id']) for row in source.execute(select([meta]))
+                     if row['meta_key'] not in existing_metas]
+            if metas:
+                target.execute(meta.insert(), metas)
+            stats['meta'] = len(metas)
+            ontology_map = _merge_by_key(source, target, Ontology.__table__, ['name', 'namespace'])
+            type_map = _merge_by_key(source, target, RelationType.__table__, ['name'])
+            _merge_by_key(source, target, Subset.__table__, ['name'])
+            term_map, inserted = _merge_terms(source, target, allocator, ontology_map, chunk_size)
+            stats['term'] = len(inserted)
+            for table, keys in ((Synonym.__table__, ['term_id', 'name']), (AltId.__table__, ['term_id', 'accession'])):
+                stats[table.name] = _merge_term_children(source, target, allocator, table, term_map, keys,
+                                                         chunk_size)
+            stats['relation'] = _merge_relations(source, target, allocator, term_map, ontology_map, type_map,
+                                                 chunk_size)
+    source_engine.dispose()
+    logger.info('Merged %s: %s', source_url, stats)
+    return stats
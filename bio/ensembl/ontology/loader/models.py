@@ -12,6 +12,7 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import datetime
 import enum
 import logging
 
@@ -24,6 +25,8 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, synonym
 from sqlalchemy.orm.exc import NoResultFound
 
+from .records import TermRecord
+
 logger = logging.getLogger(__name__)
 
 """
@@ -31,7 +34,8 @@ SQLAlchemy database models for OLS ontologies loading
 
 """
 __all__ = ['Base', 'Ontology', 'Meta', 'Term', 'Subset', 'RelationType', 'Closure', 'Relation', 'AltId', 'Synonym',
-           'SynonymTypeEnum', 'get_one_or_create']
+           'SynonymTypeEnum', 'get_one_or_create', 'LoaderBase', 'OntologySnapshot', 'IdBlock',
+           'LoadStatistics']
 
 StringUtf8 = String(255)
 StringUtf8 = StringUtf8.with_variant(String(255, collation='utf8_general_ci'), 'mysql')
@@ -71,6 +75,8 @@ def get_one_or_create(model, session=None, create_method='', create_method_kwarg
 
 
 Base = declarative_base()
+# Loader internal tables, not part of ensembl ontology schema (not dumped in DDL)
+LoaderBase = declarative_base()
 
 
 class SynonymTypeEnum(enum.Enum):
@@ -87,7 +93,7 @@ class LoadAble(object):
     _load_map = dict()
 
     def __init__(self, helper=None, **kwargs):
-        if helper and isinstance(helper, helpers.OLSHelper):
+        if helper and isinstance(helper, (helpers.OLSHelper, TermRecord)):
             constructor_args = {key: getattr(helper, self._load_map.get(key, key), None) for key in dir(self)}
             # logger.debug('helper %s args: %s', helper.__class__, constructor_args)
             constructor_args.update(**kwargs)
@@ -390,3 +396,68 @@ class Closure(LoadAble, Base):
                                back_populates='parent_closures')
     subparent_term = relationship('Term', primaryjoin='Closure.subparent_term_id == Term.term_id',
                                   back_populates='subparent_closures')
+
+
+class OntologySnapshot(LoaderBase):
+    """ OLS ontology metadata, fetched once per load and shared by all loading jobs """
+    __tablename__ = 'ols_ontology_snapshot'
+    __table_args__ = (
+        {'mysql_engine': 'MyISAM',
+         'mysql_DEFAULT_CHARSET': 'utf8',
+         'mysql_COLLATE': 'utf8_unicode_ci'}
+    )
+
+    ontology_id = Column(String(64), primary_key=True)
+    version = Column(String(64), nullable=True)
+    title = Column(String(255), nullable=True)
+    namespace = Column(String(64), nullable=True)
+    number_of_terms = Column(UnsignedInt, nullable=False, default=0)
+    updated = Column(String(64), nullable=True)
+    snapshot_date = Column(DateTime, nullable=False, default=datetime.datetime.now)
+
+    def __repr__(self):
+        return '<OntologySnapshot(ontology_id={}, version={}, number_of_terms={})>'.format(
+            self.ontology_id, self.version, self.number_of_terms)
+
+
+class IdBlock(LoaderBase):
+    """ Next primary key to hand out per table, see ids.IdAllocator """
+    __tablename__ = 'ols_id_block'
+    __table_args__ = (
+        {'mysql_engine': 'MyISAM',
+         'mysql_DEFAULT_CHARSET': 'utf8',
+         'mysql_COLLATE': 'utf8_unicode_ci'}
+    )
+
+    table_name = Column(String(64), primary_key=True)
+    next_id = Column(UnsignedInt, nullable=False, default=1)
+
+    def __repr__(self):
+        return '<IdBlock(table_name={}, next_id={})>'.format(self.table_name, self.next_id)
+
+
+class LoadStatistics(LoaderBase):
+    """ Rows counts per ontology namespace, recorded by each load final report """
+    __tablename__ = 'ols_load_statistics'
+    __table_args__ = (
+        Index('ols_load_statistics_ontology_idx', 'ontology_name', 'report_date'),
+        {'mysql_engine': 'MyISAM',
+         'mysql_DEFAULT_CHARSET': 'utf8',
+         'mysql_COLLATE': 'utf8_unicode_ci'}
+    )
+
+    statistics_id = Column(UnsignedInt, primary_key=True)
+    ontology_name = Column(String(64), nullable=False)
+    namespace = Column(String(64), nullable=False)
+    terms = Column(UnsignedInt, nullable=False, default=0)
+    relations = Column(UnsignedInt, nullable=False, default=0)
+    alt_ids = Column(UnsignedInt, nullable=False, default=0)
+    synonyms = Column(UnsignedInt, nullable=False, default=0)
+    closures = Column(UnsignedInt, nullable=False, default=0)
+    load_date = Column(DateTime, nullable=True)
+    report_date = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    duration = Column(Float, nullable=True)
+
+    def __repr__(self):
+        return '<LoadStatistics(ontology_name={}, namespace={}, terms={}, report_date={})>'.format(
+            self.ontology_name, self.namespace, self.terms, self.report_date)
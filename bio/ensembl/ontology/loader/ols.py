@@ -11,20 +11,33 @@
    See the License for the specific language governing permissions and
    limitations under the License.
 """
+import collections
 import datetime
+import functools
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from os import getenv
 from os.path import join
 
 import inflection
 import itypes
 from coreapi.exceptions import CoreAPIException
+from sqlalchemy import event, func, select, and_, Table, MetaData, Column, Integer
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
 import ebi.ols.api.exceptions
 import ebi.ols.api.helpers as helpers
 from bio.ensembl.ontology.loader.db import dal
+from bio.ensembl.ontology.loader.fetch import OlsFetcher
 from bio.ensembl.ontology.loader.models import *
+from bio.ensembl.ontology.loader.records import TermRecord, SynonymRecord, AltIdRecord
+from bio.ensembl.ontology.loader.relations import RelationIndex, term_loading_options
+from bio.ensembl.ontology.loader.resolver import TermQueue, merge_queue_stats
+from bio.ensembl.ontology.loader.slices import SliceCheckpoint
+from bio.ensembl.ontology.loader.staging import StagingBuffer
+from bio.ensembl.ontology.loader.throttle import RateLimiter
 from ebi.ols.api.client import OlsClient
 
 
@@ -42,7 +55,7 @@ def term_logger_name(ontology_name, start=0, end=0):
 
 def init_schema(db_url, **options):
     dal.db_init(db_url, **options)
-    dal.create_schema()
+    dal.create_schema(defer_indexes=options.get('defer_indexes', False))
     db_version = options.get('ens_version', 99)
     with dal.session_scope() as session:
         metas = {
@@ -87,9 +100,14 @@ class OlsLoader:
         'process_relations': True,
         'process_parents': True,
         'page_size': 500,
+        'commit_every': 100,
+        'request_rate': 10,
+        'rate_state_file': None,
+        'snapshot_workers': 8,
         'output_dir': getenv("HOME"),
         'verbosity': logging.WARNING,
-        'ols_api_url': None
+        'ols_api_url': None,
+        'fast_fetch': False
     }
 
     allowed_ontologies = ['GO', 'SO', 'PATO', 'HP', 'VT', 'EFO', 'PO', 'EO', 'TO', 'CHEBI', 'PR', 'FYPO', 'PECO', 'BFO',
@@ -102,7 +120,16 @@ class OlsLoader:
         self.client = OlsClient(
             page_size=self.options.get('page_size'),
             base_site=self.options.get('ols_api_url'))
+        # terms pages and relations read as raw JSON records, bypassing coreapi documents
+        self.fetcher = OlsFetcher(self.options.get('ols_api_url'), page_size=self.options.get('page_size'),
+                                  call=self.ols_call) if self.options.get('fast_fetch') else None
         self.retry = 0
+        # rate limiter state is shared with any other loader using the same output dir
+        self.rate_limiter = RateLimiter(
+            state_file=self.options.get('rate_state_file') or join(self.options.get('output_dir'), 'ols_rate.json'),
+            rate=self.options.get('request_rate'),
+            max_retry=self.options.get('max_retry'),
+            timeout=self.options.get('timeout'))
         if self.options.get('allowed_ontologies', None):
             self.allowed_ontologies = self.options.get('allowed_ontologies')
         self.db_init = False
@@ -112,6 +139,104 @@ class OlsLoader:
         self.current_ontology = None
         self.report_log = None
         self.terms_log = None
+        self.next_term_index = None
+        self.loaded_range = None
+        self.wipe_timings = {}
+        self.queue_stats = {}
+        self.term_queue = None
+        self._ontology_helpers = {}
+        self._ontology_snapshots = {}
+
+    def ols_call(self, func, *args, **kwargs):
+        """ Call OLS through shared rate limiter, retrying transient errors """
+        return self.rate_limiter.call(func, *args, **kwargs)
+
+    def load_relation(self, o_term, relation_name):
+        """
+        Retrieve a term related terms, OlsFetcher already rate limits each page of TermRecord relations
+        :return: list of related terms
+        """
+        if isinstance(o_term, TermRecord):
+            return o_term.load_relation(relation_name)
+        return self.ols_call(o_term.load_relation, relation_name)
+
+    def ontology_helper(self, ontology_name):
+        """ Retrieve ontology from OLS, only once per loader """
+        key = ontology_name.upper()
+        if key not in self._ontology_helpers:
+            self._ontology_helpers[key] = self.ols_call(self.client.ontology, identifier=ontology_name)
+        return self._ontology_helpers[key]
+
+    def ontology_terms(self, o_ontology, start=None, end=None):
+        """
+        Ontology terms list, or a slice of it
+        :param o_ontology: OLS ontology
+        :param start: first term index
+        :param end: last term index (inclusive)
+        :return: terms sequence, TermRecord when fast fetch is enabled, ols-client helpers otherwise
+        """
+        if self.fetcher:
+            return self.fetcher.terms(o_ontology.ontology_id, start or 0, end)
+        terms = self.ols_call(o_ontology.terms)
+        # pages are fetched while iterating, each of them goes through the rate limiter as OlsFetcher.get does
+        for name in ('fetch_page', 'fetch_document'):
+            setattr(terms, name, functools.partial(self.ols_call, getattr(terms, name)))
+        if end is None:
+            return terms
+        return terms[start:end + 1]
+
+    def _fetch_ontology(self, ontology_name):
+        try:
+            return self.ontology_helper(ontology_name)
+        except ebi.ols.api.exceptions.NotFoundException:
+            logging.warning('Ontology %s not found in OLS', ontology_name)
+            return None
+
+    def snapshot_ontologies(self, ontologies=None):
+        """
+        Store OLS metadata for ontologies not snapshot yet, ontologies are retrieved concurrently.
+        Loading jobs read ontology metadata from snapshot instead of calling OLS.
+        :param ontologies: ontologies short names, default to allowed ontologies
+        :return: list of ontologies snapshot
+        """
+        names = [name.upper() for name in (ontologies or self.allowed_ontologies)]
+        with dal.session_scope() as session:
+            existing = [row.ontology_id for row in
+                        session.query(OntologySnapshot.ontology_id).filter(OntologySnapshot.ontology_id.in_(names))]
+        missing = [name for name in names if name not in existing]
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.options.get('snapshot_workers')) as executor:
+                fetched = list(executor.map(self._fetch_ontology, missing))
+            try:
+                with dal.session_scope() as session:
+                    for o_ontology in fetched:
+                        if o_ontology:
+                            session.merge(OntologySnapshot(ontology_id=o_ontology.ontology_id.upper(),
+                                                           version=o_ontology.version,
+                                                           title=o_ontology.title,
+                                                           namespace=o_ontology.namespace,
+                                                           number_of_terms=o_ontology.number_of_terms or 0,
+                                                           updated=o_ontology.updated))
+            except IntegrityError:
+                # concurrent job snapshot same ontologies, keep theirs
+                logging.info('Ontologies snapshot already stored by another job')
+            logging.info('Snapshot %s ontologies metadata (%s already done)', len(missing), len(existing))
+        with dal.session_scope() as session:
+            snapshots = session.query(OntologySnapshot).filter(OntologySnapshot.ontology_id.in_(names)).all()
+            session.expunge_all()
+        return snapshots
+
+    def ontology_info(self, ontology_name):
+        """
+        Get ontology metadata from snapshot, snapshot ontology if not done yet.
+        :param ontology_name: ontology short name
+        :return: OntologySnapshot, None if ontology does not exists in OLS
+        """
+        key = ontology_name.upper()
+        if key not in self._ontology_snapshots:
+            snapshots = self.snapshot_ontologies([key])
+            self._ontology_snapshots[key] = snapshots[0] if snapshots else None
+        return self._ontology_snapshots[key]
 
     def get_ontology_logger(self, ontology_name):
         if not self.report_log:
@@ -151,7 +276,7 @@ class OlsLoader:
         :return: an Ontology model object.
         """
         if type(ontology) is str:
-            ontology = self.client.ontology(identifier=ontology)
+            ontology = self.ontology_helper(ontology)
         elif not isinstance(ontology, helpers.Ontology):
             raise RuntimeError('Wrong parameter')
 
@@ -163,6 +288,8 @@ class OlsLoader:
                                                 name=ontology_name,
                                                 namespace=namespace,
                                                 create_method_kwargs={'helper': ontology})
+        # not stored in db, always refresh from OLS to allow slices planning downstream
+        m_ontology.number_of_terms = ontology.number_of_terms or 0
         self.report_log = self.get_ontology_logger(ontology_name)
         if created:
             self.report_log.info('----------------------------------')
@@ -190,62 +317,96 @@ class OlsLoader:
 
         return m_ontology
 
+    # term dependent rows, deleted before terms themselves
+    _wiped_columns = [
+        (Synonym.__table__, 'term_id'),
+        (AltId.__table__, 'term_id'),
+        (Relation.__table__, 'child_term_id'),
+        (Relation.__table__, 'parent_term_id'),
+        (Closure.__table__, 'child_term_id'),
+        (Closure.__table__, 'parent_term_id'),
+        (Closure.__table__, 'subparent_term_id'),
+        (Term.__table__, 'term_id')
+    ]
+
     def wipe_ontology(self, ontology_name):
         """
-        Completely remove all ontology related data from DBs
+        Completely remove all ontology related data from DBs.
+        Ontology term ids are resolved once into a temporary table, dependent rows are then deleted through joins on
+        it by chunks of `wipe_chunk_size` terms, each chunk being committed on its own to keep table locks short.
         :param ontology_name: specified ontology short name
         :return: boolean whether or not Ontology has been successfully deleted
         """
         logger = self.get_ontology_logger(ontology_name)
-        with dal.session_scope() as session:
-            logger.info('Wipe ontology %s', ontology_name)
+        logger.info('Wipe ontology %s', ontology_name)
+        chunk_size = self.options.get('wipe_chunk_size') or 10000
+        meta_keys = [ontology_name.upper() + '_load_date', ontology_name.upper() + '_file_date']
+        wipe_term = Table('ols_wipe_term', MetaData(),
+                          Column('seq', Integer, primary_key=True),
+                          Column('term_id', Integer, nullable=False, index=True),
+                          prefixes=['TEMPORARY'])
+        term = Term.__table__
+        timings = {}
+        # temporary table only lives in this connection
+        with dal.engine.connect() as connection:
+            ontology_ids = [ontology_id for ontology_id, in connection.execute(
+                select([Ontology.__table__.c.ontology_id]).where(Ontology.__table__.c.name == ontology_name.upper()))]
+            wipe_term.create(connection)
             try:
-                metas = session.query(Meta).filter(Meta.meta_key.like("%" + ontology_name + "%")).all()
-                for meta in metas:
-                    logger.debug('Deleted meta %s', meta)
-                    session.delete(meta)
-                ontologies = session.query(Ontology).filter_by(name=ontology_name.upper()).all()
-                for ontology in ontologies:
-                    logger.info('Deleting namespaced ontology %s - %s', ontology.name, ontology.namespace)
-                    res = session.query(Synonym).filter(Synonym.term_id == Term.term_id,
-                                                        Term.ontology_id == ontology.id).delete(
-                        synchronize_session=False)
-                    logger.info('Wiped %s synonyms', res)
-                    rel = session.query(Relation).filter(Relation.child_term_id == Term.term_id,
-                                                         Term.ontology_id == ontology.id).delete(
-                        synchronize_session=False)
-                    rel2 = session.query(Relation).filter(Relation.parent_term_id == Term.term_id,
-                                                          Term.ontology_id == ontology.id).delete(
-                        synchronize_session=False)
-                    logger.info('Wiped %s Relations', rel + rel2)
-
-                    clo = session.query(Closure).filter(Closure.child_term_id == Term.term_id,
-                                                        Term.ontology_id == ontology.id).delete(
-                        synchronize_session=False)
-                    clo1 = session.query(Closure).filter(Closure.parent_term_id == Term.term_id,
-                                                         Term.ontology_id == ontology.id).delete(
-                        synchronize_session=False)
-                    clo2 = session.query(Closure).filter(Closure.subparent_term_id == Term.term_id,
-                                                         Term.ontology_id == ontology.id).delete(
-                        synchronize_session=False)
-                    logger.info('Wiped %s Closure', clo + clo1 + clo2)
-
-                    res = session.query(AltId).filter(AltId.term_id == Term.term_id,
-                                                      Term.ontology_id == ontology.id).delete(synchronize_session=False)
-                    logger.info('Wiped %s AltIds', res)
-                    res = session.query(Term).filter(Term.ontology_id == ontology.id).delete(synchronize_session=False)
-                    logger.info('Wiped %s Terms', res)
-                    session.delete(ontology)
-                    logger.debug('...Done')
-                return True
-            except NoResultFound:
-                logger.error('Ontology %s not found !', ontology_name)
-        return False
+                connection.execute(wipe_term.insert().from_select(
+                    ['term_id'], select([term.c.term_id]).where(term.c.ontology_id.in_(ontology_ids)).order_by(
+                        term.c.term_id)))
+                nb_terms = connection.execute(select([func.count()]).select_from(wipe_term)).scalar()
+                first_seq = connection.execute(select([func.min(wipe_term.c.seq)])).scalar() or 0
+                logger.info('Deleting %s terms from namespaces %s', nb_terms, ontology_ids)
+                for table, column in self._wiped_columns:
+                    start = time.time()
+                    deleted = 0
+                    for low in range(first_seq, first_seq + nb_terms, chunk_size):
+                        chunk = and_(wipe_term.c.seq >= low, wipe_term.c.seq < low + chunk_size)
+                        if connection.dialect.name == 'mysql':
+                            # multi table delete, joined on term ids
+                            statement = table.delete().where(and_(table.c[column] == wipe_term.c.term_id, chunk))
+                        else:
+                            statement = table.delete().where(table.c[column].in_(
+                                select([wipe_term.c.term_id]).where(chunk)))
+                        deleted += connection.execute(statement).rowcount
+                    timings['.'.join([table.name, column])] = time.time() - start
+                    logger.info('Wiped %s %s (%s) in %.2fs', deleted, table.name, column, time.time() - start)
+                start = time.time()
+                connection.execute(Ontology.__table__.delete().where(
+                    Ontology.__table__.c.ontology_id.in_(ontology_ids)))
+                connection.execute(Meta.__table__.delete().where(Meta.__table__.c.meta_key.in_(meta_keys)))
+                timings['ontology'] = time.time() - start
+            finally:
+                wipe_term.drop(connection)
+        # checkpoints of previous runs would skip terms of the next load
+        SliceCheckpoint.clear_all(self.options.get('output_dir'), ontology_name)
+        self.wipe_timings = timings
+        logger.debug('...Done')
+        return True
 
-    def load_ontology_terms(self, ontology, start=None, end=None):
+    def load_ontology_terms(self, ontology, start=None, end=None, time_budget=None):
+        """
+        Load ontology terms, or a slice of them, from OLS API.
+        When time budget is exhausted, loaded terms are committed and the index of the first term not loaded is
+        set in `next_term_index`, so that the remaining of the slice can be loaded later.
+        Slices are committed every `commit_every` terms and checkpointed in `output_dir`, a slice loading
+        interrupted by an error resumes after the last committed term on next call. Range of terms indexes
+        actually browsed is set in `loaded_range`, None if none were.
+        :param ontology: ontology short name
+        :param start: first term index
+        :param end: last term index (inclusive)
+        :param time_budget: max number of seconds to spend loading terms, no limit if not set
+        :return: a tuple number of terms loaded, number of terms ignored
+        """
+        self.next_term_index = None
+        self.loaded_range = None
+        deadline = time.time() + time_budget if time_budget else None
+        checkpoint = None
         nb_terms = 0
         nb_terms_ignored = 0
-        o_ontology = self.client.ontology(identifier=ontology)
+        o_ontology = self.ontology_helper(ontology)
         terms_log = self.get_term_logger(ontology, start, end)
         report = self.get_ontology_logger(ontology)
         if o_ontology:
@@ -254,7 +415,7 @@ class OlsLoader:
                 terms_log.info('Loading terms slice [%s, %s]', start, end)
                 # TODO move this slice fix into ols-client when dealing with discrepancies between number of terms
                 # between ontology / terms api calls
-                max_terms = len(o_ontology.terms()) - 1
+                max_terms = len(self.ontology_terms(o_ontology)) - 1
                 min_end = min(end, max_terms)
                 terms_log.debug('Which resolve to [%s, %s]', start, min_end)
                 terms_log.info('-----------------------------------------')
@@ -262,54 +423,107 @@ class OlsLoader:
                     terms_log.warning("Wrong slice order.min:%s max:%s ", start, min_end)
                     # skip this chunk
                     return None, None
-                terms = o_ontology.terms()[start:min_end]
+                checkpoint = SliceCheckpoint(self.options.get('output_dir'), ontology, start, end)
+                first_index = checkpoint.resume_index() or start
+                if first_index > min_end:
+                    terms_log.info('Slice already loaded up to %s', min_end)
+                    checkpoint.clear()
+                    return 0, 0
+                if first_index != start:
+                    terms_log.info('Resuming slice from checkpoint, term %s', first_index)
+                terms = self.ontology_terms(o_ontology, first_index, min_end)
                 terms_log.info('Slice len %s', len(terms))
                 report.info('- Loading %s terms slice [%s:%s]', ontology, start, end)
             else:
-                terms = o_ontology.terms()
+                terms = self.ontology_terms(o_ontology)
+                first_index = 0
+                min_end = len(terms) - 1
                 terms_log.info('Loading %s terms for %s', len(terms), o_ontology.ontology_id.upper())
                 report.info('- Loading all terms (%s)', len(terms))
-            with dal.session_scope() as session:
-                for o_term in terms:
-                    if o_term.is_defining_ontology and has_accession(o_term):
-                        terms_log.debug('Term %s', o_term)
-                        m_ontology, created = get_one_or_create(Ontology,
-                                                                session,
-                                                                name=self.current_ontology,
-                                                                namespace=o_term.namespace,
-                                                                create_method_kwargs=dict(
-                                                                    version=o_ontology.version,
-                                                                    title=o_ontology.title))
-                        terms_log.debug('Loaded term (from OLS) %s', o_term)
-                        terms_log.debug('Adding/Retrieving namespaced ontology %s', o_term.namespace)
-                        terms_log.debug('Ontology namespace %s %s', m_ontology.name, m_ontology.namespace)
-                        if m_ontology.namespace != o_term.namespace:
-                            terms_log.warning('discrepancy term/ontology namespace')
-                            terms_log.warning('term:', o_term)
-                            terms_log.warning('ontology:', o_ontology)
-                        term = self.load_term(o_term, m_ontology, session)
-                        if term:
-                            session.add(term)
-                            nb_terms += 1
-                    else:
-                        terms_log.info('Ignored term [%s:%s]', o_term.is_defining_ontology, o_term.short_form)
-                        nb_terms_ignored += 1
-                terms_log.info('- Expected %s terms (defined in accepted ontology)', nb_terms)
-                terms_log.info('- Ignored %s terms (not defined in accepted ontology)', nb_terms_ignored)
-                return nb_terms, nb_terms_ignored
+            commit_every = self.options.get('commit_every') or 0
+            # one queue for the slice, each related term is fetched and created at most once per slice
+            self.term_queue = self.new_term_queue()
+            try:
+                with dal.session_scope() as session:
+                    event.listen(session, 'after_rollback', self.term_queue.forget)
+                    for index, o_term in enumerate(terms, start=first_index):
+                        if deadline and time.time() > deadline and index > first_index:
+                            terms_log.warning('Time budget exhausted, stopped slice before term %s', index)
+                            self.next_term_index = index
+                            break
+                        if o_term.is_defining_ontology and has_accession(o_term):
+                            terms_log.debug('Term %s', o_term)
+                            m_ontology, created = get_one_or_create(Ontology,
+                                                                    session,
+                                                                    name=self.current_ontology,
+                                                                    namespace=o_term.namespace,
+                                                                    create_method_kwargs=dict(
+                                                                        version=o_ontology.version,
+                                                                        title=o_ontology.title))
+                            terms_log.debug('Loaded term (from OLS) %s', o_term)
+                            terms_log.debug('Adding/Retrieving namespaced ontology %s', o_term.namespace)
+                            terms_log.debug('Ontology namespace %s %s', m_ontology.name, m_ontology.namespace)
+                            if m_ontology.namespace != o_term.namespace:
+                                terms_log.warning('discrepancy term/ontology namespace')
+                                terms_log.warning('term:', o_term)
+                                terms_log.warning('ontology:', o_ontology)
+                            term = self.load_term(o_term, m_ontology, session)
+                            if term:
+                                session.add(term)
+                                nb_terms += 1
+                        else:
+                            terms_log.info('Ignored term [%s:%s]', o_term.is_defining_ontology, o_term.short_form)
+                            nb_terms_ignored += 1
+                        if checkpoint and commit_every and (index - first_index + 1) % commit_every == 0:
+                            session.commit()
+                            checkpoint.save(index, index // self.options.get('page_size'))
+                    terms_log.info('- Expected %s terms (defined in accepted ontology)', nb_terms)
+                    terms_log.info('- Ignored %s terms (not defined in accepted ontology)', nb_terms_ignored)
+            finally:
+                self.term_queue = None
+            terms_log.info('Related terms queue: %s', self.queue_stats)
+            last_index = min_end if self.next_term_index is None else self.next_term_index - 1
+            if last_index >= first_index:
+                self.loaded_range = (first_index, last_index)
+            if checkpoint:
+                # slice done (or remaining terms handed over), a new run must start from scratch
+                checkpoint.clear()
+            return nb_terms, nb_terms_ignored
         else:
             report.info('Ontology not found %s', ontology)
             terms_log.warning('Ontology not found %s', ontology)
             return 0, 0
 
+    def new_term_queue(self):
+        return TermQueue(batch_size=self.options.get('queue_batch_size') or 50)
+
     def load_term(self, o_term, ontology, session, process_relation=True):
         """
+        Load a term, then the related terms it leads to. Related terms are resolved iteratively from a work queue,
+        never recursively, whatever the depth of the relations graph. While loading ontology terms, the queue is
+        shared by all terms of the slice.
         :param o_term:
         :param ontology:
         :param session:
         :param process_relation:
         :return: Term
         """
+        queue = self.term_queue if self.term_queue is not None else self.new_term_queue()
+        m_term = self.load_term_details(o_term, ontology, session, queue, process_relation)
+        self.resolve_queue(queue, session)
+        return m_term
+
+    def load_term_details(self, o_term, ontology, session, queue, process_relation=True, depth=0):
+        """
+        Load a single term, its relations to other terms are pushed to queue
+        :param o_term: OLS term
+        :param ontology: term ontology, name or model
+        :param session: db session
+        :param queue: TermQueue receiving term relations
+        :param process_relation: whether or not to load term relations
+        :param depth: number of relations followed to reach this term
+        :return: Term
+        """
         if type(ontology) is str:
             m_ontology = self.load_ontology(ontology, session, o_term.namespace)
         elif isinstance(ontology, Ontology):
@@ -333,7 +547,7 @@ class OlsLoader:
                                                 accession=o_term.accession,
                                                 create_method_kwargs=dict(helper=o_term,
                                                                           ontology=m_ontology))
-
+            queue.resolved(o_term.iri, m_term)
             logger.info('Loaded Term [%s][%s][%s]', m_term.accession, o_term.namespace, m_term.iri)
             if created:
                 self.load_term_subsets(m_term, session)
@@ -342,22 +556,49 @@ class OlsLoader:
                 if o_term.ontology_name.upper() in self.allowed_ontologies \
                         and self.options.get('process_relations', True) \
                         and process_relation:
-                    self.load_term_relations(m_term, o_term, session)
+                    self.load_term_relations(m_term, o_term, session, queue, depth)
                 if not m_term.is_root and self.options.get('process_parents', True):
-                    self.load_term_ancestors(m_term, o_term, session)
+                    self.load_term_ancestors(m_term, o_term, session, queue, depth)
             return m_term
         else:
             logger.info("O_term %s has no accession", o_term)
             return None
 
+    def resolve_queue(self, queue, session):
+        """
+        Resolve queued related terms by batches, until queue is empty. Terms created meanwhile push their own
+        relations to the same queue.
+        :param queue: TermQueue
+        :param session: db session
+        :return: number of relations resolved
+        """
+        n_relations = 0
+        while queue:
+            batch = queue.next_batch()
+            # one query for all related terms already in db
+            accessions = {o_related.accession for m_term, o_related, relation_type, depth in batch}
+            existing = {m_related.accession: m_related for m_related in session.query(Term).options(
+                *term_loading_options()).filter(Term.accession.in_(accessions))}
+            for m_term, o_related, relation_type, depth in batch:
+                m_related, relation = self.load_term_relation(m_term, o_related, relation_type, session,
+                                                              queue=queue, depth=depth, existing=existing)
+                if m_related is not None:
+                    existing[m_related.accession] = m_related
+                    n_relations += 1
+        # all relations in one insert, staged synonyms and alt ids as well
+        RelationIndex.for_session(session).flush()
+        StagingBuffer.for_session(session).flush()
+        merge_queue_stats(self.queue_stats, queue.report())
+        return n_relations
+
     def load_alt_ids(self, m_term, o_term, session):
         logger = self.get_term_logger(self.current_ontology)
         session.query(AltId).filter(AltId.term == m_term).delete()
         if o_term.annotation.has_alternative_id:
             logger.info('Loaded AltId %s', o_term.annotation.has_alternative_id)
-            for alt_accession in o_term.annotation.has_alternative_id:
-                logger.debug('Adding AltId %s', alt_accession)
-                m_term.alt_ids.append(AltId(accession=alt_accession, term=m_term))
+            staged = collections.OrderedDict((alt_accession, AltIdRecord(alt_accession))
+                                             for alt_accession in o_term.annotation.has_alternative_id)
+            StagingBuffer.for_session(session).add_alt_ids(m_term, staged.values())
             logger.debug('...Done')
         else:
             logger.info('...No AltIds')
@@ -367,7 +608,8 @@ class OlsLoader:
         logger = self.get_term_logger(self.current_ontology)
         subsets = []
         if term.subsets:
-            s_subsets = self.client.search(query=term.subsets, filters={'type': 'property', 'exact': 'false'})
+            s_subsets = self.ols_call(self.client.search, query=term.subsets,
+                                      filters={'type': 'property', 'exact': 'false'})
             seen = set()
             unique_subsets = [x for x in s_subsets if
                               x.short_form.lower() not in seen and not seen.add(x.short_form.lower())]
@@ -383,7 +625,7 @@ class OlsLoader:
                     # avoid call to API if already exists
                     logger.info("Created new subset %s", m_subset.name)
                     try:
-                        details = self.client.property(identifier=subset.iri)
+                        details = self.ols_call(self.client.property, identifier=subset.iri)
                         if not details:
                             logger.warning('Unable to retrieve subset details %s for ontology %s', subset.label,
                                            term.ontology.name)
@@ -398,14 +640,14 @@ class OlsLoader:
             logger.info('...No Subset')
         return subsets
 
-    def load_term_relations(self, m_term, o_term, session):
+    def load_term_relations(self, m_term, o_term, session, queue, depth=0):
         relation_types = [rel for rel in o_term.relations_types if rel not in self.__ignored_relations]
         logger = self.get_term_logger(self.current_ontology)
         logger.info('Terms relations %s', relation_types)
         n_relations = 0
         for rel_name in relation_types:
             # updates relation types
-            o_relatives = o_term.load_relation(rel_name)
+            o_relatives = self.load_relation(o_term, rel_name)
 
             logger.info('Loading %s relation %s (%s)...', m_term.accession, rel_name, rel_name)
             logger.info('%s related terms ', len(o_relatives))
@@ -415,10 +657,9 @@ class OlsLoader:
                     relation_type, created = get_one_or_create(RelationType,
                                                                session,
                                                                name=self.__relation_map.get(rel_name, rel_name))
-
-                    m_related, relation = self.load_term_relation(m_term, o_related, relation_type, session)
+                    queue.push(m_term, o_related, relation_type, depth + 1)
                     n_relations += 1
-                    logger.debug('Loading related %s', m_related)
+                    logger.debug('Queued related %s', o_related.accession)
             logger.info('... Done (%s)', n_relations)
         return n_relations
 
@@ -440,10 +681,10 @@ class OlsLoader:
                     return o_term_details, r_ontology
                 else:
                     logger.debug('Related term is defined in EXPECTED ontology')
-                    o_term_details = self.client.term(identifier=o_term.iri, silent=True, unique=True)
+                    o_term_details = self.ols_call(self.client.term, identifier=o_term.iri, silent=True, unique=True)
                     if o_term_details:
                         logger.debug('Retrieved term %s[%s]', o_term_details, o_term_details.ontology_name)
-                        o_onto_details = self.client.ontology(identifier=o_term_details.ontology_name)
+                        o_onto_details = self.ontology_info(o_term_details.ontology_name)
                         if o_onto_details:
                             namespace = o_term_details.namespace if o_term_details.namespace else o_term_details.ontology_name
                             r_ontology, created = get_one_or_create(Ontology,
@@ -458,37 +699,61 @@ class OlsLoader:
                         logger.debug('Term %s Not Retrieved', o_term.iri)
         return None, None
 
-    def load_term_relation(self, m_term, o_term, relation_type, session):
+    def load_term_relation(self, m_term, o_term, relation_type, session, queue=None, depth=0, existing=None):
+        """
+        Add relation from m_term to o_term, o_term being loaded first when needed.
+        :param m_term: child term
+        :param o_term: related OLS term
+        :param relation_type: RelationType
+        :param session: db session
+        :param queue: TermQueue receiving related term relations, resolved right away if not set
+        :param depth: number of relations followed to reach o_term
+        :param existing: dict accession => Term of related terms known to be in db
+        :return: tuple related Term, whether relation has been added
+        """
         logger = self.get_term_logger(self.current_ontology)
-        if has_accession(o_term):
+        if not has_accession(o_term):
+            return None, None
+        own_queue = queue is None
+        queue = queue if queue is not None else self.new_term_queue()
+        m_related = (existing or {}).get(o_term.accession)
+        if m_related is None and o_term.iri in queue.visited:
+            m_related = queue.visited[o_term.iri]
+            if m_related is None:
+                return None, None
+        if m_related is None:
             try:
-                m_related = session.query(Term).filter_by(accession=o_term.accession).one()
+                m_related = session.query(Term).options(*term_loading_options()).filter_by(
+                    accession=o_term.accession).one()
                 logger.info('Exists %s', m_related)
             except NoResultFound:
                 o_term_details, r_ontology = self.rel_dest_ontology(m_term, o_term, session)
                 if o_term_details and has_accession(o_term_details):
-                    m_related = self.load_term(o_term=o_term_details, ontology=o_term_details.ontology_name,
-                                               session=session)
+                    m_related = self.load_term_details(o_term_details, o_term_details.ontology_name, session, queue,
+                                                       depth=depth)
                 else:
                     logger.warning('Term %s (%s) relation %s with %s not found in %s ',
                                    m_term.accession,
                                    m_term.ontology.name,
                                    relation_type.name,
                                    o_term.iri, o_term.ontology_name)
+                    queue.resolved(o_term.iri, None)
                     return None, None
-            if m_related:
-                logger.info('Adding relation %s %s %s', m_term.accession, relation_type.name, m_related.accession)
-                m_relation = m_term.add_parent_relation(m_related, relation_type, session)
-                logger.debug('Loaded relation %s %s %s', m_term.accession, relation_type.name, m_related.accession)
-                return m_related, m_relation
-            else:
-                return None, None
+        if own_queue:
+            self.resolve_queue(queue, session)
+        if m_related:
+            logger.info('Adding relation %s %s %s', m_term.accession, relation_type.name, m_related.accession)
+            m_relation = RelationIndex.for_session(session).add(m_term, m_related, relation_type)
+            logger.debug('Loaded relation %s %s %s', m_term.accession, relation_type.name, m_related.accession)
+            return m_related, m_relation
+        else:
+            return None, None
 
-    def load_term_ancestors(self, m_term, o_term, session):
+    def load_term_ancestors(self, m_term, o_term, session, queue, depth=0):
         # delete old ancestors
         logger = self.get_term_logger(self.current_ontology)
         try:
-            ancestors = o_term.load_relation('parents')
+            ancestors = self.load_relation(o_term, 'parents')
             r_ancestors = 0
             relation_type, created = get_one_or_create(RelationType,
                                                        session,
@@ -496,38 +761,38 @@ class OlsLoader:
             for ancestor in ancestors:
                 logger.debug('Parent %s ', ancestor.accession)
                 if has_accession(ancestor):
-                    parent, relation = self.load_term_relation(m_term, ancestor, relation_type, session)
-                    if parent:
-                        r_ancestors = r_ancestors + 1
+                    queue.push(m_term, ancestor, relation_type, depth + 1)
+                    r_ancestors = r_ancestors + 1
             return r_ancestors
         except CoreAPIException as e:
             logger.info('...No parent %s ')
             return 0
 
     def load_term_synonyms(self, m_term, o_term, session):
+        """
+        Replace term synonyms: synonyms are staged as SynonymRecord, first one wins for a name (OBO synonyms with
+        their dbXref, then standard ones, then related ones), then buffered in session StagingBuffer.
+        :return: list of staged SynonymRecord
+        """
         logger = self.get_term_logger(self.current_ontology)
         logger.debug('Loading term synonyms...')
 
         session.query(Synonym).filter(Synonym.term == m_term).delete()
-        n_synonyms = []
+        # keyed case insensitively, as the MySQL schema collation compares synonym names
+        staged = collections.OrderedDict()
+
+        def stage(record):
+            staged.setdefault(record.name.lower(), record)
 
         obo_synonyms = o_term.obo_synonym or []
         for synonym in obo_synonyms:
-            if isinstance(synonym, itypes.Dict):
+            if isinstance(synonym, (dict, itypes.Dict)):
                 try:
                     db_xref = synonym['xrefs'][0]['database'] or '' + ':' + synonym['xrefs'][0][
                         'id'] if 'xrefs' in synonym and len(synonym['xrefs']) > 0 else ''
                     logger.info('Term synonym [%s - %s (%s)]', synonym['name'], self.__synonym_map[synonym['scope']],
                                 db_xref)
-                    m_syno, created = get_one_or_create(Synonym,
-                                                        session,
-                                                        term=m_term,
-                                                        name=synonym['name'],
-                                                        create_method_kwargs=dict(
-                                                            db_xref=db_xref,
-                                                            type=self.__synonym_map[synonym['scope']]))
-                    if created:
-                        n_synonyms.append(synonym)
+                    stage(SynonymRecord(synonym['name'], self.__synonym_map[synonym['scope']], db_xref))
                 except KeyError as e:
                     logging.error('Parse Synonym error %s: %s', synonym, str(e))
             else:
@@ -536,54 +801,85 @@ class OlsLoader:
         synonyms = o_term.synonyms or []
         for synonym in synonyms:
             logger.info('Term synonym [%s - EXACT (No dbXref)]', synonym)
-            m_syno, created = get_one_or_create(Synonym,
-                                                session,
-                                                term=m_term,
-                                                name=synonym,
-                                                create_method_kwargs=dict(
-                                                    type='EXACT')
-                                                )
-            if created:
-                n_synonyms.append(synonym)
+            stage(SynonymRecord(synonym, 'EXACT'))
         if hasattr(o_term.annotation, 'has_related_synonym'):
             other_synonyms = o_term.annotation.has_related_synonym or []
             for synonym in other_synonyms:
-                logger.info('Term synonym [%s - EXACT (No dbXref)]', synonym)
-                m_syno, created = get_one_or_create(Synonym,
-                                                    session,
-                                                    term=m_term,
-                                                    name=synonym,
-                                                    create_method_kwargs=dict(
-                                                        type='RELATED')
-                                                    )
-                if created:
-                    n_synonyms.append(synonym)
+                logger.info('Term synonym [%s - RELATED (No dbXref)]', synonym)
+                stage(SynonymRecord(synonym, 'RELATED'))
+        n_synonyms = list(staged.values())
+        StagingBuffer.for_session(session).add_synonyms(m_term, n_synonyms)
         if len(n_synonyms) == 0:
             logger.info('...No Synonym')
         logger.debug('...Done')
         return n_synonyms
 
     def final_report(self, ontology_name):
-        """ Create a report from actual inserted data for ontology """
-        session = dal.get_session()
+        """
+        Create a report from actual inserted data for ontology, counts are recorded in load statistics table.
+        :param ontology_name: ontology short name
+        :return: list of recorded LoadStatistics, one per namespace
+        """
         self.current_ontology = ontology_name
-
         report_logger = self.get_ontology_logger(ontology_name)
-        ontologies = session.query(Ontology).filter_by(name=ontology_name.upper()).all()
-        for ontology in ontologies:
-            synonyms = session.query(Synonym).filter(Synonym.term_id == Term.term_id,
-                                                     Term.ontology_id == ontology.id).count()
-            relations = session.query(Relation).filter(Relation.ontology == ontology).count()
-            closures = session.query(Closure).filter(Closure.ontology == ontology).count()
-            alt_ids = session.query(AltId).filter(AltId.term_id == Term.term_id,
-                                                  Term.ontology_id == ontology.id).count()
-            terms = session.query(Term).filter(Term.ontology == ontology).count()
-            repeat = len('Ontology %s / Namespace %s' % (ontology.name, ontology.namespace))
-            report_logger.info('-' * repeat)
-            report_logger.info('Ontology %s / Namespace %s', ontology.name, ontology.namespace)
-            report_logger.info('-' * repeat)
-            report_logger.info('- Imported Terms %s', terms)
-            report_logger.info('- Imported Relations %s', relations)
-            report_logger.info('- Imported Alt Ids %s', alt_ids)
-            report_logger.info('- Imported Synonyms %s', synonyms)
-            report_logger.info('- Generated Closure %s', closures)
+        with dal.session_scope() as session:
+            ontologies = session.query(Ontology).filter_by(name=ontology_name.upper()).all()
+            ontology_ids = [ontology.id for ontology in ontologies]
+            # one grouped query per table for all namespaces
+            counts = {
+                'terms': session.query(Term.ontology_id, func.count(Term.term_id)).filter(
+                    Term.ontology_id.in_(ontology_ids)).group_by(Term.ontology_id),
+                'relations': session.query(Relation.ontology_id, func.count(Relation.relation_id)).filter(
+                    Relation.ontology_id.in_(ontology_ids)).group_by(Relation.ontology_id),
+                'closures': session.query(Closure.ontology_id, func.count(Closure.closure_id)).filter(
+                    Closure.ontology_id.in_(ontology_ids)).group_by(Closure.ontology_id),
+                'alt_ids': session.query(Term.ontology_id, func.count(AltId.alt_id)).join(
+                    AltId, AltId.term_id == Term.term_id).filter(
+                    Term.ontology_id.in_(ontology_ids)).group_by(Term.ontology_id),
+                'synonyms': session.query(Term.ontology_id, func.count(Synonym.synonym_id)).join(
+                    Synonym, Synonym.term_id == Term.term_id).filter(
+                    Term.ontology_id.in_(ontology_ids)).group_by(Term.ontology_id)
+            }
+            counts = {key: dict(query.all()) for key, query in counts.items()}
+            load_date = None
+            m_load_date = session.query(Meta).filter_by(meta_key=ontology_name.upper() + '_load_date').one_or_none()
+            if m_load_date is not None:
+                try:
+                    load_date = datetime.datetime.strptime(m_load_date.meta_value.split('/', 1)[1], '%c')
+                except (IndexError, ValueError):
+                    report_logger.warning('Unable to parse load date %s', m_load_date.meta_value)
+            report_date = datetime.datetime.now()
+            statistics = []
+            for ontology in ontologies:
+                m_statistics = LoadStatistics(ontology_name=ontology.name,
+                                              namespace=ontology.namespace,
+                                              load_date=load_date,
+                                              report_date=report_date,
+                                              duration=(report_date - load_date).total_seconds() if load_date else None,
+                                              **{key: values.get(ontology.id, 0) for key, values in counts.items()})
+                session.add(m_statistics)
+                statistics.append(m_statistics)
+                repeat = len('Ontology %s / Namespace %s' % (ontology.name, ontology.namespace))
+                report_logger.info('-' * repeat)
+                report_logger.info('Ontology %s / Namespace %s', ontology.name, ontology.namespace)
+                report_logger.info('-' * repeat)
+                report_logger.info('- Imported Terms %s', m_statistics.terms)
+                report_logger.info('- Imported Relations %s', m_statistics.relations)
+                report_logger.info('- Imported Alt Ids %s', m_statistics.alt_ids)
+                report_logger.info('- Imported Synonyms %s', m_statistics.synonyms)
+                report_logger.info('- Generated Closure %s', m_statistics.closures)
+            session.flush()
+            session.expunge_all()
+        return statistics
+
+    def load_statistics(self, ontology_name):
+        """
+        Previous loads statistics for ontology, most recent first
+        :param ontology_name: ontology short name
+        :return: list of LoadStatistics
+        """
+        with dal.session_scope() as session:
+            statistics = session.query(LoadStatistics).filter_by(ontology_name=ontology_name.upper()).order_by(
+                LoadStatistics.report_date.desc(), LoadStatistics.statistics_id.desc()).all()
+            session.expunge_all()
+        return statistics
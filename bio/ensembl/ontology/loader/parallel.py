@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .slices import SliceMetrics, plan_slices
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['loading_waves', 'load_slice', 'load_parallel']
+
+# upper level ontologies referenced by most others, loaded first so that other ontologies relations find their terms
+# in db instead of fetching them from OLS
+base_ontologies = ['BFO']
+
+
+def loading_waves(ontologies, first=None):
+    """
+    Order ontologies in two loading waves, base ontologies first then all others. This is a fixed ordering, actual
+    ontologies imports are not looked at: ontologies in the second wave may still refer to each other.
+    :param ontologies: ontologies short names
+    :param first: ontologies to load before any other, defaults to base_ontologies
+    :return: list of lists of ontologies names
+    """
+    first = [name.upper() for name in (first if first is not None else base_ontologies)]
+    waves = [[name for name in ontologies if name.upper() in first],
+             [name for name in ontologies if name.upper() not in first]]
+    return [wave for wave in waves if wave]
+
+
+def load_slice(db_url, ontology_name, start, end, **options):
+    """
+    Load an ontology terms slice, run in a separate process as loader relies on module level database access layer.
+    :return: dict slice load summary
+    """
+    from .ols import OlsLoader
+
+    start_time = time.time()
+    loader = OlsLoader(db_url, **options)
+    nb_terms, nb_ignored = loader.load_ontology_terms(ontology_name, start, end)
+    return {
+        'ontology': ontology_name.upper(),
+        'start': start,
+        'end': end,
+        'loaded_range': loader.loaded_range,
+        'terms': nb_terms or 0,
+        'ignored': nb_ignored or 0,
+        'seconds': time.time() - start_time
+    }
+
+
+def _load_slice(job):
+    db_url, ontology_name, start, end, options = job
+    return load_slice(db_url, ontology_name, start, end, **options)
+
+
+def load_parallel(loader, ontologies, workers=None, slice_size=500, wipe=True):
+    """
+    Load ontologies terms slices in a process pool, wave by wave (see loading_waves).
+    Ontologies metadata are loaded once in current process, workers share OLS request rate (rate state file) and
+    ontologies snapshot (db) with the loader ones. Terms are shared through target db only, OLS responses are not
+    cached across workers. SQLite allows a single writer, slices are then loaded one at a time (see load_shards).
+    :param loader: OlsLoader for target db
+    :param ontologies: ontologies short names
+    :param workers: number of processes, defaults to number of cpus, 1 for a SQLite db
+    :param slice_size: average number of terms per slice
+    :param wipe: wipe ontologies before loading
+    :return: list of slices summaries
+    """
+    from .db import dal
+
+    if dal.engine.dialect.name == 'sqlite' and workers != 1:
+        logger.warning('SQLite db %s, slices loaded by a single worker', loader.db_url)
+        workers = 1
+    metrics = SliceMetrics(loader.options.get('output_dir'))
+    loader.snapshot_ontologies(ontologies)
+    results = []
+    for wave in loading_waves(ontologies):
+        jobs = []
+        for ontology_name in wave:
+            if wipe:
+                loader.wipe_ontology(ontology_name=ontology_name)
+            with dal.session_scope() as session:
+                m_ontology = loader.load_ontology(ontology_name, session=session)
+                nb_terms = m_ontology.number_of_terms
+            for start, end in plan_slices(nb_terms, slice_size, history=metrics.history(ontology_name)):
+                jobs.append((loader.db_url, ontology_name, start, end, loader.options))
+        logger.info('Loading %s in %s slices', wave, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for future in as_completed([executor.submit(_load_slice, job) for job in jobs]):
+                result = future.result()
+                if result['loaded_range'] is not None:
+                    first_index, last_index = result['loaded_range']
+                    metrics.record(result['ontology'], first_index, last_index, last_index - first_index + 1,
+                                   result['seconds'])
+                logger.info('Loaded %s [%s..%s] %s terms in %.1fs', result['ontology'], result['start'],
+                            result['end'], result['terms'], result['seconds'])
+                results.append(result)
+    return results
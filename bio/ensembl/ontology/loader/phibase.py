@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+
+from sqlalchemy import Table, MetaData, Column, Integer, String, select, literal, cast
+
+from bio.ensembl.ontology.loader.ids import IdAllocator
+from bio.ensembl.ontology.loader.models import Ontology, Term, Relation, RelationType, get_one_or_create
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['phi_accession', 'wipe_identifiers', 'load_identifiers']
+
+
+def phi_accession(index):
+    return 'PHI:{}'.format(index)
+
+
+def _missing(session, numbers):
+    """
+    Identifiers not loaded yet, candidates are anti joined with terms in db through a temporary table
+    :param session: db session
+    :param numbers: candidate identifiers numbers
+    :return: sorted list of missing identifiers numbers
+    """
+    candidate = Table('ols_phi_candidate', MetaData(),
+                      Column('number', Integer, primary_key=True, autoincrement=False),
+                      prefixes=['TEMPORARY'])
+    term = Term.__table__
+    # temporary table only lives in the session transaction connection
+    connection = session.connection()
+    candidate.create(connection)
+    try:
+        connection.execute(candidate.insert(), [dict(number=number) for number in numbers])
+        accession = literal(phi_accession('')) + cast(candidate.c.number, String)
+        return [number for number, in connection.execute(
+            select([candidate.c.number]).select_from(
+                candidate.outerjoin(term, term.c.accession == accession)).where(
+                term.c.term_id.is_(None)).order_by(candidate.c.number))]
+    finally:
+        candidate.drop(connection)
+
+
+def wipe_identifiers(session):
+    """ Delete all PHI-base identifiers terms and their relations """
+    ontologies = session.query(Ontology).filter_by(name='PHI', namespace='phibase_identifier').all()
+    for ontology in ontologies:
+        logger.info('Deleting namespaced ontology %s - %s', ontology.name, ontology.namespace)
+        rel = session.query(Relation).filter_by(ontology=ontology).delete()
+        logger.info('Wiped %s Relations', rel)
+        res = session.query(Term).filter_by(ontology=ontology).delete()
+        logger.info('Wiped %s Terms', res)
+        logger.debug('...Done')
+
+
+def load_identifiers(session, start, end, batch_size=10000):
+    """
+    Generate PHI-base identifiers terms PHI:start..PHI:end, each one child (is_a) of root PHI:0.
+    Identifiers already loaded are left untouched, missing ones are found and inserted in bulk by batches.
+    :param session: db session
+    :param start: first identifier
+    :param end: last identifier (inclusive)
+    :param batch_size: number of terms inserted per statement
+    :return: number of created terms
+    """
+    m_ontology, created = get_one_or_create(Ontology, session,
+                                            name='PHI',
+                                            namespace='phibase_identifier',
+                                            create_method_kwargs=dict(
+                                                version='1.0',
+                                                title='PHI-base Identifiers'))
+    m_root, created = get_one_or_create(Term, session,
+                                        accession=phi_accession(0),
+                                        create_method_kwargs=dict(accession=phi_accession(0),
+                                                                  ontology=m_ontology,
+                                                                  is_root=1,
+                                                                  name='phibase identifier'))
+    relation_type, created = get_one_or_create(RelationType, session, name='is_a')
+    allocator = session.info.get('id_allocator') or IdAllocator(session.get_bind())
+    nb_created = 0
+    for offset in range(max(start, 1), end + 1, batch_size):
+        batch = _missing(session, range(offset, min(offset + batch_size, end + 1)))
+        if not batch:
+            continue
+        # ids reserved from the allocator counter, concurrent slices may insert in the same time
+        terms = allocator.assign(Term.__table__, [dict(accession=phi_accession(i),
+                                                       name=str(i),
+                                                       ontology_id=m_ontology.id,
+                                                       is_root=0,
+                                                       is_obsolete=0) for i in batch], session)
+        session.execute(Term.__table__.insert(), terms)
+        relations = allocator.assign(Relation.__table__, [dict(child_term_id=term['term_id'],
+                                                               parent_term_id=m_root.term_id,
+                                                               relation_type_id=relation_type.relation_type_id,
+                                                               intersection_of=0,
+                                                               ontology_id=m_ontology.id) for term in terms], session)
+        session.execute(Relation.__table__.insert(), relations)
+        session.commit()
+        nb_created += len(batch)
+        logger.info('Committed %s PHI-base identifiers', nb_created)
+    return nb_created
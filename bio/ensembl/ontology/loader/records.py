@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Lightweight records: terms built straight from OLS HAL JSON, exposing the same attributes as ols-client helpers used
+by the loader without coreapi documents behind them, and compact staging records for synonyms, alt ids and relations
+buffered before being written in batches.
+"""
+import logging
+import re
+import tracemalloc
+
+import inflection
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['TermRecord', 'Annotation', 'SynonymRecord', 'AltIdRecord', 'EdgeRecord', 'memory_per_record']
+
+# term links which are not ontology relations: self and curies are not links for coreapi HAL documents, graph and
+# jstree are skipped by ols-client
+_structural_links = {'self', 'curies', 'graph', 'jstree'}
+
+
+def _underscore(value):
+    """ JSON keys converted into python names, as ols-client helpers do """
+    return re.sub(r'\s+', '_', inflection.underscore(value))
+
+
+def _convert_keys(data):
+    return {_underscore(key): _convert_keys(value) if isinstance(value, dict) else value
+            for key, value in data.items()}
+
+
+class Annotation:
+    """ Term annotations, missing annotations read as None """
+    __slots__ = ('_values',)
+
+    def __init__(self, values=None):
+        self._values = {}
+        for name, value in _convert_keys(values or {}).items():
+            # 'def' and 'definition' annotations are both stored as 'def' by ols-client
+            if name == 'definition':
+                if value:
+                    self._values['def'] = value
+            else:
+                self._values[name] = value
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self._values.get(name)
+
+    @property
+    def definition(self):
+        return self._values.get('def')
+
+    def __repr__(self):
+        return '<Annotation({})>'.format(self._values)
+
+
+class TermRecord:
+    """ OLS term, drop in replacement of ebi.ols.api.helpers.Term for the loader """
+    __slots__ = ('iri', 'label', '_description', 'annotation', 'synonyms', 'obo_synonym', 'ontology_name',
+                 'ontology_prefix', 'is_obsolete', 'is_defining_ontology', 'is_root', 'short_form', 'obo_id',
+                 'in_subset', 'links', 'fetcher', '_accession')
+
+    def __init__(self, iri=None, label=None, description=None, annotation=None, synonyms=None, obo_synonym=None,
+                 ontology_name=None, ontology_prefix=None, is_obsolete=False, is_defining_ontology=False,
+                 is_root=False, short_form=None, obo_id=None, in_subset=None, links=None, fetcher=None):
+        self.iri = iri
+        self.label = label
+        self._description = []
+        self.description = description
+        self.annotation = annotation if isinstance(annotation, Annotation) else Annotation(annotation)
+        self.synonyms = synonyms
+        self.obo_synonym = obo_synonym
+        self.ontology_name = ontology_name
+        self.ontology_prefix = ontology_prefix
+        self.is_obsolete = is_obsolete
+        self.is_defining_ontology = is_defining_ontology
+        self.is_root = is_root
+        self.short_form = short_form
+        self.obo_id = obo_id
+        self.in_subset = in_subset
+        self.links = links or {}
+        self.fetcher = fetcher
+        self._accession = None
+
+    @classmethod
+    def from_json(cls, data, fetcher=None):
+        """
+        :param data: decoded OLS term JSON
+        :param fetcher: OlsFetcher used to load relations
+        :return: TermRecord
+        """
+        return cls(iri=data.get('iri'),
+                   label=data.get('label'),
+                   description=data.get('description'),
+                   annotation=data.get('annotation'),
+                   synonyms=data.get('synonyms'),
+                   obo_synonym=data.get('obo_synonym'),
+                   ontology_name=data.get('ontology_name'),
+                   ontology_prefix=data.get('ontology_prefix'),
+                   is_obsolete=data.get('is_obsolete', False),
+                   is_defining_ontology=data.get('is_defining_ontology', False),
+                   is_root=data.get('is_root', False),
+                   short_form=data.get('short_form'),
+                   obo_id=data.get('obo_id'),
+                   in_subset=data.get('in_subset'),
+                   links={name: link['href'] for name, link in data.get('_links', {}).items() if 'href' in link},
+                   fetcher=fetcher)
+
+    @property
+    def description(self):
+        """ First term definition, first definition annotation otherwise """
+        if self._description:
+            return self._description[0]
+        return self.annotation.definition[0] if self.annotation.definition else ''
+
+    @description.setter
+    def description(self, description):
+        if description:
+            self._description = list(description) if isinstance(description, (list, tuple)) else [description]
+
+    @property
+    def accession(self):
+        """ OBO id, guessed from short form (or iri) last '_' when OLS has none """
+        if self._accession:
+            return self._accession
+        if not self.obo_id:
+            parts = (self.short_form or self.iri.rsplit('/', 1)[-1]).split('_')
+            if len(parts) < 2:
+                # no '_' character in short_form might ignore the error (may be #Thing)
+                logger.info('[NO_OBO_ID][%s][%s]', self.short_form, self.iri)
+                return None
+            self._accession = ':'.join(['_'.join(parts[:-1]), parts[-1]])
+            return self._accession
+        return self.obo_id
+
+    @accession.setter
+    def accession(self, accession):
+        self._accession = accession
+
+    @property
+    def name(self):
+        return self.label
+
+    @property
+    def namespace(self):
+        if self.annotation.has_obo_namespace:
+            return self.annotation.has_obo_namespace[0]
+        if self.annotation.namespace:
+            return self.annotation.namespace[0]
+        return self.ontology_name
+
+    @property
+    def subsets(self):
+        """ Comma separated term subsets, sorted case insensitively """
+        return ','.join(sorted(self.in_subset, key=lambda subset: subset.lower())) if self.in_subset else ''
+
+    @property
+    def relations_types(self):
+        return [name for name in self.links if name not in _structural_links]
+
+    def load_relation(self, relation_name):
+        """ :return: list of related TermRecord, empty if term has no such relation """
+        if relation_name not in self.links:
+            return []
+        return self.fetcher.related(self.links[relation_name])
+
+    def __repr__(self):
+        return '<TermRecord(accession={}, label={}, ontology_name={})>'.format(self.accession, self.label,
+                                                                             self.ontology_name)
+
+
+class SynonymRecord:
+    """ Staged synonym, type is a SynonymTypeEnum name """
+    __slots__ = ('name', 'type', 'db_xref')
+
+    def __init__(self, name, type=None, db_xref=None):
+        self.name = name
+        self.type = type
+        self.db_xref = db_xref
+
+    def __repr__(self):
+        return '<SynonymRecord(name={}, type={})>'.format(self.name, self.type)
+
+
+class AltIdRecord:
+    """ Staged alternative accession """
+    __slots__ = ('accession',)
+
+    def __init__(self, accession):
+        self.accession = accession
+
+    def __repr__(self):
+        return '<AltIdRecord(accession={})>'.format(self.accession)
+
+
+class EdgeRecord:
+    """ Staged relation, ends are Term models whose ids may only be known on flush, relation type and ontology
+    models. A record only holds references to models already in session.
+    """
+    __slots__ = ('child', 'parent', 'relation_type', 'ontology')
+
+    def __init__(self, child, parent, relation_type, ontology):
+        self.child = child
+        self.parent = parent
+        self.relation_type = relation_type
+        self.ontology = ontology
+
+    def __repr__(self):
+        return '<EdgeRecord(child={}, parent={}, relation_type={})>'.format(self.child, self.parent,
+                                                                          self.relation_type)
+
+
+def memory_per_record(factory, count=10000):
+    """
+    Measure memory held by records
+    :param factory: function building record number i
+    :param count: number of records built
+    :return: average number of bytes allocated per record, values built by factory included
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        records = [factory(i) for i in range(count)]
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del records
+    return allocated / count
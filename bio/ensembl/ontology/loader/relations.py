@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+
+from sqlalchemy import event, inspect, select, and_
+from sqlalchemy.orm import aliased, noload
+
+from .models import Term, Relation, RelationType, Ontology
+from .records import EdgeRecord
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['RelationIndex', 'term_loading_options']
+
+
+def term_loading_options():
+    """ Query options for terms fetched while loading, relations collections are never needed there """
+    return [noload(Term.child_terms), noload(Term.parent_terms)]
+
+
+class RelationIndex:
+    """ Relations known in a session, keyed by (child accession, parent accession, type name, ontology).
+
+    Replaces Term.add_parent_relation on the loading path: membership is a set lookup instead of one SELECT per
+    relation plus a scan of the term relations collection, and new relations are inserted in bulk right before the
+    session commits. Existing relations of a term are read once, the first time a relation is added to it.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.keys = set()
+        self.pending = []
+        self._loaded = set()
+        event.listen(session, 'before_commit', self._before_commit)
+        event.listen(session, 'after_rollback', self._after_rollback)
+
+    @classmethod
+    def for_session(cls, session):
+        """ Index bound to session, created on first call """
+        if 'relation_index' not in session.info:
+            session.info['relation_index'] = cls(session)
+        return session.info['relation_index']
+
+    @staticmethod
+    def key(child_term, parent_term, relation_type, ontology):
+        return child_term.accession, parent_term.accession, relation_type.name, ontology.name, ontology.namespace
+
+    def _load_term(self, term):
+        if term.accession in self._loaded:
+            return
+        self._loaded.add(term.accession)
+        if term.term_id is None:
+            return
+        parent = aliased(Term)
+        for parent_accession, type_name, name, namespace in self.session.query(
+                parent.accession, RelationType.name, Ontology.name, Ontology.namespace).select_from(Relation).join(
+                parent, Relation.parent_term_id == parent.term_id).join(
+                RelationType, Relation.relation_type_id == RelationType.relation_type_id).join(
+                Ontology, Relation.ontology_id == Ontology.id).filter(Relation.child_term_id == term.term_id):
+            self.keys.add((term.accession, parent_accession, type_name, name, namespace))
+
+    def add(self, child_term, parent_term, relation_type, ontology=None):
+        """
+        Add a relation unless already known, relation row is only inserted on flush.
+        :param child_term: child Term
+        :param parent_term: parent Term
+        :param relation_type: RelationType
+        :param ontology: relation Ontology, defaults to child term one
+        :return: True if relation has been added
+        """
+        ontology = ontology or child_term.ontology
+        self._load_term(child_term)
+        key = self.key(child_term, parent_term, relation_type, ontology)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        self.pending.append(EdgeRecord(child_term, parent_term, relation_type, ontology))
+        return True
+
+    def flush(self):
+        """
+        Insert pending relations in one statement
+        :return: number of relations inserted
+        """
+        if not self.pending:
+            return 0
+        # terms, types and ontologies need their ids
+        self.session.flush()
+        values = [dict(child_term_id=edge.child.term_id,
+                       parent_term_id=edge.parent.term_id,
+                       relation_type_id=edge.relation_type.relation_type_id,
+                       ontology_id=edge.ontology.id,
+                       intersection_of=0) for edge in self.pending]
+        # relations inserted meanwhile by a concurrent slice are skipped, any other error is raised
+        existing = self._existing({value['child_term_id'] for value in values})
+        values = [value for value in values if self._row_key(value) not in existing]
+        if values:
+            if 'id_allocator' in self.session.info:
+                self.session.info['id_allocator'].assign(Relation.__table__, values, self.session)
+            self.session.execute(Relation.__table__.insert(), values)
+        logger.debug('Inserted %s relations', len(values))
+        # relations collections already loaded in session do not see rows inserted above
+        for edge in self.pending:
+            self.session.expire(edge.child, ['parent_terms'])
+            self.session.expire(edge.parent, ['child_terms'])
+        self.pending = []
+        return len(values)
+
+    @staticmethod
+    def _row_key(row):
+        return row['child_term_id'], row['parent_term_id'], row['relation_type_id'], row['ontology_id']
+
+    def _existing(self, child_term_ids, chunk_size=500):
+        """ Keys of relations (not intersection_of) already in db for child terms """
+        relation = Relation.__table__
+        child_term_ids = list(child_term_ids)
+        existing = set()
+        for offset in range(0, len(child_term_ids), chunk_size):
+            existing.update(self._row_key(row) for row in self.session.execute(
+                select([relation.c.child_term_id, relation.c.parent_term_id, relation.c.relation_type_id,
+                        relation.c.ontology_id]).where(and_(
+                    relation.c.child_term_id.in_(child_term_ids[offset:offset + chunk_size]),
+                    relation.c.intersection_of == 0))))
+        return existing
+
+    def _before_commit(self, session):
+        self.flush()
+
+    def _after_rollback(self, session):
+        # get_one_or_create rolls back on integrity errors (i.e. a term created meanwhile by a concurrent slice) and
+        # nothing loads the terms again: relations between committed rows are kept and inserted on next flush, only
+        # relations to rolled back terms are forgotten
+        pending = []
+        for edge in self.pending:
+            if all(inspect(obj).persistent for obj in (edge.child, edge.parent, edge.relation_type, edge.ontology)):
+                pending.append(edge)
+            else:
+                self.keys.discard(self.key(edge.child, edge.parent, edge.relation_type, edge.ontology))
+                for term in (edge.child, edge.parent):
+                    if not inspect(term).persistent:
+                        self._loaded.discard(term.accession)
+        self.pending = pending
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['TermQueue', 'merge_queue_stats']
+
+
+def merge_queue_stats(total, stats):
+    """ Accumulate queue stats into total, max_* values are maxed, others summed """
+    for key, value in stats.items():
+        if key.startswith('max_'):
+            total[key] = max(total.get(key, 0), value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+class TermQueue:
+    """ Work queue of related terms waiting to be resolved.
+
+    Items are (term, related OLS term, relation type, depth) tuples, depth being the number of relations followed
+    from the first loaded term. Resolved terms are kept by IRI in `visited` (None when not resolvable), so that the
+    same related term is fetched and created once whatever the number of terms pointing to it. A queue lives as long
+    as the terms slice it resolves terms for, `visited` is forgotten when the session rolls back.
+    """
+
+    def __init__(self, batch_size=50):
+        self.batch_size = batch_size
+        self.items = collections.deque()
+        self.visited = {}
+        self.stats = {
+            'enqueued': 0,
+            'resolved': 0,
+            'batches': 0,
+            'max_size': 0,
+            'max_depth': 0
+        }
+        self._reported = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def push(self, m_term, o_related, relation_type, depth):
+        self.items.append((m_term, o_related, relation_type, depth))
+        self.stats['enqueued'] += 1
+        self.stats['max_size'] = max(self.stats['max_size'], len(self.items))
+        self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+
+    def next_batch(self):
+        """ Pop next items to resolve, at most batch_size """
+        batch = [self.items.popleft() for _ in range(min(self.batch_size, len(self.items)))]
+        self.stats['batches'] += 1
+        self.stats['resolved'] += len(batch)
+        logger.debug('Resolving %s related terms, %s left', len(batch), len(self.items))
+        return batch
+
+    def resolved(self, iri, m_term):
+        self.visited[iri] = m_term
+
+    def forget(self, *args):
+        """ Drop visited terms, i.e. on session rollback where created terms are lost """
+        self.visited.clear()
+
+    def report(self):
+        """ :return: stats accumulated since previous report, max_* values being the current ones """
+        delta = {key: value if key.startswith('max_') else value - self._reported.get(key, 0)
+                 for key, value in self.stats.items()}
+        self._reported = dict(self.stats)
+        return delta
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+Read only HTTP / JSON query service over a loaded ontology database:
+
+- GET /term/<accession>
+- GET /term/<accession>/ancestors[?relation=is_a,part_of]
+- GET /term/<accession>/descendants[?relation=is_a]
+- GET /search?q=<text>[&limit=20][&ontology=GO]
+- GET /subsets, GET /subsets/<name>
+- GET /stats: cache and latencies
+"""
+import collections
+import inspect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+from sqlalchemy import text
+from sqlalchemy.orm import aliased
+
+from .db import dal
+from .fts import search, like_search
+from .models import Meta, Ontology, Term, Synonym, AltId, Relation, RelationType, Subset
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['OntologyService', 'ResponseCache', 'serve']
+
+
+class ResponseCache:
+    """ Thread safe LRU cache of responses """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        with self._lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.items.clear()
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+class OntologyService:
+    """ Query endpoints, responses cached until ontologies load dates (meta table) change.
+
+    Load dates are checked at most every `check_interval` seconds, so a reload is seen by the service within this
+    delay. Latencies of the last `window` requests per endpoint are kept for /stats.
+    """
+
+    def __init__(self, db_url, cache_size=1024, check_interval=5, window=10000, **options):
+        dal.db_init(db_url, **options)
+        self.cache = ResponseCache(cache_size)
+        self.check_interval = check_interval
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._load_dates = None
+        self._checked = 0
+        self._lock = threading.Lock()
+        self.routes = {
+            'term': self.term,
+            'ancestors': self.ancestors,
+            'descendants': self.descendants,
+            'search': self.search,
+            'subsets': self.subsets
+        }
+
+    def load_dates(self, session):
+        return sorted(session.query(Meta.meta_key, Meta.meta_value).filter(Meta.meta_key.like('%_load_date')))
+
+    def _check_cache(self, session):
+        """ Drop cached responses when an ontology has been (re)loaded or wiped """
+        with self._lock:
+            if time.monotonic() - self._checked < self.check_interval:
+                return
+            load_dates = self.load_dates(session)
+            if load_dates != self._load_dates:
+                if self._load_dates is not None:
+                    logger.info('Ontologies load dates changed, %s cached responses dropped', len(self.cache))
+                self.cache.clear()
+                self._load_dates = load_dates
+            self._checked = time.monotonic()
+
+    def _term_id(self, session, accession):
+        term_id = session.query(Term.term_id).filter(Term.accession == accession).scalar()
+        if term_id is None:
+            raise NotFound('Term %s not found' % accession)
+        return term_id
+
+    def term(self, session, accession):
+        row = session.query(Term.term_id, Term.accession, Term.name, Term._description.label('definition'),
+                            Term.subsets, Term.is_root, Term.is_obsolete, Term.iri,
+                            Ontology.name.label('ontology'), Ontology.namespace).join(
+            Ontology, Term.ontology_id == Ontology.id).filter(Term.accession == accession).first()
+        if row is None:
+            raise NotFound('Term %s not found' % accession)
+        parent = aliased(Term)
+        return {
+            'accession': row.accession,
+            'name': row.name,
+            'definition': row.definition,
+            'ontology': row.ontology,
+            'namespace': row.namespace,
+            'subsets': [subset for subset in (row.subsets or '').split(',') if subset],
+            'is_root': bool(row.is_root),
+            'is_obsolete': bool(row.is_obsolete),
+            'iri': row.iri,
+            'synonyms': [{'name': name, 'type': synonym_type.name if synonym_type else None} for name, synonym_type in
+                         session.query(Synonym.name, Synonym.type).filter(Synonym.term_id == row.term_id)],
+            'alt_ids': [accession for accession, in
+                        session.query(AltId.accession).filter(AltId.term_id == row.term_id)],
+            'parents': [{'accession': accession, 'relation': relation} for accession, relation in
+                        session.query(parent.accession, RelationType.name).select_from(Relation).join(
+                            parent, Relation.parent_term_id == parent.term_id).join(
+                            RelationType, Relation.relation_type_id == RelationType.relation_type_id).filter(
+                            Relation.child_term_id == row.term_id)]
+        }
+
+    def _walk(self, session, accession, relation, upward):
+        """ Breadth first walk over relations, one query per level """
+        source, target = (Relation.child_term_id, Relation.parent_term_id) if upward else \
+            (Relation.parent_term_id, Relation.child_term_id)
+        start = self._term_id(session, accession)
+        distances = {start: 0}
+        level = [start]
+        distance = 0
+        while level:
+            distance += 1
+            found = set()
+            for i in range(0, len(level), 500):
+                query = session.query(target).filter(source.in_(level[i:i + 500]))
+                if relation:
+                    query = query.join(RelationType, Relation.relation_type_id == RelationType.relation_type_id).filter(
+                        RelationType.name.in_(relation.split(',')))
+                found.update(term_id for term_id, in query if term_id not in distances)
+            level = list(found)
+            distances.update((term_id, distance) for term_id in level)
+        del distances[start]
+        terms = []
+        term_ids = list(distances)
+        for i in range(0, len(term_ids), 500):
+            terms.extend({'accession': term_accession, 'name': name, 'distance': distances[term_id]}
+                         for term_id, term_accession, name in session.query(Term.term_id, Term.accession, Term.name)
+                         .filter(Term.term_id.in_(term_ids[i:i + 500])))
+        return sorted(terms, key=lambda term: (term['distance'], term['accession']))
+
+    def ancestors(self, session, accession, relation=None):
+        return self._walk(session, accession, relation, upward=True)
+
+    def descendants(self, session, accession, relation=None):
+        return self._walk(session, accession, relation, upward=False)
+
+    def search(self, session, q, limit=20, ontology=None):
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise BadRequest('limit must be an integer: %s' % limit)
+        if limit < 1:
+            raise BadRequest('limit must be positive: %s' % limit)
+        ontologies = ontology.split(',') if ontology else None
+        fts = session.bind.dialect.name == 'sqlite' and session.execute(
+            text("SELECT name FROM sqlite_master WHERE name = 'term_fts'")).scalar()
+        if fts:
+            results = search(session, q, limit, ontologies)
+        else:
+            results = like_search(session, q, limit, ontologies)
+        return [result._asdict() for result in results]
+
+    def subsets(self, session, name=None):
+        if name is None:
+            return [{'name': subset_name, 'definition': definition}
+                    for subset_name, definition in session.query(Subset.name, Subset.definition).order_by(Subset.name)]
+        if session.query(Subset.subset_id).filter(Subset.name == name).scalar() is None:
+            raise NotFound('Subset %s not found' % name)
+        return [{'accession': accession, 'name': term_name}
+                for accession, term_name, subsets in session.query(Term.accession, Term.name, Term.subsets).filter(
+                    Term.subsets.like('%' + name + '%')).order_by(Term.accession)
+                if name in subsets.split(',')]
+
+    def stats(self):
+        latencies = {}
+        for endpoint, timings in list(self.latencies.items()):
+            timings = sorted(timings)
+            latencies[endpoint] = {
+                'requests': len(timings),
+                'p50': timings[len(timings) // 2],
+                'p99': timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            }
+        return {'cache': {'size': len(self.cache), 'hits': self.cache.hits, 'misses': self.cache.misses},
+                'latencies_ms': latencies}
+
+    def route(self, path):
+        """ :return: endpoint name and its positional arguments """
+        parts = [unquote(part) for part in path.strip('/').split('/') if part]
+        if len(parts) == 3 and parts[0] == 'term' and parts[2] in ('ancestors', 'descendants'):
+            return parts[2], [parts[1]]
+        if len(parts) == 2 and parts[0] in ('term', 'subsets'):
+            return parts[0], [parts[1]]
+        if len(parts) == 1 and parts[0] in ('search', 'subsets', 'stats'):
+            return parts[0], []
+        raise NotFound('Unknown path %s' % path)
+
+    def handle(self, url):
+        """
+        Answer a request
+        :param url: request path and query string
+        :return: tuple HTTP status, JSON body bytes
+        """
+        start = time.perf_counter()
+        endpoint = 'error'
+        try:
+            parsed = urlparse(url)
+            endpoint, args = self.route(parsed.path)
+            if endpoint == 'stats':
+                return 200, json.dumps(self.stats()).encode('utf-8')
+            params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+            session = dal.get_session()
+            try:
+                self._check_cache(session)
+                key = (endpoint, tuple(args), tuple(sorted(params.items())))
+                body = self.cache.get(key)
+                if body is None:
+                    try:
+                        inspect.signature(self.routes[endpoint]).bind(session, *args, **params)
+                    except TypeError as e:
+                        raise BadRequest(str(e))
+                    body = json.dumps(self.routes[endpoint](session, *args, **params)).encode('utf-8')
+                    self.cache.put(key, body)
+            finally:
+                session.close()
+            return 200, body
+        except NotFound as e:
+            return 404, json.dumps({'error': str(e)}).encode('utf-8')
+        except BadRequest as e:
+            return 400, json.dumps({'error': str(e)}).encode('utf-8')
+        except Exception as e:
+            logger.exception('Error answering %s', url)
+            return 500, json.dumps({'error': str(e)}).encode('utf-8')
+        finally:
+            self.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        status, body = self.server.service.handle(self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def serve(service, host='localhost', port=8000):
+    """
+    Create service HTTP server, call serve_forever on it to answer requests
+    :return: ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.service = service
+    logger.info('Ontology service listening on %s:%s', *server.server_address[:2])
+    return server
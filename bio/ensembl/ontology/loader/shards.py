@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .ids import IdAllocator
+from .merge import staging_db_url, merge_database
+from .models import Meta, Ontology, Subset, RelationType, Term, Synonym, AltId, Relation
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['load_shard', 'load_shards', 'merge_attached', 'merge_shards']
+
+
+def load_shard(shard_dir, ontology_name, start=None, end=None, **options):
+    """
+    Load an ontology, or a slice of its terms, into its own SQLite shard. Run in a separate process, as loader
+    relies on module level database access layer.
+    :return: tuple shard file name, number of terms loaded, load time in seconds
+    """
+    from .db import dal
+    from .ols import OlsLoader
+
+    start_time = time.time()
+    db_url = staging_db_url(shard_dir, ontology_name, start or 0, end or 0)
+    loader = OlsLoader(db_url, **options)
+    with dal.session_scope() as session:
+        loader.load_ontology(ontology_name, session=session)
+    nb_terms, nb_ignored = loader.load_ontology_terms(ontology_name, start, end)
+    return db_url[len('sqlite:///'):], nb_terms or 0, time.time() - start_time
+
+
+def _load_shard(job):
+    shard_dir, ontology_name, start, end, options = job
+    return load_shard(shard_dir, ontology_name, start, end, **options)
+
+
+def load_shards(shard_dir, jobs, workers=None, **options):
+    """
+    Load shards in parallel, one process per shard
+    :param shard_dir: directory holding shard files
+    :param jobs: list of (ontology_name, start, end) tuples, start and end None for a whole ontology
+    :param workers: number of processes, defaults to number of cpus
+    :param options: OlsLoader options
+    :return: list of load_shard results
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(_load_shard, [(shard_dir, name, start, end, options) for name, start, end in jobs]))
+
+
+def _columns(table, alias=None, exclude=()):
+    return ', '.join((alias + '.' if alias else '') + column.name for column in table.columns
+                     if not column.primary_key and column.name not in exclude)
+
+
+def _copy_by_key(cursor, table, keys):
+    """ Insert shard rows not already in target, matched on keys """
+    match = ' AND '.join('t.{0} = s.{0}'.format(key) for key in keys)
+    cursor.execute('INSERT INTO main.{0} ({1}) SELECT {2} FROM shard.{0} s WHERE NOT EXISTS '
+                   '(SELECT 1 FROM main.{0} t WHERE {3})'.format(table.name, _columns(table), _columns(table, 's'),
+                                                                  match))
+    return cursor.rowcount
+
+
+def _map_by_key(cursor, table, keys):
+    """ Temporary table mapping shard primary key to target one """
+    pk = list(table.primary_key.columns)[0].name
+    match = ' AND '.join('t.{0} = s.{0}'.format(key) for key in keys)
+    cursor.execute('CREATE TEMP TABLE map_{0} AS SELECT s.{1} AS src, t.{1} AS dst FROM shard.{0} s '
+                   'JOIN main.{0} t ON {2}'.format(table.name, pk, match))
+    cursor.execute('CREATE UNIQUE INDEX temp.map_{0}_src ON map_{0} (src)'.format(table.name))
+
+
+def _insert_allocated(cursor, connection, table, columns, query):
+    """
+    Insert query rows into target table, primary keys being reserved from id allocator counter
+    :param columns: target columns, in query columns order
+    :param query: select statement over attached shard
+    :return: number of rows inserted
+    """
+    pk = list(table.primary_key.columns)[0].name
+    cursor.execute('CREATE TEMP TABLE new_rows AS ' + query)
+    count = cursor.execute('SELECT COUNT(*) FROM new_rows').fetchone()[0]
+    if count:
+        # temporary table rowids run from 1 to count, shifted into the reserved range
+        first = IdAllocator(connection.engine).reserve(table, count, connection=connection)
+        cursor.execute('INSERT INTO main.{0} ({1}, {2}) SELECT rowid + ?, * FROM new_rows ORDER BY rowid'.format(
+            table.name, pk, columns), (first - 1,))
+    cursor.execute('DROP TABLE temp.new_rows')
+    return count
+
+
+def merge_attached(target_engine, shard_file):
+    """
+    Merge a SQLite shard into a SQLite target database, shard is attached to target connection and rows are copied
+    with set based INSERT ... SELECT statements, ids being remapped through temporary tables. New terms, synonyms,
+    alt ids and relations ids are reserved from target id allocator counter.
+    Terms are deduplicated by accession, terms already in target keep their synonyms and alt ids.
+    :param target_engine: SQLite target database engine
+    :param shard_file: shard file name
+    :return: dict number of rows inserted per table
+    """
+    term, synonym, alt_id, relation = Term.__table__, Synonym.__table__, AltId.__table__, Relation.__table__
+    stats = {}
+    connection = target_engine.connect()
+    try:
+        # raw cursor and id allocator share the same transaction
+        transaction = connection.begin()
+        cursor = connection.connection.cursor()
+        cursor.execute('ATTACH DATABASE ? AS shard', (shard_file,))
+        stats['meta'] = _copy_by_key(cursor, Meta.__table__, ['meta_key'])
+        _copy_by_key(cursor, Ontology.__table__, ['name', 'namespace'])
+        _copy_by_key(cursor, RelationType.__table__, ['name'])
+        _copy_by_key(cursor, Subset.__table__, ['name'])
+        _map_by_key(cursor, Ontology.__table__, ['name', 'namespace'])
+        _map_by_key(cursor, RelationType.__table__, ['name'])
+        cursor.execute('CREATE TEMP TABLE new_term AS SELECT s.term_id FROM shard.term s WHERE NOT EXISTS '
+                       '(SELECT 1 FROM main.term t WHERE t.accession = s.accession)')
+        cursor.execute('CREATE UNIQUE INDEX temp.new_term_id ON new_term (term_id)')
+        stats['term'] = _insert_allocated(cursor, connection, term,
+                                          'ontology_id, ' + _columns(term, exclude=['ontology_id']),
+                                          'SELECT o.dst, {} FROM shard.term s '
+                                          'JOIN new_term n ON n.term_id = s.term_id '
+                                          'JOIN map_ontology o ON o.src = s.ontology_id '
+                                          'ORDER BY s.term_id'.format(_columns(term, 's', ['ontology_id'])))
+        _map_by_key(cursor, term, ['accession'])
+        for table in (synonym, alt_id):
+            pk = list(table.primary_key.columns)[0].name
+            stats[table.name] = _insert_allocated(cursor, connection, table,
+                                                  'term_id, ' + _columns(table, exclude=['term_id']),
+                                                  'SELECT m.dst, {1} FROM shard.{0} s '
+                                                  'JOIN new_term n ON n.term_id = s.term_id '
+                                                  'JOIN map_term m ON m.src = s.term_id '
+                                                  'ORDER BY s.{2}'.format(table.name,
+                                                                          _columns(table, 's', ['term_id']), pk))
+        stats['relation'] = _insert_allocated(cursor, connection, relation,
+                                              'child_term_id, parent_term_id, relation_type_id, intersection_of, '
+                                              'ontology_id',
+                                              'SELECT DISTINCT c.dst, p.dst, rt.dst, s.intersection_of, o.dst '
+                                              'FROM shard.relation s '
+                                              'JOIN map_term c ON c.src = s.child_term_id '
+                                              'JOIN map_term p ON p.src = s.parent_term_id '
+                                              'JOIN map_relation_type rt ON rt.src = s.relation_type_id '
+                                              'JOIN map_ontology o ON o.src = s.ontology_id '
+                                              'WHERE NOT EXISTS (SELECT 1 FROM main.relation t '
+                                              'WHERE t.child_term_id = c.dst AND t.parent_term_id = p.dst '
+                                              'AND t.relation_type_id = rt.dst '
+                                              'AND t.intersection_of = s.intersection_of AND t.ontology_id = o.dst)')
+        transaction.commit()
+        for temp_table in ('map_ontology', 'map_relation_type', 'map_term', 'new_term'):
+            cursor.execute('DROP TABLE temp.{}'.format(temp_table))
+        cursor.execute('DETACH DATABASE shard')
+        connection.close()
+    except Exception:
+        # never give back to pool a connection with shard attached and temporary tables left
+        connection.invalidate()
+        raise
+    logger.info('Merged shard %s: %s', shard_file, stats)
+    return stats
+
+
+def merge_shards(target_engine, shard_files):
+    """
+    Merge shards into target database, attached to target when it is a SQLite database too.
+    :return: dict number of rows inserted per table
+    """
+    totals = {}
+    for shard_file in shard_files:
+        if target_engine.dialect.name == 'sqlite':
+            stats = merge_attached(target_engine, shard_file)
+        else:
+            stats = merge_database('sqlite:///' + shard_file, target_engine)
+        for table, count in stats.items():
+            totals[table] = totals.get(table, 0) + count
+    return totals
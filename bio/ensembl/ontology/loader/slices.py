@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import datetime
+import glob
+import json
+import logging
+import math
+import os
+from os.path import join
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['SliceMetrics', 'SliceCheckpoint', 'plan_slices', 'metrics_file_name', 'checkpoint_file_name']
+
+
+def metrics_file_name(ontology_name, start=0, end=0):
+    return '.'.join([ontology_name.lower(), 'metrics', str(start), str(end), 'json'])
+
+
+def checkpoint_file_name(ontology_name, start=0, end=0):
+    return '.'.join([ontology_name.lower(), 'checkpoint', str(start), str(end), 'json'])
+
+
+def _write_json(file_name, content):
+    # write then rename, a worker killed while writing never leaves a truncated file behind
+    with open(file_name + '.tmp', 'w') as f:
+        json.dump(content, f)
+    os.replace(file_name + '.tmp', file_name)
+
+
+class SliceMetrics:
+    """ Per slice load metrics, one json file per slice under a metrics directory.
+
+    One file per slice keeps concurrent hive workers from ever writing to the same file.
+    """
+
+    def __init__(self, metrics_dir):
+        self.metrics_dir = metrics_dir
+
+    def record(self, ontology_name, start, end, nb_terms, duration):
+        """
+        Store metrics for a loaded slice, replacing any previous record for the same range.
+        :param ontology_name: ontology short name
+        :param start: first term index of the slice
+        :param end: last term index of the slice (inclusive)
+        :param nb_terms: number of terms actually loaded
+        :param duration: slice load time in seconds
+        :return: the recorded metrics
+        """
+        metrics = {
+            'ontology': ontology_name.upper(),
+            'start': start,
+            'end': end,
+            'terms': nb_terms,
+            'seconds': duration,
+            'recorded': datetime.datetime.now().isoformat()
+        }
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        _write_json(join(self.metrics_dir, metrics_file_name(ontology_name, start, end)), metrics)
+        logger.debug('Recorded slice metrics %s', metrics)
+        return metrics
+
+    def history(self, ontology_name):
+        """
+        Load all recorded slice metrics for an ontology
+        :param ontology_name: ontology short name
+        :return: list of metrics dict
+        """
+        history = []
+        for file_name in glob.glob(join(self.metrics_dir, metrics_file_name(ontology_name, '*', '*'))):
+            try:
+                with open(file_name) as f:
+                    history.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning('Unable to read slice metrics %s: %s', file_name, e)
+        return history
+
+
+class SliceCheckpoint:
+    """ Journal of the last committed term of a slice, allowing a failed slice job to resume where it stopped. """
+
+    def __init__(self, checkpoint_dir, ontology_name, start, end):
+        self.file_name = join(checkpoint_dir, checkpoint_file_name(ontology_name, start, end))
+
+    def save(self, offset, page=None):
+        """
+        Record last committed term index
+        :param offset: index of the last committed term
+        :param page: OLS terms page holding this term
+        """
+        _write_json(self.file_name, {
+            'offset': offset,
+            'page': page,
+            'updated': datetime.datetime.now().isoformat()
+        })
+
+    def load(self):
+        """
+        :return: recorded checkpoint dict, None if slice has no checkpoint
+        """
+        try:
+            with open(self.file_name) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning('Ignoring unreadable checkpoint %s: %s', self.file_name, e)
+            return None
+
+    def resume_index(self):
+        """
+        :return: index of the first term to load, None if nothing has been committed yet
+        """
+        checkpoint = self.load()
+        return checkpoint['offset'] + 1 if checkpoint else None
+
+    def clear(self):
+        try:
+            os.remove(self.file_name)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def clear_all(checkpoint_dir, ontology_name):
+        """
+        Remove all slices checkpoints of an ontology, i.e. when it is wiped, terms are then loaded from scratch
+        :return: number of removed checkpoints
+        """
+        file_names = glob.glob(join(checkpoint_dir, checkpoint_file_name(ontology_name, '*', '*')))
+        for file_name in file_names:
+            try:
+                os.remove(file_name)
+            except FileNotFoundError:
+                pass
+        return len(file_names)
+
+
+def _cost_segments(nb_terms, history):
+    """ Split [0, nb_terms) into segments with a constant estimated cost per term.
+
+    Each past slice gives a cost per term (seconds / terms) over its range, overlapping records are averaged,
+    ranges never measured get the mean cost of all measured ones.
+    """
+    rates = []
+    for metrics in history:
+        start, end = int(metrics['start']), min(int(metrics['end']), nb_terms - 1)
+        if end < start or metrics.get('seconds') is None:
+            continue
+        rates.append((start, end + 1, float(metrics['seconds']) / (end - start + 1)))
+    default_rate = sum(rate for _, _, rate in rates) / len(rates) if rates else 1.0
+    bounds = sorted({0, nb_terms}.union(*[{start, end} for start, end, _ in rates]))
+    segments = []
+    for low, high in zip(bounds, bounds[1:]):
+        covering = [rate for start, end, rate in rates if start <= low and high <= end]
+        rate = sum(covering) / len(covering) if covering else default_rate
+        # a zero duration would make a whole range free, keep a floor so every term costs something
+        segments.append((low, high, max(rate, default_rate * 0.01, 1e-6)))
+    return segments
+
+
+def plan_slices(nb_terms, slice_size=None, nb_slices=None, history=None):
+    """
+    Compute terms slices of roughly equal expected load time.
+    :param nb_terms: number of terms in ontology
+    :param slice_size: expected average number of terms per slice, used when nb_slices is not set
+    :param nb_slices: number of slices to create
+    :param history: previous slices metrics (see SliceMetrics.history), uniform cost per term when empty
+    :return: list of (start, end) slices, end inclusive
+    """
+    if nb_terms <= 0:
+        return []
+    if not nb_slices:
+        if not slice_size:
+            raise ValueError('Either slice_size or nb_slices must be set')
+        nb_slices = int(math.ceil(nb_terms / slice_size))
+    nb_slices = max(1, min(nb_slices, nb_terms))
+    segments = _cost_segments(nb_terms, history or [])
+    total_cost = sum((high - low) * rate for low, high, rate in segments)
+    target = total_cost / nb_slices
+    slices = []
+    start = 0
+    accumulated = 0.0
+    for low, high, rate in segments:
+        position = low
+        while position < high and len(slices) < nb_slices - 1:
+            # number of terms from this segment needed to reach the target cost
+            needed = int(math.ceil((target - accumulated) / rate))
+            if position + needed > high:
+                break
+            position += max(needed, 1)
+            slices.append((start, position - 1))
+            start = position
+            accumulated = 0.0
+        accumulated += (high - position) * rate
+    slices.append((start, nb_terms - 1))
+    return [(low, high) for low, high in slices if high >= low]
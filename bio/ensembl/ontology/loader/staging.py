@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+
+from sqlalchemy import event, inspect
+
+from .models import Synonym, AltId
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['StagingBuffer']
+
+
+class StagingBuffer:
+    """ Synonyms and alt ids staged as records in a session, per term.
+
+    Records are buffered instead of Synonym / AltId instances, and inserted in bulk Core statements right before
+    the session commits (or when the relations queue is resolved), with ids reserved from the session id allocator
+    when there is one.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.synonyms = []
+        self.alt_ids = []
+        event.listen(session, 'before_commit', self._before_commit)
+        event.listen(session, 'after_rollback', self._after_rollback)
+
+    @classmethod
+    def for_session(cls, session):
+        """ Buffer bound to session, created on first call """
+        if 'staging_buffer' not in session.info:
+            session.info['staging_buffer'] = cls(session)
+        return session.info['staging_buffer']
+
+    def __len__(self):
+        return len(self.synonyms) + len(self.alt_ids)
+
+    def add_synonyms(self, m_term, records):
+        """ Stage term synonyms, list of SynonymRecord """
+        self.synonyms.extend((m_term, record) for record in records)
+
+    def add_alt_ids(self, m_term, records):
+        """ Stage term alt ids, list of AltIdRecord """
+        self.alt_ids.extend((m_term, record) for record in records)
+
+    def _insert(self, table, values):
+        if values:
+            if 'id_allocator' in self.session.info:
+                self.session.info['id_allocator'].assign(table, values, self.session)
+            self.session.execute(table.insert(), values)
+
+    def flush(self):
+        """
+        Insert staged synonyms and alt ids
+        :return: number of rows inserted
+        """
+        if not len(self):
+            return 0
+        # staged terms need their ids
+        self.session.flush()
+        synonyms = [dict(term_id=m_term.term_id, name=record.name, type=record.type, dbxref=record.db_xref)
+                    for m_term, record in self.synonyms]
+        alt_ids = [dict(term_id=m_term.term_id, accession=record.accession) for m_term, record in self.alt_ids]
+        self._insert(Synonym.__table__, synonyms)
+        self._insert(AltId.__table__, alt_ids)
+        logger.debug('Inserted %s synonyms, %s alt ids', len(synonyms), len(alt_ids))
+        # collections already loaded in session do not see rows inserted above
+        for m_term, record in self.synonyms:
+            self.session.expire(m_term, ['synonyms'])
+        for m_term, record in self.alt_ids:
+            self.session.expire(m_term, ['alt_ids'])
+        self.synonyms = []
+        self.alt_ids = []
+        return len(synonyms) + len(alt_ids)
+
+    def _before_commit(self, session):
+        self.flush()
+
+    def _after_rollback(self, session):
+        # get_one_or_create rolls back on integrity errors and nothing loads the terms again: rows staged for
+        # committed terms are kept and inserted on next flush, only rows of rolled back terms are forgotten
+        self.synonyms = [(m_term, record) for m_term, record in self.synonyms if inspect(m_term).persistent]
+        self.alt_ids = [(m_term, record) for m_term, record in self.alt_ids if inspect(m_term).persistent]
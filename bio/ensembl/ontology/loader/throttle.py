@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import contextlib
+import fcntl
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+import requests
+from coreapi.exceptions import NetworkError
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['RateLimiter']
+
+
+def _status_code(error):
+    """ Retrieve HTTP status from any error raised while calling OLS, None if unknown """
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None:
+        # coreapi ErrorMessage holds a document titled with the HTTP status line
+        match = re.match(r'^(\d{3})\b', str(getattr(getattr(error, 'error', None), 'title', '')))
+        status = int(match.group(1)) if match else None
+    return status
+
+
+def is_throttled(error):
+    status = _status_code(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def is_retryable(error):
+    # ols-client ObjectNotRetrievedError is not retried: raised once its own retries are exhausted, without status
+    return is_throttled(error) or isinstance(error, (NetworkError,
+                                                     ConnectionError,
+                                                     TimeoutError,
+                                                     requests.exceptions.ConnectionError,
+                                                     requests.exceptions.Timeout))
+
+
+class RateLimiter:
+    """ Token bucket limiting OLS requests rate, with rate adapted by AIMD.
+
+    Rate is increased additively while OLS answers quickly, halved as soon as OLS throttles (429), fails (5xx) or
+    answers slower than `latency_target`. When `state_file` is set, bucket state is kept in this file under an
+    exclusive lock, so that all processes using the same file share the same request rate.
+    """
+
+    def __init__(self, state_file=None, rate=10.0, min_rate=0.5, max_rate=100.0, burst=None, increase=0.5,
+                 decrease=0.5, latency_target=5.0, max_retry=5, timeout=720, backoff=1.0):
+        self.state_file = state_file
+        self.initial_rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.max_retry = max_retry
+        self.timeout = timeout
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._state = None
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        """ Yield bucket state dict, saved back on exit """
+        with self._lock:
+            if self.state_file is None:
+                if self._state is None:
+                    self._state = self._initial_state()
+                yield self._state
+                return
+            with open(self.state_file, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read())
+                    except ValueError:
+                        state = self._initial_state()
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _initial_state(self):
+        return {'rate': self.initial_rate, 'tokens': 1.0, 'updated': time.time()}
+
+    def _capacity(self, rate):
+        return self.burst or max(1.0, rate)
+
+    @property
+    def rate(self):
+        with self._locked_state() as state:
+            return state['rate']
+
+    def acquire(self):
+        """ Wait until a request is allowed """
+        while True:
+            with self._locked_state() as state:
+                now = time.time()
+                state['tokens'] = min(self._capacity(state['rate']),
+                                      state['tokens'] + (now - state['updated']) * state['rate'])
+                state['updated'] = now
+                if state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    return
+                wait = (1 - state['tokens']) / state['rate']
+            time.sleep(wait)
+
+    def record(self, latency=None, error=None):
+        """
+        Adapt rate according to a request outcome
+        :param latency: request duration in seconds
+        :param error: error raised by request if any
+        """
+        with self._locked_state() as state:
+            if (error is not None and is_throttled(error)) or (latency is not None and latency > self.latency_target):
+                state['rate'] = max(self.min_rate, state['rate'] * self.decrease)
+                logger.info('OLS throttling, request rate decreased to %.2f/s', state['rate'])
+            elif error is None:
+                state['rate'] = min(self.max_rate, state['rate'] + self.increase)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func once allowed by rate limiter, retrying transient errors up to max_retry times with jittered
+        exponential backoff.
+        :return: func result
+        """
+        attempt = 0
+        first_call = time.time()
+        while True:
+            self.acquire()
+            call_start = time.time()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.record(time.time() - call_start, e)
+                attempt += 1
+                if not is_retryable(e) or attempt > self.max_retry or time.time() - first_call > self.timeout:
+                    raise
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                logger.warning('OLS call failed (%s), retry %s/%s in %.1fs', e, attempt, self.max_retry, delay)
+                time.sleep(delay)
+            else:
+                self.record(time.time() - call_start)
+                return result
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+from os.path import expanduser
+
+from sqlalchemy.engine.url import make_url
+
+from bio.ensembl.ontology.loader.db import dal
+from bio.ensembl.ontology.loader.export import export_tables, exported_tables, export_formats
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+
+logger = logging.getLogger(__name__)
+
+
+def mysqldump(db_url, tables, file_name):
+    """ Baseline: time a plain mysqldump of the same tables """
+    url = make_url(db_url)
+    command = ['mysqldump', '--quick', '--single-transaction', '-h', url.host or 'localhost',
+               '-P', str(url.port or 3306), '-u', url.username]
+    if url.password:
+        command.append('-p' + url.password)
+    command += [url.database] + list(tables)
+    start = time.perf_counter()
+    with open(file_name, 'wb') as f:
+        subprocess.run(command, stdout=f, check=True)
+    return time.perf_counter() - start, os.path.getsize(file_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export ontology tables into Parquet / Arrow files')
+    parser.add_argument('-v', '--verbose', help='Verbose output', action='store_true')
+    parser.add_argument('-e', '--release', type=int, required=True, help='Release number')
+    parser.add_argument('-u', '--host_url', type=str, required=False,
+                        help='Db Host Url format engine:///user:pass@host:port')
+    parser.add_argument('-o', '--ontology', type=str, required=False, help='Ontologies short names, comma separated')
+    parser.add_argument('-t', '--tables', type=str, required=False, default=','.join(exported_tables),
+                        help='Tables to export, comma separated')
+    parser.add_argument('-f', '--format', type=str, required=False, default='parquet',
+                        choices=list(export_formats), help='Export files format')
+    parser.add_argument('-c', '--chunk_size', type=int, required=False, default=10000,
+                        help='Rows fetched and written at once')
+    parser.add_argument('-d', '--output_dir', type=str, required=False, default='.', help='Export directory')
+    parser.add_argument('--mysqldump', action='store_true', help='Compare with a mysqldump of the same tables')
+
+    args = parser.parse_args(sys.argv[1:])
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    db_name = 'ensembl_ontology_{}'.format(args.release)
+    if args.host_url is None:
+        db_url = 'sqlite:///' + expanduser("~") + '/' + db_name + '.sqlite'
+    else:
+        db_url = '{}{}'.format(args.host_url, db_name)
+    logger.debug('Db Url set to %s', db_url)
+    dal.db_init(db_url)
+    tables = args.tables.split(',')
+    ontologies = args.ontology.upper().split(',') if args.ontology else None
+    output_dir = os.path.join(args.output_dir, db_name)
+    start = time.perf_counter()
+    stats = export_tables(dal.engine, output_dir, tables, ontologies, args.format, args.chunk_size)
+    seconds = time.perf_counter() - start
+    print('{:<15}{:>12}{:>8}{:>14}{:>10}{:>12}'.format('Table', 'Rows', 'Files', 'Bytes', 'Seconds', 'Rows/s'))
+    for table_name, table_stats in stats.items():
+        print('{:<15}{:>12}{:>8}{:>14}{:>10.2f}{:>12.0f}'.format(
+            table_name, table_stats['rows'], table_stats['files'], table_stats['bytes'], table_stats['seconds'],
+            table_stats['rows'] / table_stats['seconds'] if table_stats['seconds'] else 0))
+    nb_rows = sum(table_stats['rows'] for table_stats in stats.values())
+    nb_bytes = sum(table_stats['bytes'] for table_stats in stats.values())
+    print('{:<15}{:>12}{:>8}{:>14}{:>10.2f}{:>12.0f}'.format('Total', nb_rows, '', nb_bytes, seconds, nb_rows / seconds))
+    if args.mysqldump:
+        if not db_url.startswith('mysql'):
+            logger.warning('mysqldump baseline needs a MySQL database')
+        elif ontologies:
+            logger.warning('mysqldump baseline dumps whole tables, run it without --ontology')
+        else:
+            dump_seconds, dump_bytes = mysqldump(db_url, tables, os.path.join(output_dir, db_name + '.sql'))
+            print('{:<15}{:>12}{:>8}{:>14}{:>10.2f}{:>12.0f}'.format('mysqldump', nb_rows, 1, dump_bytes,
+                                                                   dump_seconds, nb_rows / dump_seconds))
+            logger.info('Columnar export %.1fx mysqldump speed, %.1f%% of its size', dump_seconds / seconds,
+                        100.0 * nb_bytes / dump_bytes)
+    logger.info('...Done')
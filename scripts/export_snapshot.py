@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from os.path import expanduser
+
+from bio.ensembl.ontology.loader.binary import write_snapshot, SnapshotReader
+from bio.ensembl.ontology.loader.db import dal
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export loaded ontologies into binary snapshots')
+    parser.add_argument('-v', '--verbose', help='Verbose output', action='store_true')
+    parser.add_argument('-e', '--release', type=int, required=True, help='Release number')
+    parser.add_argument('-u', '--host_url', type=str, required=False,
+                        help='Db Host Url format engine:///user:pass@host:port')
+    parser.add_argument('-o', '--ontology', type=str, required=True, help='Ontologies short names, comma separated')
+    parser.add_argument('-d', '--output_dir', type=str, required=False, default='.', help='Snapshots directory')
+
+    args = parser.parse_args(sys.argv[1:])
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    db_name = 'ensembl_ontology_{}'.format(args.release)
+    if args.host_url is None:
+        db_url = 'sqlite:///' + expanduser("~") + '/' + db_name + '.sqlite'
+    else:
+        db_url = '{}{}'.format(args.host_url, db_name)
+    logger.debug('Db Url set to %s', db_url)
+    dal.db_init(db_url)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for ontology_name in args.ontology.upper().split(','):
+        file_name = os.path.join(args.output_dir, '{}_{}.olsnap'.format(ontology_name.lower(), args.release))
+        start = time.perf_counter()
+        with dal.session_scope() as session:
+            write_snapshot(session, ontology_name, file_name)
+        exported = time.perf_counter()
+        with SnapshotReader(file_name) as reader:
+            logger.info('%s: exported in %.2fs, %s terms opened in %.2fms', ontology_name, exported - start,
+                        len(reader), (time.perf_counter() - exported) * 1000)
+    logger.info('...Done')
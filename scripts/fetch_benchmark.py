@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from ebi.ols.api.client import OlsClient
+
+from bio.ensembl.ontology.loader.fetch import OlsFetcher
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+
+logger = logging.getLogger(__name__)
+
+# attributes read by the loader on each term
+attributes = ('accession', 'name', 'description', 'namespace', 'subsets', 'is_obsolete', 'is_root', 'iri',
+              'obo_synonym', 'synonyms', 'relations_types')
+
+
+def consume(terms, relation=None):
+    """ Read terms as the loader does, optionally loading one relation per term """
+    nb_terms = 0
+    for term in terms:
+        for attribute in attributes:
+            getattr(term, attribute)
+        term.annotation.has_alternative_id
+        if relation and relation in term.relations_types:
+            term.load_relation(relation)
+        nb_terms += 1
+    return nb_terms
+
+
+def timed(name, function):
+    start, cpu_start = time.perf_counter(), time.process_time()
+    nb_terms = function()
+    seconds, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    print('{:<10}{:>8}{:>10.2f}{:>10.2f}{:>14.3f}{:>10.1f}'.format(name, nb_terms, seconds, cpu,
+                                                                   cpu * 1000 / (nb_terms or 1),
+                                                                   nb_terms / (seconds or 1)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare ols-client and fast fetcher on an ontology terms pages')
+    parser.add_argument('-o', '--ontology', type=str, required=False, default='go', help='Ontology short name')
+    parser.add_argument('-n', '--terms', type=int, required=False, default=2000, help='Number of terms read')
+    parser.add_argument('-p', '--page_size', type=int, required=False, default=500, help='Terms per page')
+    parser.add_argument('-r', '--relation', type=str, required=False, help='Also load this relation per term')
+    parser.add_argument('-u', '--ols_api_url', type=str, required=False, help='OLS API base url')
+
+    args = parser.parse_args(sys.argv[1:])
+    client = OlsClient(page_size=args.page_size, base_site=args.ols_api_url)
+    fetcher = OlsFetcher(args.ols_api_url, page_size=args.page_size)
+    print('{:<10}{:>8}{:>10}{:>10}{:>14}{:>10}'.format('Path', 'Terms', 'Seconds', 'CPU', 'CPU ms/term', 'Terms/s'))
+    timed('ols-client', lambda: consume(client.ontology(identifier=args.ontology).terms()[0:args.terms],
+                                        args.relation))
+    timed('fetcher', lambda: consume(fetcher.terms(args.ontology, 0, args.terms - 1), args.relation))
+    logger.info('Fetcher requests: %s', fetcher.requests)
+    fetcher.close()
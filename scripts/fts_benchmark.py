@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import argparse
+import logging
+import random
+import sys
+from os.path import expanduser
+
+from bio.ensembl.ontology.loader.db import dal
+from bio.ensembl.ontology.loader.fts import build_fts, search_benchmark
+from bio.ensembl.ontology.loader.models import Term
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare SQLite full text search with LIKE scans')
+    parser.add_argument('-e', '--release', type=int, required=True, help='Release number')
+    parser.add_argument('-f', '--file', type=str, required=False, help='SQLite file, loader.py one if not set')
+    parser.add_argument('-n', '--queries', type=int, required=False, default=200, help='Number of queries')
+    parser.add_argument('-l', '--limit', type=int, required=False, default=20, help='Results per query')
+
+    args = parser.parse_args(sys.argv[1:])
+    db_file = args.file or expanduser("~") + '/ensembl_ontology_{}.sqlite'.format(args.release)
+    dal.db_init('sqlite:///' + db_file)
+    build_fts(dal.engine)
+    with dal.session_scope() as session:
+        # queries made of words taken from random term names, complete or truncated as typed
+        names = [name for name, in session.query(Term.name).order_by(Term.term_id).limit(100000) if name]
+        random.seed(args.queries)
+        queries = []
+        for name in random.sample(names, min(args.queries, len(names))):
+            words = name.split()
+            word = random.choice(words)
+            queries.append(word if len(word) < 5 else word[:random.randint(4, len(word))])
+        results = search_benchmark(session, queries, args.limit)
+    print('{:<8}{:>10}{:>10}{:>12}{:>12}{:>12}'.format('Method', 'Queries', 'Hits', 'p50 (ms)', 'p99 (ms)',
+                                                     'Total (ms)'))
+    for method, stats in results.items():
+        print('{:<8}{:>10}{:>10}{:>12.2f}{:>12.2f}{:>12.1f}'.format(method, stats['queries'], stats['hits'],
+                                                                  stats['p50'], stats['p99'], stats['total']))
@@ -21,7 +21,7 @@ import sys
 from os.path import expanduser
 
 from bio.ensembl.ontology.loader.db import dal
-from bio.ensembl.ontology.loader.models import Ontology, Term, Relation, RelationType, get_one_or_create
+from bio.ensembl.ontology.loader.phibase import wipe_identifiers, load_identifiers
 
 # allow ols.py to be run from any path
 os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
@@ -40,6 +40,8 @@ if __name__ == "__main__":
     parser.add_argument('-e', '--release', type=int, required=True, help='Release number')
     parser.add_argument('-u', '--host_url', type=str, required=False,
                         help='Db Host Url format engine:///user:pass@host:port')
+    parser.add_argument('-m', '--max_identifier', type=int, required=False, default=9999,
+                        help='Last PHI-base identifier to generate')
 
     args = parser.parse_args(sys.argv[1:])
     logger.setLevel(
@@ -59,40 +61,9 @@ if __name__ == "__main__":
         logging.info('Process cancelled')
         exit(0)
     dal.db_init(db_url)
+    dal.create_schema()
     with dal.session_scope() as session:
-        ontologies = session.query(Ontology).filter_by(name='phi', namespace='phibase_identifier').all()
-        for ontology in ontologies:
-            logger.info('Deleting namespaced ontology %s - %s', ontology.name, ontology.namespace)
-            rel = session.query(Relation).filter_by(ontology=ontology).delete()
-            res = session.query(Term).filter_by(ontology=ontology).delete()
-            logger.info('Wiped %s Terms', res)
-            logger.debug('...Done')
-        m_ontology, created = get_one_or_create(Ontology, session,
-                                                name='phi',
-                                                namespace='phibase_identifier',
-                                                create_method_kwargs=dict(
-                                                    version='1.0',
-                                                    title='PHIBase identifier')
-                                                )
-        relation_type, created = get_one_or_create(RelationType,
-                                                   session,
-                                                   name='is_a')
-        for i in range(10000):
-            accession = 'PHI:{}'.format(i)
-            term = Term(accession=accession, name='{}' % i)
-            if i == 0:
-                term.name = 'phibase identifier'
-                term.is_root = 1
-
-            logger.debug('Adding Term %s', accession)
-            session.add(term)
-            m_ontology.terms.append(term)
-            if i != 0:
-                term.add_parent_relation(m_related, relation_type, session)
-            else:
-                m_related = term
-            if i % 100 == 0:
-                logger.info('Committing transaction')
-                session.commit()
+        wipe_identifiers(session)
+        load_identifiers(session, 0, args.max_identifier)
 
     logger.info('...Done')
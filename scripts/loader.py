@@ -17,10 +17,15 @@ import argparse
 import logging
 import os
 import sys
-from os.path import expanduser
+import time
+from os.path import expanduser, join
 
 from bio.ensembl.ontology.loader.db import dal
+from bio.ensembl.ontology.loader.fts import build_fts
 from bio.ensembl.ontology.loader.ols import OlsLoader
+from bio.ensembl.ontology.loader.parallel import load_parallel
+from bio.ensembl.ontology.loader.shards import load_shards, merge_shards
+from bio.ensembl.ontology.loader.slices import plan_slices
 
 # allow ols.py to be run from any path
 os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
@@ -43,15 +48,36 @@ def rreplace(s, old, new, occurrence):
     return new.join(li)
 
 
+def post_load(arguments):
+    if arguments.fts:
+        build_fts(dal.engine)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Produce a release calendar')
     parser.add_argument('-v', '--verbose', help='Verbose output', action='store_true')
-    parser.add_argument('-o', '--ontology', help='Ontology short name', required=True, dest='ontology', default='all')
+    parser.add_argument('-o', '--ontology', help='Ontology short name, comma separated list or all',
+                        required=False, dest='ontology', default='all')
     parser.add_argument('-e', '--release', type=int, required=True, help='Release number')
     parser.add_argument('-k', '--keep', required=False, default=False, help='Keep database', action='store_true')
-    parser.add_argument('-u', '--host_url', type=str, required=True,
-                        help='Db Host Url format engine:///user:pass@host:port')
+    parser.add_argument('-u', '--host_url', type=str, required=False,
+                        help='Db Host Url format engine:///user:pass@host:port, SQLite file in home dir if not set')
     parser.add_argument('-s', '--slice', help='Only load a slice of data format START-STOP', required=False)
+    parser.add_argument('--shards', type=int, required=False, default=0,
+                        help='Load ontologies (comma separated list) in this number of processes, each one into its '
+                             'own SQLite shard, then merge shards into target db')
+    parser.add_argument('--shard_size', type=int, required=False,
+                        help='Max number of terms per shard, one shard per ontology if not set')
+    parser.add_argument('-w', '--workers', type=int, required=False, default=0,
+                        help='Load ontologies terms slices in this number of processes')
+    parser.add_argument('--slice_size', type=int, required=False, default=500,
+                        help='Average number of terms per slice loaded by workers')
+    parser.add_argument('--fast_fetch', required=False, default=False, action='store_true',
+                        help='Read OLS terms pages as raw JSON records instead of ols-client documents')
+    parser.add_argument('--fts', required=False, default=False, action='store_true',
+                        help='Build / refresh SQLite full text search index once loaded')
+    parser.add_argument('-y', '--yes', required=False, default=False, help='Do not ask for confirmation',
+                        action='store_true')
 
     arguments = parser.parse_args(sys.argv[1:])
     logger.setLevel(logging.INFO)
@@ -59,7 +85,8 @@ if __name__ == "__main__":
     logger.info('Script arguments: {}'.format(arguments))
     args = vars(parser.parse_args())
     db_name = 'ensembl_ontology_{}'.format(arguments.release)
-    options = {'drop': not arguments.keep, 'echo': arguments.verbose, 'db_version': arguments.release}
+    options = {'drop': not arguments.keep, 'echo': arguments.verbose, 'db_version': arguments.release,
+               'fast_fetch': arguments.fast_fetch}
     if arguments.host_url is None:
         db_url = 'sqlite:///' + expanduser("~") + '/' + db_name + '.sqlite'
         options.update({'pool_size': None})
@@ -73,13 +100,65 @@ if __name__ == "__main__":
     logger.info('Loader arguments: {} {}'.format(db_url, options))
     logger.info('Slices: {}'.format(slices))
 
-    response = input("Confirm to proceed (y/N)? ")
+    response = 'Y' if arguments.yes else input("Confirm to proceed (y/N)? ")
 
     if response.upper() != 'Y':
         logger.info('Process cancelled')
         exit(0)
 
     loader = OlsLoader(db_url, **options)
+    if arguments.ontology == 'all':
+        ontologies = list(loader.allowed_ontologies)
+    else:
+        ontologies = arguments.ontology.split(',')
+
+    if arguments.host_url is None and not arguments.shards and (arguments.workers or len(ontologies) > 1):
+        # SQLite allows a single writer, concurrent workers load their own shard instead
+        arguments.shards = arguments.workers or os.cpu_count()
+        logger.info('SQLite target db, loading %s in %s shards processes', ontologies, arguments.shards)
+
+    if not arguments.shards and (arguments.workers or len(ontologies) > 1):
+        start_time = time.time()
+        results = load_parallel(loader, ontologies, workers=arguments.workers or None,
+                                slice_size=arguments.slice_size, wipe=not arguments.keep)
+        duration = time.time() - start_time
+        print('{:<10} {:>8} {:>10} {:>10} {:>10}'.format('Ontology', 'Slices', 'Terms', 'Seconds', 'Terms/s'))
+        for ontology_name in ontologies:
+            ontology_results = [result for result in results if result['ontology'] == ontology_name.upper()]
+            nb_terms = sum(result['terms'] for result in ontology_results)
+            seconds = sum(result['seconds'] for result in ontology_results)
+            print('{:<10} {:>8} {:>10} {:>10.1f} {:>10.1f}'.format(ontology_name.upper(), len(ontology_results),
+                                                                   nb_terms, seconds, nb_terms / (seconds or 1)))
+        nb_terms = sum(result['terms'] for result in results)
+        print('{:<10} {:>8} {:>10} {:>10.1f} {:>10.1f}'.format('Total', len(results), nb_terms, duration,
+                                                               nb_terms / (duration or 1)))
+        post_load(arguments)
+        logger.info('...Done')
+        exit(0)
+
+    if arguments.shards:
+        shard_dir = join(expanduser("~"), db_name + '_shards')
+        jobs = []
+        for ontology_name in ontologies:
+            if not arguments.keep:
+                loader.wipe_ontology(ontology_name=ontology_name)
+            if arguments.shard_size:
+                nb_terms = loader.ontology_helper(ontology_name).number_of_terms
+                jobs.extend((ontology_name, start, end) for start, end in plan_slices(nb_terms, arguments.shard_size))
+            else:
+                jobs.append((ontology_name, None, None))
+        logger.info('Loading %s shards in %s processes', len(jobs), arguments.shards)
+        start_time = time.time()
+        results = load_shards(shard_dir, jobs, workers=arguments.shards, **options)
+        load_time = time.time() - start_time
+        stats = merge_shards(dal.engine, [shard_file for shard_file, nb_terms, duration in results])
+        for shard_file, nb_terms, duration in results:
+            os.remove(shard_file)
+        logger.info('Loaded %s terms in %.1fs, merged %s in %.1fs', sum(result[1] for result in results),
+                    load_time, stats, time.time() - start_time - load_time)
+        post_load(arguments)
+        logger.info('...Done')
+        exit(0)
 
     if not arguments.keep:
         logger.info('Wiping %s ontology', arguments.ontology)
@@ -91,4 +170,5 @@ if __name__ == "__main__":
             n_terms, n_ignored = loader.load_ontology_terms(arguments.ontology, int(slices[0]), int(slices[1]))
         else:
             n_terms, n_ignored = loader.load_ontology_terms(arguments.ontology)
+    post_load(arguments)
     logger.info('...Done')
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import argparse
+import sys
+
+from bio.ensembl.ontology.loader.models import Ontology, Term, Synonym, AltId, Relation, RelationType
+from bio.ensembl.ontology.loader.records import TermRecord, SynonymRecord, AltIdRecord, EdgeRecord, \
+    memory_per_record
+
+
+def term_json(i):
+    """ Decoded OLS term document, as kept by ols-client helpers """
+    return {
+        'iri': 'http://purl.obolibrary.org/obo/GO_%07d' % i,
+        'label': 'term %s' % i,
+        'description': ['definition of term %s' % i],
+        'annotation': {'has_obo_namespace': ['biological_process']},
+        'synonyms': ['synonym %s' % i],
+        'ontology_name': 'go',
+        'ontology_prefix': 'GO',
+        'is_obsolete': False,
+        'is_defining_ontology': True,
+        'is_root': False,
+        'short_form': 'GO_%07d' % i,
+        'obo_id': 'GO:%07d' % i,
+        '_links': {'parents': {'href': 'http://www.ebi.ac.uk/ols/api/ontologies/go/parents/%s' % i}}
+    }
+
+
+# relations reference models already in session, built once outside measures
+ontology = Ontology(name='GO', namespace='biological_process', version='1', title='Gene Ontology')
+is_a = RelationType(name='is_a')
+terms = []
+
+
+# staged representations compared per item, values of each pair built the same way
+representations = [
+    ('term', 'json dict', term_json),
+    ('term', 'TermRecord', lambda i: TermRecord.from_json(term_json(i))),
+    ('term', 'Term model', lambda i: Term(accession='GO:%07d' % i, name='term %s' % i,
+                                          description='definition of term %s' % i, iri='GO_%07d' % i,
+                                          is_root=False, is_obsolete=False)),
+    ('synonym', 'dict', lambda i: {'name': 'synonym %s' % i, 'type': 'EXACT', 'db_xref': None}),
+    ('synonym', 'SynonymRecord', lambda i: SynonymRecord('synonym %s' % i, 'EXACT')),
+    ('synonym', 'Synonym model', lambda i: Synonym(name='synonym %s' % i, type='EXACT')),
+    ('alt_id', 'AltIdRecord', lambda i: AltIdRecord('GO:%07d' % i)),
+    ('alt_id', 'AltId model', lambda i: AltId(accession='GO:%07d' % i)),
+    ('edge', 'tuple', lambda i: (terms[i], terms[i + 1], is_a, ontology)),
+    ('edge', 'EdgeRecord', lambda i: EdgeRecord(terms[i], terms[i + 1], is_a, ontology)),
+    ('edge', 'Relation model', lambda i: Relation(child_term=terms[i], parent_term=terms[i + 1], relation_type=is_a,
+                                                  ontology=ontology)),
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Memory held per staged item by loader records and ORM instances')
+    parser.add_argument('-n', '--count', type=int, required=False, default=20000, help='Items built per measure')
+
+    args = parser.parse_args(sys.argv[1:])
+    terms.extend(Term(accession='GO:%07d' % i, name='term %s' % i, ontology_id=1) for i in range(args.count + 1))
+    print('{:<10}{:<16}{:>14}'.format('Item', 'Representation', 'Bytes/item'))
+    for item, name, factory in representations:
+        print('{:<10}{:<16}{:>14.1f}'.format(item, name, memory_per_record(factory, args.count)))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import argparse
+import logging
+import sys
+import time
+from os.path import expanduser
+
+import sqlalchemy
+
+from bio.ensembl.ontology.loader.diff import diff_databases, write_feed
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+
+logger = logging.getLogger(__name__)
+
+
+def db_url(host_url, release):
+    db_name = 'ensembl_ontology_{}'.format(release)
+    if host_url is None:
+        return 'sqlite:///' + expanduser("~") + '/' + db_name + '.sqlite'
+    return '{}{}'.format(host_url, db_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Diff two ontology releases databases into a JSON lines change feed')
+    parser.add_argument('-v', '--verbose', help='Verbose output', action='store_true')
+    parser.add_argument('-e', '--release', type=int, required=True, help='New release number')
+    parser.add_argument('-p', '--previous', type=int, required=False,
+                        help='Previous release number, defaults to release - 1')
+    parser.add_argument('-u', '--host_url', type=str, required=False,
+                        help='Db Host Url format engine:///user:pass@host:port')
+    parser.add_argument('--previous_host_url', type=str, required=False,
+                        help='Previous release Db Host Url, defaults to host_url')
+    parser.add_argument('-o', '--ontology', type=str, required=False, help='Ontologies short names, comma separated')
+    parser.add_argument('-c', '--chunk_size', type=int, required=False, default=10000,
+                        help='Rows fetched at once per stream')
+    parser.add_argument('-f', '--feed', type=str, required=False, help='Change feed file')
+
+    args = parser.parse_args(sys.argv[1:])
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    previous = args.previous or args.release - 1
+    old_url = db_url(args.previous_host_url or args.host_url, previous)
+    new_url = db_url(args.host_url, args.release)
+    logger.debug('Diff %s => %s', old_url, new_url)
+    feed = args.feed or 'ontology_changes_{}_{}.jsonl'.format(previous, args.release)
+    ontologies = args.ontology.upper().split(',') if args.ontology else None
+    start = time.perf_counter()
+    summary = write_feed(diff_databases(sqlalchemy.create_engine(old_url), sqlalchemy.create_engine(new_url),
+                                        ontologies, args.chunk_size), feed)
+    print('{:<15}{:<6}{:>10}{:>10}{:>10}'.format('Ontology', 'Kind', 'Added', 'Removed', 'Changed'))
+    for ontology_name in sorted(summary):
+        for kind in ('term', 'edge'):
+            counts = summary[ontology_name].get(kind, {})
+            if counts:
+                print('{:<15}{:<6}{:>10}{:>10}{:>10}'.format(ontology_name, kind, counts.get('added', 0),
+                                                             counts.get('removed', 0), counts.get('changed', 0)))
+    logger.info('Diffed releases %s and %s in %.2fs', previous, args.release, time.perf_counter() - start)
+    logger.info('...Done')
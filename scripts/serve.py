@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from os.path import expanduser
+
+from bio.ensembl.ontology.loader.service import OntologyService, serve
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Read only HTTP / JSON ontology query service')
+    parser.add_argument('-e', '--release', type=int, required=True, help='Release number')
+    parser.add_argument('-u', '--host_url', type=str, required=False,
+                        help='Db Host Url format engine:///user:pass@host:port')
+    parser.add_argument('-p', '--port', type=int, required=False, default=8000, help='Listening port')
+    parser.add_argument('--host', type=str, required=False, default='localhost', help='Listening address')
+    parser.add_argument('-c', '--cache_size', type=int, required=False, default=1024,
+                        help='Max number of cached responses')
+
+    args = parser.parse_args(sys.argv[1:])
+    db_name = 'ensembl_ontology_{}'.format(args.release)
+    if args.host_url is None:
+        db_url = 'sqlite:///' + expanduser("~") + '/' + db_name + '.sqlite'
+    else:
+        db_url = '{}{}'.format(args.host_url, db_name)
+    service = OntologyService(db_url, cache_size=args.cache_size)
+    server = serve(service, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info('Service stats: %s', json.dumps(service.stats()))
@@ -12,9 +12,15 @@
    limitations under the License.
 """
 import datetime
+import http.server
+import json
 import logging.config
 import os
+import threading
+import types
 import unittest
+import urllib.parse
+import urllib.request
 import warnings
 from os.path import join
 
@@ -27,9 +33,28 @@ from bio.ensembl.ontology.hive.OLSHiveLoader import OLSHiveLoader
 from bio.ensembl.ontology.hive.OLSOntologyLoader import OLSOntologyLoader
 from bio.ensembl.ontology.hive.OLSTermsLoader import OLSTermsLoader
 from bio.ensembl.ontology.hive.OLSLoadPhiBaseIdentifier import OLSLoadPhiBaseIdentifier
+from bio.ensembl.ontology.hive.OLSSlicePlanner import OLSSlicePlanner
+from bio.ensembl.ontology.hive.OLSCheckConsistency import OLSCheckConsistency
 from bio.ensembl.ontology.loader.db import *
+from bio.ensembl.ontology.loader import export
+from bio.ensembl.ontology.loader.checks import check_consistency
+from bio.ensembl.ontology.loader.diff import diff_databases, merge_join, write_feed
+from bio.ensembl.ontology.loader.fetch import OlsFetcher
+from bio.ensembl.ontology.loader.fts import build_fts, search, like_search, search_benchmark
+from bio.ensembl.ontology.loader.ids import IdAllocator
+from bio.ensembl.ontology.loader.lookup import TermLookup, normalise, lookup_latencies
+from bio.ensembl.ontology.loader.merge import staging_db_url, staging_files, merge_database
 from bio.ensembl.ontology.loader.models import *
 from bio.ensembl.ontology.loader.ols import OlsLoader, init_schema, log_format
+from bio.ensembl.ontology.loader.parallel import loading_waves, load_parallel
+from bio.ensembl.ontology.loader.records import TermRecord, SynonymRecord, AltIdRecord, EdgeRecord, memory_per_record
+from bio.ensembl.ontology.loader.relations import RelationIndex, term_loading_options
+from bio.ensembl.ontology.loader.resolver import TermQueue
+from bio.ensembl.ontology.loader.service import OntologyService, serve
+from bio.ensembl.ontology.loader.shards import merge_shards
+from bio.ensembl.ontology.loader.slices import SliceMetrics, SliceCheckpoint, plan_slices
+from bio.ensembl.ontology.loader.staging import StagingBuffer
+from bio.ensembl.ontology.loader.throttle import RateLimiter
 from ebi.ols.api.client import OlsClient
 from ebi.ols.api.exceptions import NotFoundException
 from tests import read_env
@@ -353,6 +378,15 @@ class TestOLSLoaderBasic(unittest.TestCase):
             self.assertIsNotNone(session.query(Ontology).filter_by(name='PHI').one())
             self.assertGreaterEqual(session.query(Term).count(), 80)
             self.assertEqual(session.query(RelationType).count(), 1)
+            # PHI:1..PHI:150 all child of PHI:0
+            self.assertEqual(session.query(Relation).count(), 150)
+        params_set['_start_term_index'] = 100
+        params_set['_end_term_index'] = 200
+        term_loader = PhiTermLoader(params_set)
+        term_loader.run()
+        with dal.session_scope() as session:
+            self.assertEqual(session.query(Term).count(), 201)
+            self.assertEqual(session.query(Relation).count(), 200)
 
     def testRelationSingleTerm(self):
         with dal.session_scope() as session:
@@ -389,3 +423,746 @@ class TestOLSLoaderBasic(unittest.TestCase):
             self.assertEqual(set(subsets_name), set(term_subsets))
             for definition in subsets:
                 self.assertIsNotNone(definition)
+
+    def testSlicePlanner(self):
+        self.assertEqual([(0, 249), (250, 499), (500, 749), (750, 999)], plan_slices(1000, slice_size=250))
+        metrics_dir = join(log_dir, 'metrics')
+        metrics = SliceMetrics(metrics_dir)
+        # first half of terms ten times slower than second half
+        metrics.record('TST', 0, 499, 500, 500)
+        metrics.record('TST', 500, 999, 500, 50)
+        slices = plan_slices(1000, slice_size=250, history=metrics.history('tst'))
+        self.assertEqual(4, len(slices))
+        self.assertEqual(0, slices[0][0])
+        self.assertEqual(999, slices[-1][1])
+        self.assertLess(slices[0][1], 250)
+        self.assertGreater(slices[-1][1] - slices[-1][0], 500)
+
+        class SlicePlanner(OLSSlicePlanner):
+            def __init__(self, d):
+                self._BaseRunnable__params = eHive.params.ParamContainer(d)
+                self._BaseRunnable__read_pipe = open(join(base_dir, 'hive.in'), mode='rb', buffering=0)
+                self._BaseRunnable__write_pipe = open(join(base_dir, 'hive.out'), mode='wb', buffering=0)
+                self.input_job = Job()
+                self.input_job.transient_error = True
+                self.debug = 1
+
+        planner = SlicePlanner({
+            'ontology_name': 'tst',
+            'nb_terms': 1000,
+            'slice_size': 250,
+            'output_dir': log_dir,
+            'metrics_dir': metrics_dir
+        })
+        planner.run()
+
+    def testSliceTimeBudget(self):
+        self.loader.options['process_relations'] = False
+        self.loader.options['process_parents'] = False
+        self.loader.load_ontology_terms('bfo', 0, 19, time_budget=0.000001)
+        # at least one term is always processed before giving up
+        self.assertEqual(1, self.loader.next_term_index)
+        self.loader.load_ontology_terms('bfo', 0, 19)
+        self.assertIsNone(self.loader.next_term_index)
+
+    def testSliceCheckpoint(self):
+        self.loader.options['process_relations'] = False
+        self.loader.options['process_parents'] = False
+        checkpoint = SliceCheckpoint(log_dir, 'bfo', 0, 19)
+        # simulate a previous run committed up to term 9
+        checkpoint.save(9, 0)
+        self.assertEqual(10, checkpoint.resume_index())
+        loaded, ignored = self.loader.load_ontology_terms('bfo', 0, 19)
+        self.assertEqual(10, loaded + ignored)
+        # resumed slice only measures the terms it browsed
+        self.assertEqual((10, 19), self.loader.loaded_range)
+        self.assertIsNone(checkpoint.load())
+        # checkpoints of a previous run never survive a wipe
+        checkpoint.save(9, 0)
+        self.loader.wipe_ontology('bfo')
+        self.assertIsNone(checkpoint.load())
+
+    def testRateLimiter(self):
+        class ThrottledError(Exception):
+            status_code = 429
+
+        calls = []
+
+        def throttled_call():
+            calls.append(1)
+            if len(calls) < 3:
+                raise ThrottledError('Too many requests')
+            return 'done'
+
+        state_file = join(log_dir, 'test_rate.json')
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        limiter = RateLimiter(state_file=state_file, rate=20, backoff=0.01)
+        self.assertEqual('done', limiter.call(throttled_call))
+        self.assertEqual(3, len(calls))
+        self.assertLess(limiter.rate, 20)
+        # state is shared through state file
+        self.assertEqual(limiter.rate, RateLimiter(state_file=state_file, rate=50).rate)
+        with self.assertRaises(NotFoundException):
+            limiter.call(self.loader.client.ontology, identifier='unknownontology')
+
+    def testOntologySnapshot(self):
+        snapshots = self.loader.snapshot_ontologies(['bfo', 'ogms', 'unknownontology'])
+        self.assertSetEqual({'BFO', 'OGMS'}, {snapshot.ontology_id for snapshot in snapshots})
+        with dal.session_scope() as session:
+            self.assertEqual(2, session.query(OntologySnapshot).count())
+        bfo = self.loader.ontology_info('bfo')
+        self.assertEqual(self.client.ontology('bfo').version, bfo.version)
+        self.assertGreater(bfo.number_of_terms, 0)
+        self.assertIsNone(self.loader.ontology_info('unknownontology'))
+
+    def testDeferredIndexes(self):
+        init_schema(self.db_url, defer_indexes=True, ens_version=99)
+        timings = dal.build_indexes(workers=2)
+        self.assertSetEqual({table.name for table in Base.metadata.sorted_tables}, set(timings.keys()))
+        inspector = sqlalchemy.inspect(dal.engine)
+        for table in Base.metadata.sorted_tables:
+            # final schema is the same as the one dumped by scripts/dump_ddl.py
+            declared = {index.name for index in table.indexes}
+            self.assertTrue(declared.issubset({index['name'] for index in inspector.get_indexes(table.name)}))
+
+    def _write_staging(self, staging_dir, ontology_name='TST'):
+        """ Two staging slices databases sharing parent term TST:0 """
+        os.makedirs(staging_dir, exist_ok=True)
+        for file_name in staging_files(staging_dir, ontology_name):
+            os.remove(file_name)
+        for start, end in ((0, 1), (2, 3)):
+            engine = sqlalchemy.create_engine(staging_db_url(staging_dir, ontology_name, start, end))
+            Base.metadata.create_all(engine)
+            session = sqlalchemy.orm.sessionmaker(bind=engine)()
+            ontology = Ontology(name=ontology_name, namespace='test', version='1', title='Test')
+            is_a = RelationType(name='is_a')
+            root = Term(accession='TST:0', name='root', ontology=ontology, is_root=1)
+            for i in range(max(start, 1), end + 1):
+                term = Term(accession='TST:%s' % i, name='term %s' % i, ontology=ontology)
+                term.synonyms.append(Synonym(name='synonym %s' % i, type=SynonymTypeEnum.EXACT))
+                session.add(Relation(child_term=term, parent_term=root, relation_type=is_a, ontology=ontology))
+            session.commit()
+            session.close()
+            engine.dispose()
+        return staging_files(staging_dir, ontology_name)
+
+    def _assertMerged(self):
+        with dal.session_scope() as session:
+            self.assertEqual(1, session.query(Ontology).filter_by(name='TST').count())
+            self.assertEqual(4, session.query(Term).filter(Term.accession.like('TST:%')).count())
+            self.assertEqual(3, session.query(Synonym).join(Term).filter(Term.accession.like('TST:%')).count())
+            root = session.query(Term).filter_by(accession='TST:0').one()
+            self.assertEqual(3, session.query(Relation).filter_by(parent_term_id=root.term_id).count())
+
+    def testStagingMerge(self):
+        init_schema(self.db_url, ens_version=99)
+        staging_dir = join(log_dir, 'staging')
+        for file_name in self._write_staging(staging_dir):
+            merge_database('sqlite:///' + file_name, dal.engine)
+        self._assertMerged()
+        # merging again is a no-op
+        for file_name in staging_files(staging_dir, 'TST'):
+            stats = merge_database('sqlite:///' + file_name, dal.engine)
+            self.assertEqual(0, stats['term'])
+            self.assertEqual(0, stats['synonym'])
+        # a merge failed after terms were inserted is completed by merging again
+        with dal.session_scope() as session:
+            session.query(Synonym).delete()
+        self.assertEqual(1, merge_database('sqlite:///' + staging_files(staging_dir, 'TST')[0], dal.engine)['synonym'])
+        self.assertEqual(2, merge_database('sqlite:///' + staging_files(staging_dir, 'TST')[1], dal.engine)['synonym'])
+        self._assertMerged()
+
+    def testShardMerge(self):
+        init_schema(self.db_url, ens_version=99)
+        shard_files = self._write_staging(join(log_dir, 'shards'))
+        # attached shards when target is SQLite
+        stats = merge_shards(dal.engine, shard_files)
+        self.assertEqual(4, stats['term'])
+        self.assertEqual(3, stats['relation'])
+        self._assertMerged()
+        self.assertEqual(0, merge_shards(dal.engine, shard_files)['term'])
+
+    def testIdAllocator(self):
+        init_schema(self.db_url, ens_version=99)
+        dal.db_init(self.db_url, id_block_size=10)
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+            is_a = RelationType(name='is_a')
+            root = Term(accession='TST:0', name='root', ontology=ontology, is_root=1)
+            for i in range(1, 25):
+                term = Term(accession='TST:%s' % i, name='term %s' % i, ontology=ontology)
+                term.synonyms.append(Synonym(name='synonym %s' % i, type=SynonymTypeEnum.EXACT))
+                session.add(Relation(child_term=term, parent_term=root, relation_type=is_a, ontology=ontology))
+            session.flush()
+            # ids assigned before insert, from 3 blocks of 10
+            self.assertListEqual(list(range(1, 26)), sorted(term.term_id for term in session.query(Term)))
+            self.assertEqual(24, session.query(Relation).filter_by(parent_term_id=root.term_id).count())
+        with dal.session_scope() as session:
+            self.assertEqual(31, session.query(IdBlock).filter_by(table_name='term').one().next_id)
+            # rows inserted without allocator are never overlapped
+            session.add(Term(term_id=100, accession='TST:100', name='term 100', ontology_id=1))
+        first = IdAllocator(dal.engine).reserve(Term.__table__, 5)
+        self.assertEqual(101, first)
+        self.assertEqual(106, IdAllocator(dal.engine).reserve(Term.__table__, 5))
+        # Core inserts rows get their ids from the same counter
+        rows = IdAllocator(dal.engine).assign(Term.__table__, [dict(accession='TST:%s' % i) for i in (200, 201)])
+        self.assertListEqual([111, 112], [row['term_id'] for row in rows])
+        dal.db_init(self.db_url)
+
+    def testParallelLoader(self):
+        self.assertListEqual([['bfo'], ['AERO', 'DUO']], loading_waves(['AERO', 'bfo', 'DUO']))
+        self.assertListEqual([['AERO']], loading_waves(['AERO']))
+        init_schema(self.db_url, ens_version=99)
+        results = load_parallel(self.loader, ['DUO', 'BFO'], workers=2, slice_size=20)
+        # BFO wave runs first
+        self.assertEqual('BFO', results[0]['ontology'])
+        with dal.session_scope() as session:
+            for ontology_name in ('BFO', 'DUO'):
+                nb_terms = sum(result['terms'] for result in results if result['ontology'] == ontology_name)
+                self.assertGreater(nb_terms, 0)
+                self.assertGreaterEqual(session.query(Term).join(Ontology).filter(
+                    Ontology.name == ontology_name).count(), nb_terms)
+
+    def testFinalReportStatistics(self):
+        init_schema(self.db_url, ens_version=99)
+        with dal.session_scope() as session:
+            is_a = RelationType(name='is_a')
+            for namespace, nb_terms in (('test', 3), ('other', 2)):
+                ontology = Ontology(name='TST', namespace=namespace, version='1', title='Test')
+                root = Term(accession='TST:%s_0' % namespace, name='root', ontology=ontology, is_root=1)
+                for i in range(1, nb_terms):
+                    term = Term(accession='TST:%s_%s' % (namespace, i), name='term %s' % i, ontology=ontology)
+                    term.synonyms.append(Synonym(name='synonym %s' % i, type=SynonymTypeEnum.EXACT))
+                    term.alt_ids.append(AltId(accession='TST:alt_%s_%s' % (namespace, i)))
+                    session.add(Relation(child_term=term, parent_term=root, relation_type=is_a, ontology=ontology))
+            session.add(Meta(meta_key='TST_load_date', meta_value='TST/' + datetime.datetime.now().strftime('%c')))
+        statistics = {m_statistics.namespace: m_statistics for m_statistics in self.loader.final_report('tst')}
+        self.assertEqual(3, statistics['test'].terms)
+        self.assertEqual(2, statistics['test'].relations)
+        self.assertEqual(2, statistics['test'].synonyms)
+        self.assertEqual(1, statistics['other'].alt_ids)
+        self.assertEqual(0, statistics['other'].closures)
+        self.assertIsNotNone(statistics['test'].duration)
+        self.loader.final_report('tst')
+        history = self.loader.load_statistics('TST')
+        self.assertEqual(4, len(history))
+        self.assertGreaterEqual(history[0].report_date, history[-1].report_date)
+
+    def testWipeOntologyChunks(self):
+        init_schema(self.db_url, ens_version=99)
+        self.loader.options['wipe_chunk_size'] = 2
+        self.addCleanup(self.loader.options.pop, 'wipe_chunk_size', None)
+        with dal.session_scope() as session:
+            is_a = RelationType(name='is_a')
+            terms = {}
+            for name in ('PO', 'PECO'):
+                ontology = Ontology(name=name, namespace=name.lower(), version='1', title=name)
+                root = Term(accession='%s:0' % name, name='root', ontology=ontology, is_root=1)
+                for i in range(1, 6):
+                    term = Term(accession='%s:%s' % (name, i), name='term %s' % i, ontology=ontology)
+                    term.synonyms.append(Synonym(name='synonym %s' % i, type=SynonymTypeEnum.EXACT))
+                    session.add(Relation(child_term=term, parent_term=root, relation_type=is_a, ontology=ontology))
+                terms[name] = root
+                for meta_key in ('_load_date', '_file_date'):
+                    session.add(Meta(meta_key=name + meta_key, meta_value=name))
+            # cross ontology relation removed with PO
+            session.add(Relation(child_term=terms['PECO'], parent_term=terms['PO'], relation_type=is_a,
+                                 ontology=terms['PECO'].ontology))
+        self.assertTrue(self.loader.wipe_ontology('po'))
+        with dal.session_scope() as session:
+            self.assertEqual(0, session.query(Ontology).filter_by(name='PO').count())
+            self.assertEqual(6, session.query(Term).count())
+            self.assertEqual(5, session.query(Synonym).count())
+            self.assertEqual(5, session.query(Relation).count())
+            self.assertSetEqual({'PECO_load_date', 'PECO_file_date'},
+                                {meta.meta_key for meta in session.query(Meta).filter(Meta.meta_key.like('%_date'))})
+        self.assertIn('synonym.term_id', self.loader.wipe_timings)
+
+    def testRelationIndex(self):
+        init_schema(self.db_url, ens_version=99)
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+            is_a = RelationType(name='is_a')
+            root = Term(accession='TST:0', name='root', ontology=ontology, is_root=1)
+            children = [Term(accession='TST:%s' % i, name='term %s' % i, ontology=ontology) for i in range(1, 201)]
+            session.add_all(children)
+            session.add(Relation(child_term=children[0], parent_term=root, relation_type=is_a, ontology=ontology))
+        with dal.session_scope() as session:
+            index = RelationIndex.for_session(session)
+            self.assertIs(index, RelationIndex.for_session(session))
+            root = session.query(Term).options(*term_loading_options()).filter_by(accession='TST:0').one()
+            is_a = session.query(RelationType).filter_by(name='is_a').one()
+            children = session.query(Term).filter(Term.accession != 'TST:0').order_by(Term.term_id).all()
+            # already in db
+            self.assertFalse(index.add(children[0], root, is_a))
+            for child in children[1:]:
+                self.assertTrue(index.add(child, root, is_a))
+            self.assertFalse(index.add(children[1], root, is_a))
+            new_term = Term(accession='TST:300', name='term 300', ontology=root.ontology)
+            session.add(new_term)
+            self.assertTrue(index.add(new_term, root, is_a))
+            # relations between committed terms survive a rollback, the one to the rolled back term is forgotten
+            session.rollback()
+            self.assertEqual(199, len(index.pending))
+            self.assertNotIn(RelationIndex.key(new_term, root, is_a, root.ontology), index.keys)
+            # relations inserted meanwhile by another slice are skipped
+            session.execute(Relation.__table__.insert(), [dict(
+                child_term_id=children[1].term_id, parent_term_id=root.term_id, relation_type_id=is_a.relation_type_id,
+                ontology_id=children[1].ontology_id, intersection_of=0)])
+            self.assertEqual(198, index.flush())
+        concurrent = sqlalchemy.create_engine(self.db_url)
+
+        def concurrent_insert(session):
+            # a concurrent slice creates TST:301 once get_one_or_create checked it is not in db yet
+            with concurrent.begin() as connection:
+                connection.execute(Term.__table__.insert(), [dict(
+                    accession='TST:301', name='term 301', ontology_id=children[0].ontology_id, is_root=0,
+                    is_obsolete=0)])
+
+        with dal.session_scope() as session:
+            sqlalchemy.event.listen(session, 'before_commit', concurrent_insert, once=True)
+            index = RelationIndex.for_session(session)
+            children = session.query(Term).filter(Term.accession.in_(['TST:1', 'TST:2'])).order_by(Term.term_id).all()
+            self.assertTrue(index.add(children[1], children[0], session.query(RelationType).one()))
+            m_term, created = get_one_or_create(Term, session, accession='TST:301',
+                                                create_method_kwargs=dict(name='term 301',
+                                                                          ontology=children[0].ontology))
+            self.assertFalse(created)
+            parent_term_id = children[0].term_id
+        concurrent.dispose()
+        with dal.session_scope() as session:
+            # pending relation survived get_one_or_create integrity error rollback
+            self.assertEqual(1, session.query(Relation).filter_by(parent_term_id=parent_term_id).count())
+            self.assertEqual(201, session.query(Relation).count())
+            root = session.query(Term).filter_by(accession='TST:0').one()
+            child = Term(accession='TST:201', name='term 201', ontology=root.ontology)
+            session.add(child)
+            self.assertEqual(0, len(child.parent_terms))
+            RelationIndex.for_session(session).add(child, root, session.query(RelationType).one())
+            RelationIndex.for_session(session).flush()
+            # loaded collections see bulk inserted relations
+            self.assertEqual(['TST:0'], [relation.parent_term.accession for relation in child.parent_terms])
+
+    def testTermQueue(self):
+        init_schema(self.db_url, ens_version=99)
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+            session.add_all([Term(accession='TST:%s' % i, name='term %s' % i, ontology=ontology) for i in range(120)])
+        with dal.session_scope() as session:
+            is_a, created = get_one_or_create(RelationType, session, name='is_a')
+            terms = session.query(Term).order_by(Term.term_id).all()
+            queue = TermQueue(batch_size=50)
+            self.loader.current_ontology = 'TST'
+            # chain TST:0 <- TST:1 <- ... each relation pushed twice
+            for depth, (child, parent) in enumerate(zip(terms[1:], terms)):
+                o_related = types.SimpleNamespace(accession=parent.accession, iri='http://test/%s' % parent.accession)
+                queue.push(child, o_related, is_a, depth + 1)
+                queue.push(child, o_related, is_a, depth + 1)
+            self.assertEqual(238, self.loader.resolve_queue(queue, session))
+            self.assertEqual(0, len(queue))
+        with dal.session_scope() as session:
+            self.assertEqual(119, session.query(Relation).count())
+        self.assertEqual(5, queue.stats['batches'])
+        self.assertEqual(238, queue.stats['max_size'])
+        self.assertEqual(119, queue.stats['max_depth'])
+        self.assertEqual(238, self.loader.queue_stats['resolved'])
+        # a queue shared by a slice terms only reports new stats
+        self.assertEqual(0, queue.report()['resolved'])
+        self.assertEqual(238, queue.report()['max_size'])
+
+    def testStagingRecords(self):
+        init_schema(self.db_url, ens_version=99)
+        self.assertLess(memory_per_record(lambda i: SynonymRecord('synonym %s' % i, 'EXACT'), 1000),
+                        memory_per_record(lambda i: Synonym(name='synonym %s' % i, type='EXACT'), 1000))
+        # staged relations reference terms already in session
+        ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+        is_a = RelationType(name='is_a')
+        terms = [Term(accession='TST:%s' % i, name='term %s' % i, ontology_id=1) for i in range(1001)]
+        self.assertLess(memory_per_record(lambda i: EdgeRecord(terms[i], terms[i + 1], is_a, ontology), 1000),
+                        memory_per_record(lambda i: Relation(child_term=terms[i], parent_term=terms[i + 1],
+                                                             relation_type=is_a, ontology=ontology), 1000))
+        o_term = TermRecord(obo_id='TST:1', label='term 1',
+                            obo_synonym=[{'name': 'Nucleus', 'scope': 'hasExactSynonym',
+                                          'xrefs': [{'database': 'GOC', 'id': '1'}]}],
+                            synonyms=['nucleus', 'cell nucleus'],
+                            annotation={'has_related_synonym': ['cell nucleus', 'karyon'],
+                                        'has_alternative_id': ['TST:2', 'TST:2']})
+        self.loader.current_ontology = 'TST'
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+            m_term = Term(accession='TST:1', name='term 1', ontology=ontology)
+            session.add(m_term)
+            session.flush()
+            records = self.loader.load_term_synonyms(m_term, o_term, session)
+            self.assertEqual([('Nucleus', 'EXACT'), ('cell nucleus', 'EXACT'), ('karyon', 'RELATED')],
+                             [(record.name, record.type) for record in records])
+            self.loader.load_alt_ids(m_term, o_term, session)
+            # buffered until commit
+            self.assertEqual(0, session.query(Synonym).count())
+            self.assertEqual(4, len(StagingBuffer.for_session(session)))
+        with dal.session_scope() as session:
+            self.assertEqual(3, session.query(Synonym).count())
+            self.assertEqual('GOC', session.query(Synonym).filter_by(name='Nucleus').one().db_xref)
+            self.assertEqual(['TST:2'], [alt_id.accession for alt_id in session.query(AltId)])
+            ontology_id = session.query(Term).filter_by(accession='TST:1').one().ontology_id
+        concurrent = sqlalchemy.create_engine(self.db_url)
+
+        def concurrent_insert(session):
+            # a concurrent slice creates TST:302 once get_one_or_create checked it is not in db yet
+            with concurrent.begin() as connection:
+                connection.execute(Term.__table__.insert(), [dict(
+                    accession='TST:302', name='term 302', ontology_id=ontology_id, is_root=0, is_obsolete=0)])
+
+        with dal.session_scope() as session:
+            sqlalchemy.event.listen(session, 'before_commit', concurrent_insert, once=True)
+            buffer = StagingBuffer.for_session(session)
+            m_term = session.query(Term).filter_by(accession='TST:1').one()
+            buffer.add_synonyms(m_term, [SynonymRecord('nuclear body', 'EXACT')])
+            buffer.add_alt_ids(m_term, [AltIdRecord('TST:3')])
+            m_term, created = get_one_or_create(Term, session, accession='TST:302',
+                                                create_method_kwargs=dict(name='term 302', ontology=m_term.ontology))
+            self.assertFalse(created)
+        concurrent.dispose()
+        with dal.session_scope() as session:
+            # staged rows survived get_one_or_create integrity error rollback
+            self.assertEqual(1, session.query(Synonym).filter_by(name='nuclear body').count())
+            self.assertEqual(['TST:2', 'TST:3'], sorted(alt_id.accession for alt_id in session.query(AltId)))
+
+    def _write_release(self, file_name, terms, relations):
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        engine = sqlalchemy.create_engine('sqlite:///' + file_name)
+        Base.metadata.create_all(engine)
+        session = sqlalchemy.orm.sessionmaker(bind=engine)()
+        ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+        m_terms = {}
+        for accession, name, synonyms, alt_ids in terms:
+            m_terms[accession] = Term(accession=accession, name=name, ontology=ontology)
+            m_terms[accession].synonyms = [Synonym(name=synonym, type=SynonymTypeEnum.EXACT) for synonym in synonyms]
+            m_terms[accession].alt_ids = [AltId(accession=alt_id) for alt_id in alt_ids]
+        relation_types = {name: RelationType(name=name) for name in ('is_a', 'part_of')}
+        session.add_all(m_terms.values())
+        session.flush()
+        session.add_all(Relation(child_term_id=m_terms[child].term_id, parent_term_id=m_terms[parent].term_id,
+                                 relation_type=relation_types[name], ontology=ontology)
+                        for child, parent, name in relations)
+        session.commit()
+        return engine
+
+    def testReleaseDiff(self):
+        diff_dir = join(log_dir, 'diff')
+        os.makedirs(diff_dir, exist_ok=True)
+        old = self._write_release(join(diff_dir, 'release_98.sqlite'),
+                                  [('TST:0', 'root', [], []), ('TST:1', 'term 1', ['one'], []),
+                                   ('TST:2', 'term 2', [], []), ('TST:3', 'term 3', [], ['TST:30'])],
+                                  [('TST:1', 'TST:0', 'is_a'), ('TST:2', 'TST:0', 'is_a'), ('TST:3', 'TST:0', 'is_a')])
+        new = self._write_release(join(diff_dir, 'release_99.sqlite'),
+                                  [('TST:0', 'root', [], []), ('TST:1', 'term one', ['one', 'first'], []),
+                                   ('TST:2', 'term 2', [], []), ('TST:4', 'term 4', [], [])],
+                                  [('TST:1', 'TST:0', 'is_a'), ('TST:2', 'TST:0', 'is_a'),
+                                   ('TST:2', 'TST:1', 'part_of'), ('TST:4', 'TST:0', 'is_a')])
+        self.assertEqual([(1, 'a', None), (2, None, 'b'), (3, 'c', 'c')],
+                         list(merge_join([(1, 'a'), (3, 'c')], [(2, 'b'), (3, 'c')])))
+        changes = list(diff_databases(old, new, chunk_size=2))
+        self.assertEqual([('changed', 'term', 'TST:1'), ('removed', 'term', 'TST:3'), ('added', 'term', 'TST:4'),
+                          ('added', 'edge', ('TST:2', 'TST:1', 'part_of', 'TST')),
+                          ('removed', 'edge', ('TST:3', 'TST:0', 'is_a', 'TST')),
+                          ('added', 'edge', ('TST:4', 'TST:0', 'is_a', 'TST'))],
+                         [(change.change, change.kind, change.key) for change in changes])
+        self.assertEqual({'name': 'term 1', 'synonyms': [['one', 'EXACT', None]]}, changes[0].old)
+        self.assertEqual({'name': 'term one', 'synonyms': [['first', 'EXACT', None], ['one', 'EXACT', None]]},
+                         changes[0].new)
+        self.assertEqual(['TST:30'], changes[1].old['alt_ids'])
+        feed = join(diff_dir, 'changes.jsonl')
+        summary = write_feed(changes, feed)
+        self.assertEqual({'TST': {'term': {'added': 1, 'removed': 1, 'changed': 1},
+                                  'edge': {'added': 2, 'removed': 1}}}, summary)
+        with open(feed) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(6, len(lines))
+        self.assertEqual({'change': 'added', 'kind': 'edge', 'ontology': 'TST', 'child': 'TST:2', 'parent': 'TST:1',
+                          'relation': 'part_of', 'new': {'intersection_of': [0]}}, lines[3])
+        self.assertEqual([], list(diff_databases(old, old, ontologies=['tst'])))
+
+    def testConsistencyChecks(self):
+        init_schema(self.db_url, ens_version=99)
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+            other = Ontology(name='TST', namespace='other', version='1', title='Test')
+            is_a, part_of = RelationType(name='is_a'), RelationType(name='part_of')
+            terms = [Term(accession='TST:%s' % i, name='term %s' % i, ontology=ontology) for i in range(4)]
+            foreign = Term(accession='TST:9', name='term 9', ontology=other)
+            terms[1].synonyms = [Synonym(name='one', type=SynonymTypeEnum.EXACT),
+                                 Synonym(name='one', type=SynonymTypeEnum.RELATED)]
+            session.add_all(terms + [foreign])
+            session.add_all([Relation(child_term=terms[1], parent_term=terms[0], relation_type=is_a, ontology=ontology),
+                             Relation(child_term=terms[2], parent_term=terms[3], relation_type=is_a, ontology=ontology),
+                             Relation(child_term=terms[3], parent_term=terms[2], relation_type=is_a, ontology=ontology),
+                             Relation(child_term=terms[1], parent_term=foreign, relation_type=part_of,
+                                      ontology=ontology)])
+        with dal.session_scope() as session:
+            results = {result.check: result for result in check_consistency(session)}
+        self.assertEqual(0, sum(results[name].count for name in ('dangling_references', 'terms_without_ontology',
+                                                                 'duplicate_relations')))
+        self.assertEqual(1, results['cross_namespace_relations'].count)
+        self.assertEqual('part_of', results['cross_namespace_relations'].samples[0]['relation_type'])
+        self.assertEqual([{'accession': 'TST:1', 'name': 'one', 'rows': 2}], results['duplicate_synonyms'].samples)
+        self.assertEqual([{'ontology': 'TST', 'terms': ['TST:2', 'TST:3']}], results['is_a_cycles'].samples)
+        with dal.session_scope() as session:
+            session.execute(Synonym.__table__.insert(), {'term_id': 999, 'name': 'lost', 'type': 'EXACT'})
+            session.execute(Term.__table__.insert(), {'accession': 'TST:8', 'name': 'term 8', 'ontology_id': 999})
+            part_of = session.query(RelationType).filter_by(name='part_of').one()
+            terms = session.query(Term).filter(Term.accession.in_(['TST:0', 'TST:3'])).order_by(Term.accession).all()
+            session.execute(Relation.__table__.insert(), [
+                {'child_term_id': terms[1].term_id, 'parent_term_id': terms[0].term_id,
+                 'ontology_id': terms[0].ontology_id, 'relation_type_id': part_of.relation_type_id,
+                 'intersection_of': intersection_of}
+                for intersection_of in (0, 1)])
+
+        class ConsistencyChecker(OLSCheckConsistency):
+            def __init__(self, d):
+                self._BaseRunnable__params = eHive.params.ParamContainer(d)
+                self._BaseRunnable__read_pipe = open(join(base_dir, 'hive.in'), mode='rb', buffering=0)
+                self._BaseRunnable__write_pipe = open(join(base_dir, 'hive.out'), mode='wb', buffering=0)
+                self.input_job = Job()
+                self.input_job.transient_error = True
+                self.debug = 1
+
+        ConsistencyChecker({'db_url': self.db_url, 'output_dir': log_dir}).run()
+        with open(join(log_dir, 'consistency_report.json')) as f:
+            report = json.load(f)
+        counts = {check['check']: check['count'] for check in report['checks']}
+        self.assertEqual(1, counts['dangling_references'])
+        self.assertEqual(1, counts['terms_without_ontology'])
+        self.assertEqual(1, counts['duplicate_relations'])
+        self.assertEqual(sum(counts.values()), report['issues'])
+
+    def testColumnarPartitions(self):
+        init_schema(self.db_url, ens_version=99)
+        for file_name in self._write_staging(join(log_dir, 'staging')):
+            merge_database('sqlite:///' + file_name, dal.engine)
+        with dal.engine.connect() as connection:
+            partitions = {name: sum(len(rows) for rows in chunks) for name, columns, chunks in
+                          export.table_partitions(connection, 'synonym', chunk_size=2)}
+            self.assertDictEqual({'TST': 3}, partitions)
+            self.assertDictEqual({}, {name: list(chunks) for name, columns, chunks in
+                                      export.table_partitions(connection, 'term', ontologies=['GO'])})
+            name, columns, chunks = next(export.table_partitions(connection, 'relation_type'))
+            self.assertIsNone(name)
+            self.assertIn('relation_type_id', columns)
+            self.assertEqual(1, sum(len(rows) for rows in chunks))
+
+    @unittest.skipIf(export.pyarrow is None, 'pyarrow not installed')
+    def testColumnarExport(self):
+        init_schema(self.db_url, ens_version=99)
+        for file_name in self._write_staging(join(log_dir, 'staging')):
+            merge_database('sqlite:///' + file_name, dal.engine)
+        output_dir = join(log_dir, 'columnar')
+        stats = export.export_tables(dal.engine, output_dir, ontologies=['tst'], chunk_size=2)
+        self.assertEqual(4, stats['term']['rows'])
+        table = export.pyarrow.parquet.read_table(join(output_dir, 'term', 'ontology=TST', 'term.parquet'))
+        self.assertEqual(4, table.num_rows)
+        stats = export.export_tables(dal.engine, output_dir, tables=['synonym'], export_format='arrow')
+        self.assertEqual(3, stats['synonym']['rows'])
+
+    def testTermLookup(self):
+        init_schema(self.db_url, ens_version=99)
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+            term = Term(accession='TST:0001', name='Cell  Nucleus', ontology=ontology)
+            term.alt_ids.append(AltId(accession='TST:0099'))
+            term.synonyms.append(Synonym(name='nucleus', type=SynonymTypeEnum.EXACT))
+            other = Term(accession='TST:0002', name='Nucleus', ontology=ontology, is_obsolete=1)
+            other.synonyms.append(Synonym(name='cell-nucleus', type=SynonymTypeEnum.RELATED))
+            session.add_all([term, other])
+        self.assertEqual('cell nucleus', normalise(' Cell_Nucléus '))
+        with dal.session_scope() as session:
+            lookup = TermLookup.build(session, ontologies=['tst'])
+        self.assertEqual(2, len(lookup))
+        self.assertEqual([('TST:0001', 'accession')], [(m.accession, m.match) for m in lookup.lookup('tst:0001')])
+        self.assertEqual([('TST:0001', 'accession')], [(m.accession, m.match) for m in lookup.lookup('TST_0001')])
+        self.assertEqual([('TST:0001', 'alt_id')], [(m.accession, m.match) for m in lookup.lookup('TST:0099')])
+        # label of an obsolete term comes after a current term exact synonym
+        matches = lookup.lookup('NUCLEUS')
+        self.assertEqual([('TST:0001', 'synonym', 'EXACT'), ('TST:0002', 'label', 'LABEL')],
+                         [(m.accession, m.match, m.scope) for m in matches])
+        self.assertTrue(matches[1].is_obsolete)
+        self.assertEqual(['TST:0001', 'TST:0002'], [m.accession for m in lookup.lookup('cell nucleus')])
+        self.assertEqual([], lookup.lookup('unknown'))
+        file_name = join(log_dir, 'term_lookup.pickle')
+        lookup.save(file_name)
+        results = TermLookup.load(file_name).lookup_many(['TST:0099', 'nucleus'])
+        self.assertEqual(results['nucleus'], matches)
+        self.assertEqual(3, lookup_latencies(lookup, ['TST:0001', 'nucleus', 'x'])['queries'])
+
+    @unittest.skipUnless(db_url.startswith('sqlite'), 'SQLite only')
+    def testFullTextSearch(self):
+        init_schema(self.db_url, ens_version=99)
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+            nucleus = Term(accession='TST:1', name='nucleus', description='Organelle of eukaryotic cells',
+                           ontology=ontology)
+            nucleolus = Term(accession='TST:2', name='nucleolus', description='Part of the nucleus', ontology=ontology)
+            nucleolus.synonyms.append(Synonym(name='plasmosome', type=SynonymTypeEnum.EXACT))
+            session.add_all([nucleus, nucleolus])
+        self.assertTrue(build_fts(dal.engine))
+        with dal.session_scope() as session:
+            # name match ranks before definition match
+            self.assertEqual(['TST:1', 'TST:2'], [result.accession for result in search(session, 'nucleus')])
+            self.assertEqual(['TST:2'], [result.accession for result in search(session, 'nucleol')])
+            self.assertEqual(['TST:2'], [result.accession for result in search(session, 'plasmo', ontologies=['tst'])])
+            self.assertEqual([], search(session, 'nucleus', ontologies=['GO']))
+            self.assertEqual([], search(session, '"*'))
+            self.assertEqual(2, len(like_search(session, 'nucle')))
+            self.assertEqual(2, search_benchmark(session, ['nucleus', 'plasmosome'])['like']['queries'])
+        # index follows reloads
+        self.loader.wipe_ontology('tst')
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='2', title='Test')
+            session.add(Term(accession='TST:3', name='nucleoplasm', ontology=ontology))
+        self.assertTrue(build_fts(dal.engine))
+        with dal.session_scope() as session:
+            self.assertEqual(['TST:3'], [result.accession for result in search(session, 'nucle')])
+
+    def testQueryService(self):
+        init_schema(self.db_url, ens_version=99)
+        with dal.session_scope() as session:
+            ontology = Ontology(name='TST', namespace='test', version='1', title='Test')
+            is_a = RelationType(name='is_a')
+            part_of = RelationType(name='part_of')
+            root = Term(accession='TST:0', name='root', ontology=ontology, is_root=1, subsets='slim')
+            term = Term(accession='TST:1', name='term one', ontology=ontology, subsets='slim,other')
+            leaf = Term(accession='TST:2', name='leaf', ontology=ontology)
+            term.synonyms.append(Synonym(name='first term', type=SynonymTypeEnum.EXACT))
+            session.add_all([Relation(child_term=term, parent_term=root, relation_type=is_a, ontology=ontology),
+                             Relation(child_term=leaf, parent_term=term, relation_type=part_of, ontology=ontology),
+                             Subset(name='slim', definition='Slim'),
+                             Meta(meta_key='TST_load_date', meta_value='TST/1')])
+        service = OntologyService(self.db_url, check_interval=0)
+
+        def get(url):
+            status, body = service.handle(url)
+            return status, json.loads(body.decode('utf-8'))
+
+        status, term = get('/term/TST:1')
+        self.assertEqual(200, status)
+        self.assertEqual('TST', term['ontology'])
+        self.assertEqual([{'accession': 'TST:0', 'relation': 'is_a'}], term['parents'])
+        self.assertEqual([{'name': 'first term', 'type': 'EXACT'}], term['synonyms'])
+        self.assertEqual(['TST:1', 'TST:0'], [t['accession'] for t in get('/term/TST:2/ancestors')[1]])
+        self.assertEqual([2], [t['distance'] for t in get('/term/TST:0/descendants')[1] if t['accession'] == 'TST:2'])
+        self.assertEqual([], get('/term/TST:2/ancestors?relation=is_a')[1])
+        self.assertEqual(['TST:1'], [t['accession'] for t in get('/search?q=first')[1]])
+        self.assertEqual([{'name': 'slim', 'definition': 'Slim'}], get('/subsets')[1])
+        self.assertEqual(['TST:0', 'TST:1'], [t['accession'] for t in get('/subsets/slim')[1]])
+        self.assertEqual(404, get('/term/TST:9')[0])
+        self.assertEqual(404, get('/unknown')[0])
+        self.assertEqual(400, get('/search?q=x&unknown=1')[0])
+        self.assertEqual(400, get('/search?q=x&limit=ten')[0])
+        # ontology filter applies without full text index too
+        self.assertEqual([], get('/search?q=first&ontology=GO')[1])
+        self.assertEqual(['TST:1'], [t['accession'] for t in get('/search?q=first&ontology=tst')[1]])
+        get('/term/TST:1')
+        self.assertEqual(1, service.cache.hits)
+        # reload drops cached responses
+        with dal.session_scope() as session:
+            session.query(Term).filter_by(accession='TST:1').update({'name': 'term 1'})
+            session.query(Meta).filter_by(meta_key='TST_load_date').update({'meta_value': 'TST/2'})
+        self.assertEqual('term 1', get('/term/TST:1')[1]['name'])
+        stats = get('/stats')[1]
+        self.assertEqual(4, stats['latencies_ms']['term']['requests'])
+        server = serve(service, port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            with urllib.request.urlopen('http://localhost:%s/term/TST:0' % server.server_address[1]) as response:
+                self.assertEqual('root', json.loads(response.read().decode('utf-8'))['name'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def testFastFetch(self):
+        def term_json(i, **links):
+            return {'iri': 'http://purl.obolibrary.org/obo/TST_%s' % i, 'label': 'term %s' % i,
+                    'description': ['Term %s' % i, 'Other definition'], 'annotation': {'has_obo_namespace': ['test']},
+                    'obo_synonym': [{'name': 'syn %s' % i, 'scope': 'hasExactSynonym', 'xrefs': []}],
+                    'ontology_name': 'tst', 'is_defining_ontology': True, 'short_form': 'TST_%s' % i,
+                    'in_subset': ['slim'], '_links': {name: {'href': href} for name, href in links.items()}}
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                if url.path == '/ontologies/tst/terms':
+                    page = int(query['page'][0])
+                    terms = [term_json(i, part_of='http://%s:%s/part_of' % self.server.server_address)
+                             for i in range(page * 2, min(page * 2 + 2, 5))]
+                    document = {'_embedded': {'terms': terms}, 'page': {'totalElements': 5, 'number': page}}
+                else:
+                    document = {'_embedded': {'terms': [term_json(9)]}, '_links': {}}
+                body = json.dumps(document).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(('localhost', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        urls = []
+
+        def call(func, url, params):
+            # rate limiter stand in, called once per page
+            urls.append(url)
+            return func(url, params)
+
+        fetcher = OlsFetcher('http://localhost:%s/' % server.server_address[1], page_size=2, call=call)
+        terms = fetcher.terms('TST')
+        self.assertEqual(5, len(terms))
+        self.assertEqual(['TST:%s' % i for i in range(5)], [term.accession for term in terms])
+        self.assertEqual(['TST:1', 'TST:2', 'TST:3'], [term.accession for term in fetcher.terms('TST', 1, 3)])
+        self.assertEqual(['TST:4'], [term.accession for term in fetcher.terms('TST', 4, 10)])
+        record = next(iter(fetcher.terms('TST', 3)))
+        self.assertIsInstance(record, TermRecord)
+        self.assertEqual(('test', 'slim', 'Term 3'), (record.namespace, record.subsets, record.description))
+        self.assertIsNone(record.annotation.has_alternative_id)
+        self.assertEqual(['part_of'], record.relations_types)
+        self.assertEqual(['TST:9'], [related.accession for related in record.load_relation('part_of')])
+        self.assertTrue(urls[-1].endswith('/part_of'))
+        self.assertEqual(fetcher.requests, len(urls))
+        self.assertEqual([], record.load_relation('has_part'))
+        # records map to models like ols-client helpers
+        m_term = Term(helper=record, ontology=Ontology(name='TST', namespace='test'))
+        self.assertEqual(('TST:3', 'term 3', 'Term 3', 'slim'),
+                         (m_term.accession, m_term.name, m_term.description, m_term.subsets))
+        fetcher.close()
+
+    def testTermRecordHelpers(self):
+        documents = [
+            {'iri': 'http://purl.obolibrary.org/obo/TST_1', 'label': 'term 1', 'obo_id': 'TST:1', 'short_form': 'TST_1',
+             'description': ['first', 'second'], 'annotation': {'has_obo_namespace': ['test'], 'namespace': ['other']},
+             'in_subset': ['b_slim', 'A_slim'], 'synonyms': ['one'], 'is_root': True, 'ontology_name': 'tst'},
+            {'iri': 'http://www.orpha.net/ORDO/Orphanet_C_123', 'label': 'term 2', 'short_form': 'Orphanet_C_123',
+             'annotation': {'definition': ['annotated'], 'namespace': ['ordo_ns'], 'hasAlternativeId': ['C:1']},
+             'is_obsolete': True, 'ontology_name': 'ordo'},
+            {'iri': 'http://www.ebi.ac.uk/efo/EFO_0001', 'label': 'term 3', 'annotation': {'def': ['def']},
+             'ontology_name': 'efo', 'obo_synonym': [{'name': 'three', 'scope': 'hasExactSynonym'}]},
+        ]
+        for document in documents:
+            helper = helpers.Term(**json.loads(json.dumps(document)))
+            record = TermRecord.from_json(document)
+            for attribute in ('accession', 'name', 'description', 'namespace', 'subsets', 'is_obsolete', 'is_root',
+                              'iri', 'synonyms', 'obo_synonym', 'ontology_name'):
+                self.assertEqual(getattr(helper, attribute), getattr(record, attribute), attribute)
+            self.assertEqual(helper.annotation.definition or None, record.annotation.definition)
+        self.assertEqual(['C:1'], TermRecord.from_json(documents[1]).annotation.has_alternative_id)
+        links = {name: {'href': 'http://ols/' + name} for name in ('self', 'graph', 'jstree', 'parents', 'part_of')}
+        self.assertEqual(['parents', 'part_of'], TermRecord.from_json({'_links': links}).relations_types)
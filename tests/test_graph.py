@@ -0,0 +1,134 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import os
+import unittest
+
+from bio.ensembl.ontology.loader.binary import write_snapshot, SnapshotReader
+from bio.ensembl.ontology.loader.db import dal
+from bio.ensembl.ontology.loader.graph import OntologyGraph
+from bio.ensembl.ontology.loader.models import Ontology, Term, Relation, RelationType, Closure
+from tests import read_env
+
+read_env()
+
+
+class TestOntologyGraph(unittest.TestCase):
+    db_url = os.getenv('DB_TEST_URL',
+                       'mysql+pymysql://root@localhost:3306/ols_test_ontology?charset=utf8&autocommit=true')
+
+    #        T:0
+    #       /   \
+    #     T:1   T:2
+    #    /   \ /  \\ (part_of)
+    #  T:3   T:4   T:5
+    relations = [
+        ('T:1', 'T:0', 'is_a'),
+        ('T:2', 'T:0', 'is_a'),
+        ('T:3', 'T:1', 'is_a'),
+        ('T:4', 'T:1', 'is_a'),
+        ('T:4', 'T:2', 'is_a'),
+        ('T:5', 'T:2', 'part_of')
+    ]
+
+    def setUp(self):
+        self.graph = OntologyGraph(['T:0', 'T:6'], self.relations)
+
+    def testNeighbours(self):
+        self.assertEqual(7, len(self.graph))
+        self.assertIn('T:6', self.graph)
+        self.assertListEqual(['T:1', 'T:2'], sorted(self.graph.parents('T:4')))
+        self.assertListEqual(['T:1', 'T:2'], sorted(self.graph.children('T:0')))
+        self.assertListEqual(['T:4'], self.graph.children('T:2', relation_types=['is_a']))
+        self.assertListEqual([], self.graph.parents('T:6'))
+
+    def testAncestorsDescendants(self):
+        self.assertSetEqual({'T:0', 'T:1', 'T:2'}, self.graph.ancestors('T:4'))
+        self.assertSetEqual({'T:1', 'T:2', 'T:3', 'T:4', 'T:5'}, self.graph.descendants('T:0'))
+        self.assertSetEqual({'T:1', 'T:2', 'T:3', 'T:4'}, self.graph.descendants('T:0', relation_types=['is_a']))
+        self.assertSetEqual(set(), self.graph.ancestors('T:5', relation_types=['is_a']))
+        self.assertSetEqual(set(), self.graph.ancestors('T:0'))
+
+    def testDistanceLca(self):
+        self.assertEqual(2, self.graph.distance('T:3', 'T:0'))
+        self.assertEqual(2, self.graph.distance('T:0', 'T:5'))
+        self.assertEqual(0, self.graph.distance('T:3', 'T:3'))
+        self.assertIsNone(self.graph.distance('T:3', 'T:5'))
+        self.assertIsNone(self.graph.distance('T:0', 'T:5', relation_types=['is_a']))
+        self.assertListEqual(['T:1'], self.graph.lca('T:3', 'T:4'))
+        self.assertListEqual(['T:0'], self.graph.lca('T:3', 'T:5'))
+        self.assertListEqual(['T:2'], self.graph.lca('T:4', 'T:5'))
+        self.assertListEqual(['T:1'], self.graph.lca('T:1', 'T:3'))
+        self.assertListEqual([], self.graph.lca('T:3', 'T:6'))
+
+    def testCycles(self):
+        self.assertListEqual([], self.graph.cycles())
+        graph = OntologyGraph([], self.relations + [('T:0', 'T:4', 'is_a'), ('T:6', 'T:6', 'part_of'),
+                                                    ('T:5', 'T:7', 'is_a'), ('T:7', 'T:5', 'is_a')])
+        self.assertListEqual([['T:0', 'T:1', 'T:2', 'T:4'], ['T:5', 'T:7'], ['T:6']], graph.cycles())
+        self.assertListEqual([['T:0', 'T:1', 'T:2', 'T:4'], ['T:5', 'T:7']], graph.cycles(relation_types=['is_a']))
+
+    def _load_db(self):
+        dal.wipe_schema(self.db_url)
+        dal.db_init(self.db_url)
+        dal.create_schema()
+        with dal.session_scope() as session:
+            ontology = Ontology(name='T', namespace='test', version='1', title='Test')
+            types = {name: RelationType(name=name) for name in ('is_a', 'part_of')}
+            terms = {}
+            for child, parent, type_name in self.relations:
+                for accession in (child, parent):
+                    if accession not in terms:
+                        terms[accession] = Term(accession=accession, name='Term ' + accession, ontology=ontology,
+                                                is_root=accession == 'T:0')
+                session.add(Relation(child_term=terms[child], parent_term=terms[parent],
+                                     relation_type=types[type_name], ontology=ontology))
+            session.flush()
+            ids = {accession: term.term_id for accession, term in terms.items()}
+            # T:4 reaches T:0 through T:1 and T:2
+            for parent, subparent, distance in (('T:0', 'T:1', 2), ('T:0', 'T:2', 2), ('T:1', None, 1)):
+                session.add(Closure(child_term_id=ids['T:4'], parent_term_id=ids[parent],
+                                    subparent_term_id=ids.get(subparent), distance=distance, ontology_id=ontology.id))
+
+    def testFromDb(self):
+        self._load_db()
+        with dal.session_scope() as session:
+            graph = OntologyGraph.from_db(session, 't')
+            self.assertEqual(6, len(graph))
+            self.assertEqual(6, graph.nb_relations)
+            self.assertSetEqual({'T:0', 'T:1', 'T:2'}, graph.ancestors('T:4'))
+            graph = OntologyGraph.from_db(session, 'T', namespace='test', relation_types=['is_a'])
+            self.assertEqual(5, graph.nb_relations)
+            self.assertSetEqual(set(), graph.ancestors('T:5'))
+
+    def testBinarySnapshot(self):
+        self._load_db()
+        file_name = os.path.join(os.path.dirname(__file__), 'logs', 't.olsnap')
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with dal.session_scope() as session:
+            metadata = write_snapshot(session, 't', file_name)
+        self.assertEqual(6, metadata['relations'])
+        with SnapshotReader(file_name) as reader:
+            self.assertEqual(6, len(reader))
+            self.assertEqual(['test', ''], reader.namespaces)
+            self.assertIsNone(reader.index('T:9'))
+            self.assertDictEqual({'accession': 'T:0', 'name': 'Term T:0', 'namespace': 'test', 'is_root': True,
+                                  'is_obsolete': False}, reader.term('T:0'))
+            self.assertListEqual([('T:1', 'is_a'), ('T:2', 'is_a')], sorted(reader.parents('T:4')))
+            self.assertListEqual([('T:4', 'is_a')], reader.children('T:2', relation_types=['is_a']))
+            self.assertListEqual([('T:0', 2), ('T:1', 1)], sorted(reader.ancestors('T:4')))
+            self.assertListEqual([], reader.ancestors('T:3'))
+        with open(file_name, 'r+b') as f:
+            f.write(b'NOTASNAP')
+        with self.assertRaises(ValueError):
+            SnapshotReader(file_name)